@@ -0,0 +1,152 @@
+# === 離線產生區域 LOD 代理集合（在 Blender 中執行，會直接存回 .blend） ===
+# 用法（在 blends 資料夾）：
+#   blender -b nycu0.blend -P ../scripts/build_lod.py -- RegionRoot1
+#   blender -b nycu1.blend -P ../scripts/build_lod.py -- RegionRoot2 --ratio 0.05
+# 在同一個 .blend 中建立（重跑會先刪除舊的）：
+#   <coll>_LOD1：每個網格物件套用 Decimate（collapse）後的副本，材質保留
+#   <coll>_LOD2：每個相連網格塊的水平凸包，從最低點擠出到最高點（建築輪廓），合併成單一物件
+# RegionLifecycle 在 hide 距離帶只 link LOD1、park 距離帶只 link LOD2，完整集合到 visible 才 link（見 main.py 的 REGION_MAP["lod"]）。
+import bpy, bmesh, sys, argparse
+from mathutils import Vector
+from mathutils.geometry import convex_hull_2d
+
+PROXY_MATERIAL = "LOD_PROXY"
+
+
+def _args():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    p = argparse.ArgumentParser(prog="build_lod.py")
+    p.add_argument("collections", nargs="+", help="要產生代理的集合名稱")
+    p.add_argument("--ratio", type=float, default=0.1, help="LOD1 的 Decimate 比例")
+    p.add_argument("--min-faces", type=int, default=64, help="面數少於此值的物件在 LOD1 直接沿用原網格")
+    p.add_argument("--no-save", action="store_true", help="只建立不存檔（除錯用）")
+    return p.parse_args(argv)
+
+
+def _triangles(objs):
+    return sum(sum(len(p.vertices) - 2 for p in o.data.polygons) for o in objs if o.type == 'MESH')
+
+
+def _replace_collection(name, like):
+    """刪除舊的代理集合（連同其物件與網格）後建立新的，instance_offset 與原集合相同。"""
+    old = bpy.data.collections.get(name)
+    if old is not None:
+        for o in list(old.objects):
+            me = o.data if o.type == 'MESH' else None
+            bpy.data.objects.remove(o, do_unlink=True)
+            if me is not None and me.users == 0:
+                bpy.data.meshes.remove(me)
+        bpy.data.collections.remove(old)
+    col = bpy.data.collections.new(name)
+    col.instance_offset = like.instance_offset
+    col.use_fake_user = True  # 不掛在場景裡也會存進 .blend，可被 link
+    return col
+
+
+def build_lod1(src, ratio, min_faces):
+    """每個網格物件 → Decimate 後的新網格物件（世界座標與原物件相同）。"""
+    col = _replace_collection(f"{src.name}_LOD1", src)
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    for obj in src.all_objects:
+        if obj.type != 'MESH':
+            continue
+        if len(obj.data.polygons) < min_faces:
+            me = obj.data
+        else:
+            mod = obj.modifiers.new("LOD_DECIMATE", 'DECIMATE')
+            mod.decimate_type = 'COLLAPSE'
+            mod.ratio = ratio
+            depsgraph.update()
+            me = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph))
+            obj.modifiers.remove(mod)
+            me.name = f"{obj.data.name}_LOD1"
+        lod = bpy.data.objects.new(f"{obj.name}_LOD1", me)
+        lod.matrix_world = obj.matrix_world.copy()
+        col.objects.link(lod)
+    return col
+
+
+def _islands(bm):
+    """bmesh 中的相連頂點群（list of list[BMVert]）。"""
+    seen, out = set(), []
+    for v in bm.verts:
+        if v.index in seen:
+            continue
+        stack, island = [v], []
+        seen.add(v.index)
+        while stack:
+            cur = stack.pop()
+            island.append(cur)
+            for e in cur.link_edges:
+                o = e.other_vert(cur)
+                if o.index not in seen:
+                    seen.add(o.index)
+                    stack.append(o)
+        out.append(island)
+    return out
+
+
+def _proxy_material():
+    mat = bpy.data.materials.get(PROXY_MATERIAL)
+    if mat is None:
+        mat = bpy.data.materials.new(PROXY_MATERIAL)
+        mat.diffuse_color = (0.55, 0.57, 0.6, 1.0)
+    return mat
+
+
+def build_lod2(src):
+    """所有網格塊的擠出輪廓 → 單一網格物件（座標為世界座標）。"""
+    col = _replace_collection(f"{src.name}_LOD2", src)
+    out = bmesh.new()
+    for obj in src.all_objects:
+        if obj.type != 'MESH' or not obj.data.vertices:
+            continue
+        bm = bmesh.new()
+        bm.from_mesh(obj.data)
+        bm.transform(obj.matrix_world)
+        bm.verts.index_update()
+        for island in _islands(bm):
+            if len(island) < 3:
+                continue
+            pts = [v.co for v in island]
+            hull = convex_hull_2d([(p.x, p.y) for p in pts])
+            if len(hull) < 3:
+                continue
+            z0, z1 = min(p.z for p in pts), max(p.z for p in pts)
+            base = [out.verts.new((pts[i].x, pts[i].y, z0)) for i in hull]
+            face = out.faces.new(base)
+            if z1 - z0 > 1e-3:
+                ext = bmesh.ops.extrude_face_region(out, geom=[face])
+                top = [g for g in ext["geom"] if isinstance(g, bmesh.types.BMVert)]
+                bmesh.ops.translate(out, verts=top, vec=Vector((0.0, 0.0, z1 - z0)))
+        bm.free()
+    bmesh.ops.recalc_face_normals(out, faces=out.faces)
+    me = bpy.data.meshes.new(f"{src.name}_LOD2")
+    out.to_mesh(me)
+    out.free()
+    me.materials.append(_proxy_material())
+    obj = bpy.data.objects.new(f"{src.name}_LOD2", me)
+    col.objects.link(obj)
+    return col
+
+
+def main():
+    args = _args()
+    for name in args.collections:
+        src = bpy.data.collections.get(name)
+        if src is None:
+            print(f"[build-lod] 找不到集合 {name}，可用集合：{[c.name for c in bpy.data.collections]}")
+            continue
+        full = _triangles(src.all_objects)
+        lod1 = build_lod1(src, args.ratio, args.min_faces)
+        lod2 = build_lod2(src)
+        for col in (lod1, lod2):
+            tris = _triangles(col.all_objects)
+            print(f"[build-lod] {col.name}: {tris} 三角形（原始 {full}，{tris / max(full, 1):.1%}）")
+    if not args.no_save:
+        bpy.ops.wm.save_mainfile()
+        print(f"[build-lod] 已存檔 {bpy.data.filepath}")
+
+
+if __name__ == "__main__":
+    main()
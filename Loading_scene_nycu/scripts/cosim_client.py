@@ -0,0 +1,185 @@
+import errno, logging, select, socket
+from functools import partial
+from latency_trace import now, run_traced
+from pose_codec import PoseDecoder, StreamReader, pack, encode_ack
+from scheduler import PRIO_IDLE
+from uav_log import get_logger, flush_all
+from service_registry import register_timer
+
+log = get_logger("cosim")
+
+
+class CoSimClient:
+    """
+    共同模擬伺服器（Loading_scene_sinnoa/sionna/scripts/cosim_server.py）的 Blender 端訂閱者。
+    以 bpy.app.timers 輪詢非阻塞 socket，收到的 frame / metrics 解碼成與 JSONWatcher 相同的 dict，
+    交給已註冊的 callback（介面與 JSONWatcher 相同，可直接替換）。
+
+    ack：每次派送後提交一個最低優先權的 ack 工作（同 key 只保留最新），
+    它執行時代表更高優先權的姿態 / 區域工作都已完成，伺服器才會繼續前進。
+    channel 預設與 JSONWatcher 相同，兩者互換後重跑腳本也只會有一個監聽 timer。
+    """
+    def __init__(self, host="127.0.0.1", port=5555, interval=0.01, verbose=True,
+                 scheduler=None, tracer=None, reconnect=2.0, connect_timeout=3.0, channel="watcher"):
+        self.host, self.port = host, port
+        self.interval = interval
+        self.verbose = verbose
+        self.scheduler = scheduler
+        self.tracer = tracer
+        self.reconnect = reconnect
+        self.connect_timeout = connect_timeout
+        self.channel = channel
+        self.running = False
+        self.sock = None
+        self.decoder = PoseDecoder()
+        self._reader = StreamReader()
+        self._callbacks = []  # [(func, priority, requires)]
+        self._next_connect = 0.0
+        self._connecting = False
+        self._connect_deadline = 0.0
+
+    def add_callback(self, func, priority=0, requires=None):
+        """requires：只有資料含此 key 時才派送（伺服器另外送只有連結指標的 record，不能取代尚未完成的區域 / 姿態工作）。"""
+        self._callbacks.append((func, priority, requires))
+
+    # === 連線 ===
+    def _connect(self):
+        if now() < self._next_connect:
+            return False
+        self._next_connect = now() + self.reconnect
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setblocking(False)
+        err = sock.connect_ex((self.host, self.port))
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EISCONN, getattr(errno, "WSAEWOULDBLOCK", -1)):
+            sock.close()
+            log.every("connect", "無法連線 %s:%d（%s），%.0fs 後重試", self.host, self.port,
+                      errno.errorcode.get(err, err), self.reconnect, interval=10.0, level=logging.WARNING)
+            return False
+        self.sock = sock
+        self._connecting = err not in (0, errno.EISCONN)
+        self._connect_deadline = now() + self.connect_timeout
+        self.decoder = PoseDecoder()
+        self._reader = StreamReader()
+        return True
+
+    def _poll_connect(self):
+        """
+        非阻塞 connect 是否已完成：True = 已連線；False = 仍在連線，或已失敗 / 逾時（關閉並等待重連）。
+        以 SO_ERROR 判斷失敗：Windows 上被拒絕的連線不會讓 recv 報錯，只會一直是 WSAENOTCONN。
+        """
+        _, writable, failed = select.select([], [self.sock], [self.sock], 0)
+        err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err or failed:
+            self._disconnect(f"（連線失敗：{errno.errorcode.get(err, err)}）")
+            return False
+        if writable:
+            self._connecting = False
+            log.info("已連線 %s:%d", self.host, self.port)
+            return True
+        if now() > self._connect_deadline:
+            self._disconnect("（連線逾時）")
+        return False
+
+    def _disconnect(self, reason=""):
+        self._connecting = False
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            log.every("disconnect", "與伺服器斷線 %s", reason, interval=10.0, level=logging.WARNING)
+
+    def _send_ack(self, seq):
+        if self.sock is None or self.decoder.header_id is None:
+            return
+        try:
+            self.sock.sendall(pack(encode_ack(self.decoder.header_id, seq)))
+        except OSError as e:
+            self._disconnect(str(e))
+
+    # === 派送 ===
+    def _dispatch(self, data):
+        t_submit = now()
+        for func, priority, requires in self._callbacks:
+            if requires is not None and requires not in data:
+                continue
+            job = partial(run_traced, self.tracer, func, data, t_submit)
+            if self.scheduler is not None:
+                self.scheduler.submit(job, priority, key=("cosim", func.__name__))
+            else:
+                for _ in job():
+                    pass
+        seq = data["trace"]["seq"]
+        if self.scheduler is not None:
+            self.scheduler.submit(partial(self._send_ack, seq), PRIO_IDLE, key=("cosim", "ack"))
+        else:
+            self._send_ack(seq)
+
+    def _timer(self):
+        if not self.running:
+            return None
+        if self.sock is None and not self._connect():
+            return self.interval
+        if self._connecting and not self._poll_connect():
+            return self.interval
+
+        try:
+            chunk = self.sock.recv(1 << 16)
+        except (BlockingIOError, InterruptedError):
+            chunk = None
+        except OSError as e:
+            self._disconnect(str(e))
+            return self.interval
+        if chunk == b"":
+            self._disconnect("（伺服器關閉連線）")
+            return self.interval
+
+        if self.tracer is not None:
+            report = self.tracer.maybe_report()
+            if report:
+                get_logger("trace").info("\n%s", report)
+
+        frame, links = None, None
+        t_arrive = now()
+        for record in self._reader.feed(chunk or b""):
+            try:
+                data = self.decoder.decode_record(record)
+            except Exception as e:
+                log.error("無法解碼 record：%s", e)
+                continue
+            if data is None:
+                log.info("收到 session header：%s", sorted(self.decoder.info))
+            elif "uav" in data:
+                if frame is not None and "regions" in frame and "regions" not in data:
+                    data["regions"] = frame["regions"]  # 同一批只留最新姿態，但不遺漏區域變化
+                    data["remove_unlisted"] = frame["remove_unlisted"]
+                frame = data
+            else:
+                links = data
+
+        if frame is not None:
+            if links is not None and links["trace"]["seq"] == frame["trace"]["seq"]:
+                frame["links"] = links["links"]
+            if self.tracer is not None:
+                seq = frame["trace"]["seq"]
+                self.tracer.record("transport", (t_arrive - frame["trace"]["t_send"]) * 1000.0, seq)
+                self.tracer.since("parse", t_arrive, seq)
+            try:
+                self._dispatch(frame)
+            except Exception as e:
+                log.error("callback 執行錯誤：%s", e)
+        return self.interval
+
+    def start(self):
+        if self.running:
+            log.info("已在連線中。")
+            return
+        self.running = True
+        self._next_connect = 0.0
+        register_timer(self.channel, self._timer, first_interval=0.1)
+        log.info("訂閱共同模擬伺服器 %s:%d", self.host, self.port)
+
+    def stop(self):
+        self.running = False
+        self._disconnect("（停止訂閱）")
+        log.info("停止訂閱。")
+        flush_all()
@@ -1,28 +1,55 @@
-import bpy, json, os
+import bpy, json, logging, os
+from functools import partial
+from latency_trace import now, run_traced
+from uav_log import get_logger, flush_all
+from service_registry import register_timer
+
+log = get_logger("watch")
 
 class JSONWatcher:
     """
     通用 JSON 檔監聽器。
     每次檔案更新時自動呼叫 callback(json_data)。
+    若指定 scheduler，callback 會以其優先權交給排程器執行（同一 callback 只保留最新資料）；
+    callback 可以是 generator 函式，分步執行。
+    若指定 tracer（LatencyTracer），會記錄 transport / parse / queue / cb / e2e 各階段延遲。
+    若指定 decoder（pose_codec.PoseDecoder），改以二進位讀取並解碼成相同格式的 dict。
+    timer 以 channel 登記在 service_registry，同一 channel 永遠只有一個監聽 timer。
     """
-    def __init__(self, json_path, interval=1.0, verbose=True):
+    def __init__(self, json_path, interval=1.0, verbose=True, scheduler=None, tracer=None, decoder=None,
+                 channel="watcher"):
         self.json_path = bpy.path.abspath(json_path)
         self.interval = interval
         self.verbose = verbose
+        self.scheduler = scheduler
+        self.tracer = tracer
+        self.decoder = decoder
+        self.channel = channel
         self.running = False
         self.last_mtime = 0.0
-        self._callbacks = []
+        self._callbacks = []  # [(func, priority)]
+
+    def add_callback(self, func, priority=0):
+        self._callbacks.append((func, priority))
 
-    def add_callback(self, func):
-        self._callbacks.append(func)
+    def _dispatch(self, func, priority, data):
+        job = partial(run_traced, self.tracer, func, data, now())
+        if self.scheduler is not None:
+            self.scheduler.submit(job, priority, key=("watch", func.__name__))
+            return
+        for _ in job():
+            pass
 
     def _read_json(self):
         try:
+            if self.decoder is not None:
+                with open(self.json_path, "rb") as f:
+                    return self.decoder.decode(f.read())
             with open(self.json_path, "r", encoding="utf-8") as f:
                 return json.load(f)
         except Exception as e:
             if self.verbose:
-                print(f"[watch] 讀取 JSON 失敗：{e}")
+                log.warning("讀取 JSON 失敗：%s", e)
             return None
 
     def _timer(self):
@@ -31,38 +58,52 @@ class JSONWatcher:
 
         if not os.path.exists(self.json_path):
             if self.verbose:
-                print(f"[watch] 找不到 JSON：{self.json_path}")
+                log.every("missing", "找不到 JSON：%s", self.json_path, interval=5.0, level=logging.WARNING)
             return self.interval
 
+        if self.tracer is not None:
+            report = self.tracer.maybe_report()
+            if report:
+                get_logger("trace").info("\n%s", report)
+
         mtime = os.path.getmtime(self.json_path)
         if mtime <= self.last_mtime:
             return self.interval
 
         self.last_mtime = mtime
+        t_arrive = now()
         data = self._read_json()
         if data is None:
             return self.interval
 
+        if self.tracer is not None and isinstance(data, dict):
+            trace = data.get("trace")
+            seq = trace.get("seq") if isinstance(trace, dict) else None
+            if isinstance(trace, dict) and "t_send" in trace:
+                self.tracer.record("transport", (t_arrive - float(trace["t_send"])) * 1000.0, seq)
+            self.tracer.since("parse", t_arrive, seq)
+
         if self.verbose:
-            print(f"[watch] JSON 更新，觸發 {len(self._callbacks)} 個 callback")
+            log.every("update", "JSON 更新，觸發 %d 個 callback", len(self._callbacks), level=logging.DEBUG)
 
-        for cb in self._callbacks:
+        for cb, priority in self._callbacks:
             try:
-                cb(data)
+                self._dispatch(cb, priority, data)
             except Exception as e:
-                print(f"[watch] callback 執行錯誤：{e}")
+                log.error("callback 執行錯誤：%s", e)
 
         return self.interval
 
     def start(self):
         if self.running:
-            print("[watch] 已在監聽中。")
+            log.info("已在監聽中。")
             return
         self.running = True
         self.last_mtime = 0.0
-        bpy.app.timers.register(self._timer, first_interval=0.2)
-        print(f"[watch] 開始監聽 {self.json_path}")
+        register_timer(self.channel, self._timer, first_interval=0.2)
+        log.info("開始監聽 %s", self.json_path)
 
     def stop(self):
         self.running = False
-        print("[watch] 停止監聽。")
\ No newline at end of file
+        log.info("停止監聽。")
+        flush_all()
\ No newline at end of file
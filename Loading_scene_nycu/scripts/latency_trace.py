@@ -0,0 +1,123 @@
+import csv, time, types
+from collections import deque
+
+# 生產端（Sionna / test.py）與 Blender 端都用同一個時鐘打點：
+# time.perf_counter() 在 Windows 為 QueryPerformanceCounter、在 Linux 為 CLOCK_MONOTONIC，
+# 皆為開機起算的系統層級時鐘，同一台機器的不同行程可直接相減，且解析度遠高於 time.monotonic()
+# （Windows 上 monotonic 只有約 15.6 ms 的 tick，量不出毫秒級延遲）。
+now = time.perf_counter
+
+
+def stamp(data, seq):
+    """生產端：在送出的 dict 上加入 trace 欄位（序號 + 送出時間）。"""
+    data["trace"] = {"seq": int(seq), "t_send": now()}
+    return data
+
+
+def run_traced(tracer, func, data, t_submit):
+    """
+    消費端（JSONWatcher / CoSimClient）執行 callback 的共用 generator：generator 函式逐步 yield，
+    tracer 不為 None 時記錄 queue:<cb>（submit → 開始）、cb:<cb>（各步累計）與 e2e:<cb>（送出 → 完成）。
+    """
+    name = func.__name__
+    trace = data.get("trace") if isinstance(data, dict) else None
+    seq = trace.get("seq") if isinstance(trace, dict) else None
+    if tracer is not None:
+        tracer.since(f"queue:{name}", t_submit, seq)
+
+    t0 = now()
+    result = func(data)
+    busy = now() - t0
+    if isinstance(result, types.GeneratorType):
+        while True:
+            t0 = now()
+            try:
+                next(result)
+            except StopIteration:
+                busy += now() - t0
+                break
+            busy += now() - t0
+            yield
+
+    if tracer is not None:
+        tracer.record(f"cb:{name}", busy * 1000.0, seq)
+        if isinstance(trace, dict) and "t_send" in trace:
+            tracer.since(f"e2e:{name}", float(trace["t_send"]), seq)
+
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals:
+        return float("nan")
+    k = (len(sorted_vals) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+class LatencyTracer:
+    """
+    各階段延遲（ms）的環形緩衝區。
+    階段名稱例：transport（送出→偵測到檔案）、parse、queue:<cb>、cb:<cb>、e2e:<cb>、region_load。
+    """
+
+    def __init__(self, maxlen=2048, report_interval=5.0):
+        self.maxlen = maxlen
+        self.report_interval = report_interval
+        self.samples = {}            # {stage: deque[(t, ms, seq)]}
+        self._last_report = now()
+
+    def record(self, stage, ms, seq=None):
+        buf = self.samples.get(stage)
+        if buf is None:
+            buf = self.samples[stage] = deque(maxlen=self.maxlen)
+        buf.append((now(), float(ms), seq))
+
+    def since(self, stage, t_start, seq=None):
+        """記錄 t_start 到現在的耗時。"""
+        self.record(stage, (now() - t_start) * 1000.0, seq)
+
+    def span(self, stage, seq=None):
+        tracer = self
+
+        class _Span:
+            def __enter__(self):
+                self.t0 = now()
+                return self
+
+            def __exit__(self, *exc):
+                tracer.since(stage, self.t0, seq)
+                return False
+
+        return _Span()
+
+    def percentiles(self, stage):
+        """回傳 (p50, p95, p99, 筆數)。"""
+        vals = sorted(ms for _, ms, _ in self.samples.get(stage, ()))
+        return (_percentile(vals, 0.50), _percentile(vals, 0.95),
+                _percentile(vals, 0.99), len(vals))
+
+    def summary(self):
+        lines = [f"{'stage':24s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'n':>6s}"]
+        for stage in sorted(self.samples):
+            p50, p95, p99, n = self.percentiles(stage)
+            lines.append(f"{stage:24s} {p50:8.2f} {p95:8.2f} {p99:8.2f} {n:6d}")
+        return "\n".join(lines)
+
+    def maybe_report(self):
+        """距離上次報告超過 report_interval 秒時回傳摘要字串，否則回傳 None。"""
+        if not self.samples or now() - self._last_report < self.report_interval:
+            return None
+        self._last_report = now()
+        return self.summary()
+
+    def to_csv(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["stage", "t", "ms", "seq"])
+            for stage in sorted(self.samples):
+                for t, ms, seq in self.samples[stage]:
+                    w.writerow([stage, f"{t:.6f}", f"{ms:.3f}", "" if seq is None else seq])
+        return path
+
+    def clear(self):
+        self.samples.clear()
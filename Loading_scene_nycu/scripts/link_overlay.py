@@ -0,0 +1,137 @@
+import bpy, logging, math
+import numpy as np
+from uav_log import get_logger
+
+log = get_logger("overlay")
+
+COLOR_ATTR = "link_quality"
+SIDES = 3  # 每條連結是一個三稜柱（3 個側面）
+
+
+def colormap(values, vmin, vmax):
+    """紅（差）→ 黃 → 綠（好）；回傳 [N, 4] RGBA float32。"""
+    t = np.clip((np.asarray(values, np.float32) - vmin) / (vmax - vmin), 0.0, 1.0)
+    rgba = np.empty((t.size, 4), np.float32)
+    rgba[:, 0] = np.clip(2.0 * (1.0 - t), 0.0, 1.0)
+    rgba[:, 1] = np.clip(2.0 * t, 0.0, 1.0)
+    rgba[:, 2] = 0.1
+    rgba[:, 3] = 1.0
+    return rgba
+
+
+class LinkOverlay:
+    """
+    UAV → 各地面接收端的連結品質疊加層。
+    所有連結共用一個網格物件：拓撲只在連結數改變時重建，
+    每次更新只用 foreach_set 寫入頂點座標與顏色屬性（COLOR_ATTR），不逐條建立物件。
+    UAV 本身以 obj.color 顯示最佳連結的品質（Solid 模式 color_type = 'OBJECT' 可見）；
+    連結顏色在 Material Preview / Rendered，或 Solid 模式 color_type = 'ATTRIBUTE' 可見。
+    """
+
+    def __init__(self, name="LINK_OVERLAY", uav_name="UAV", field="sinr_db",
+                 vmin=-5.0, vmax=30.0, radius=1.0, dead_db=-200.0):
+        self.name = name
+        self.uav_name = uav_name
+        self.field = field
+        self.vmin, self.vmax = vmin, vmax
+        self.radius = radius
+        self.dead_db = dead_db  # 低於此值視為沒有路徑，顯示灰色
+        self._n = -1
+        self._last_geom = None
+
+        a = np.arange(SIDES) * (2.0 * math.pi / SIDES)
+        self._ring = np.stack([np.cos(a), np.sin(a)], axis=1).astype(np.float32)  # [SIDES, 2]
+
+    # === 網格 ===
+    def _material(self):
+        mat = bpy.data.materials.get(self.name)
+        if mat is None:
+            mat = bpy.data.materials.new(self.name)
+            mat.use_nodes = True
+            nodes, links = mat.node_tree.nodes, mat.node_tree.links
+            nodes.clear()
+            attr = nodes.new("ShaderNodeAttribute")
+            attr.attribute_name = COLOR_ATTR
+            emit = nodes.new("ShaderNodeEmission")
+            out = nodes.new("ShaderNodeOutputMaterial")
+            links.new(attr.outputs["Color"], emit.inputs["Color"])
+            links.new(emit.outputs["Emission"], out.inputs["Surface"])
+        return mat
+
+    def _ensure(self, n):
+        """回傳 (物件, 網格)；連結數改變時才重建拓撲。"""
+        obj = bpy.data.objects.get(self.name)
+        if obj is not None and self._n == n and len(obj.data.vertices) == 2 * SIDES * n:
+            return obj, obj.data
+
+        mesh = bpy.data.meshes.get(self.name) or bpy.data.meshes.new(self.name)
+        mesh.clear_geometry()
+        side = np.array([[j, (j + 1) % SIDES, SIDES + (j + 1) % SIDES, SIDES + j] for j in range(SIDES)])
+        faces = (np.arange(n)[:, None, None] * 2 * SIDES + side[None]).reshape(-1, 4)
+        mesh.from_pydata(np.zeros((2 * SIDES * n, 3)).tolist(), [], faces.tolist())
+        if COLOR_ATTR not in mesh.attributes:
+            mesh.attributes.new(COLOR_ATTR, "FLOAT_COLOR", "POINT")
+        if hasattr(mesh, "color_attributes"):
+            mesh.color_attributes.active_color = mesh.color_attributes[COLOR_ATTR]
+        if not mesh.materials:
+            mesh.materials.append(self._material())
+
+        if obj is None:
+            obj = bpy.data.objects.new(self.name, mesh)
+            bpy.context.scene.collection.objects.link(obj)
+            obj.hide_select = True
+        self._n = n
+        self._last_geom = None
+        log.info("建立連結疊加層：%d 條連結", n)
+        return obj, mesh
+
+    def _prisms(self, p0, p1):
+        """p0 [3]、p1 [N, 3] → 三稜柱頂點 [N, 2 × SIDES, 3]。"""
+        d = p1 - p0[None, :]
+        d /= np.maximum(np.linalg.norm(d, axis=1, keepdims=True), 1e-6)
+        ref = np.where(np.abs(d[:, 2:3]) > 0.9, [[1.0, 0.0, 0.0]], [[0.0, 0.0, 1.0]])
+        u = np.cross(d, ref)
+        u /= np.maximum(np.linalg.norm(u, axis=1, keepdims=True), 1e-6)
+        v = np.cross(d, u)
+        ring = self.radius * (self._ring[None, :, 0:1] * u[:, None, :] + self._ring[None, :, 1:2] * v[:, None, :])
+        return np.concatenate([p0[None, None, :] + ring, p1[:, None, :] + ring], axis=1)
+
+    # === 更新 ===
+    def update(self, uav_xyz, links, offset=(0.0, 0.0, 0.0)):
+        """
+        links：PoseDecoder.decode_metrics() 的 "links" 欄位。
+        offset：接收端位置的平移（地圖反向移動模式用）。
+        """
+        positions = links.get("positions")
+        if not positions:
+            log.every("no-pos", "metrics 與 header 都沒有連結位置，無法繪製連結", interval=10.0)
+            return
+        fields = links.get("fields") or ["value"]
+        n = len(positions)
+        values = np.asarray(links["values"], np.float32).reshape(n, -1)
+        k = fields.index(self.field) if self.field in fields else 0
+        quality = values[:, k]
+
+        obj, mesh = self._ensure(n)
+        p0 = np.asarray(uav_xyz, np.float32)
+        p1 = np.asarray(positions, np.float32) + np.asarray(offset, np.float32)
+        geom = (p0.tobytes(), p1.tobytes())
+        if geom != self._last_geom:  # UAV 與接收端都沒動時不重寫座標
+            mesh.vertices.foreach_set("co", self._prisms(p0, p1).astype(np.float32).ravel())
+            self._last_geom = geom
+
+        rgba = colormap(quality, self.vmin, self.vmax)
+        dead = values[:, 0] <= self.dead_db  # 第一個欄位為 gain_db
+        rgba[dead] = (0.3, 0.3, 0.3, 1.0)
+        mesh.attributes[COLOR_ATTR].data.foreach_set("color", np.repeat(rgba, 2 * SIDES, axis=0).ravel())
+        mesh.update()
+
+        uav = bpy.data.objects.get(self.uav_name)
+        if uav is not None:
+            alive = quality[~dead]
+            best = alive.max() if alive.size else self.vmin
+            uav.color = tuple(colormap([best], self.vmin, self.vmax)[0])
+        if log.logger.isEnabledFor(logging.DEBUG):
+            log.every("links", "連結品質（%s）：%s", fields[k],
+                      ", ".join(f"{name}={q:.1f}" for name, q in zip(links.get("names", []), quality)),
+                      level=logging.DEBUG)
@@ -14,9 +14,11 @@ if scripts_dir not in sys.path:
     sys.path.append(scripts_dir)
 
 # 強制 reload 外部版本
-import region_loader
+import region_loader, service_registry
+importlib.reload(service_registry)
 importlib.reload(region_loader)
 from region_loader import RegionLoader
+from service_registry import register_timer
 
 
 
@@ -138,7 +140,7 @@ def start_watch():
         return
     _state["running"] = True
     _state["last_mtime"] = 0.0
-    bpy.app.timers.register(_json_timer, first_interval=0.2)
+    register_timer("watcher", _json_timer, first_interval=0.2)  # 重跑腳本只替換 callback，不會多一個 timer
     print(f"[watch] 開始監聽 {bpy.path.abspath(JSON_PATH)}")
 
 def stop_watch():
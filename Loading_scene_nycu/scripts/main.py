@@ -1,5 +1,5 @@
 # === JSON 監聽並自動載入對應 .blend + UAV移動 (Blender 3.x/4.x) ===
-import bpy, os, sys, importlib
+import bpy, os, sys, importlib, logging
 
 # === 自動加入 scripts 資料夾到搜尋路徑 ===
 scripts_dir = os.path.join(os.path.dirname(os.path.dirname(bpy.data.filepath)), "scripts")
@@ -7,84 +7,88 @@ if scripts_dir not in sys.path:
     sys.path.append(scripts_dir)
 
 # === 清除內嵌 Text Block（避免誤載內嵌版本） ===
-for name in ("region_loader", "json_watcher"):
+for name in ("region_loader", "json_watcher", "scheduler", "latency_trace", "uav_log", "pose_codec", "cosim_client", "link_overlay", "region_lifecycle", "service_registry"):
     if name in bpy.data.texts:
         print(f"[safe import] 發現內嵌 {name}.py，正在刪除...")
         bpy.data.texts.remove(bpy.data.texts[name])
 
 # === 匯入模組 ===
-import region_loader, json_watcher
+import region_loader, json_watcher, scheduler, latency_trace, uav_log, pose_codec, cosim_client, link_overlay, region_lifecycle, service_registry
+importlib.reload(uav_log)
+importlib.reload(service_registry)
+importlib.reload(pose_codec)
+importlib.reload(latency_trace)
 importlib.reload(region_loader)
 importlib.reload(json_watcher)
+importlib.reload(scheduler)
+importlib.reload(cosim_client)
+importlib.reload(link_overlay)
+importlib.reload(region_lifecycle)
 from region_loader import RegionLoader
 from json_watcher import JSONWatcher
+from cosim_client import CoSimClient
+from link_overlay import LinkOverlay
+from region_lifecycle import RegionLifecycle
+from service_registry import service
+from scheduler import JobScheduler, PRIO_POSE, PRIO_REGION
+from latency_trace import LatencyTracer
+from uav_log import get_logger
+from pose_codec import PoseDecoder
 
 
 # === 設定 ===
 JSON_PATH = "//../jason/uav_from_sionna.json"  # 相對於 .blend
+POSE_PATH = "//../jason/uav_pose.bin"          # 二進位姿態訊息（pose_codec）
+USE_BINARY_POSE = True  # True: 監聽 POSE_PATH；False: 監聽舊版 JSON_PATH
+USE_COSIM = False       # True: 改訂閱共同模擬伺服器（cosim_server.py），以 ack 同步
+COSIM_ADDR = ("127.0.0.1", 5555)
+TRACE_CSV = "//../jason/latency_trace.csv"    # export_trace() 輸出位置
+LOG_LEVEL = "INFO"  # DEBUG 可看到每次更新的細節
+LOG_FILE = None     # 例如 "//../jason/uav.log"；None = 只輸出到 console
 INTERVAL = 0.1  # 檢查頻率（秒）
 
+# lod：遠處只 link 並顯示的代理集合（build_lod.py 產生在同一個 .blend 中；找不到時自動停用該層）
 REGION_MAP = {
-    "A": {"blend": "//nycu0.blend", "coll": "RegionRoot1", "pos": (0.0, 0.0, 0.0)},
-    "B": {"blend": "//nycu1.blend", "coll": "RegionRoot2", "pos": (1170.0, 0.0, 0.0)},
-    "C": {"blend": "//nycu2.blend", "coll": "RegionRoot3", "pos": (-1170.0, 0.0, 0.0)},
+    "A": {"blend": "//nycu0.blend", "coll": "RegionRoot1", "pos": (0.0, 0.0, 0.0),
+          "lod": {"hide": "RegionRoot1_LOD1", "park": "RegionRoot1_LOD2"}},
+    "B": {"blend": "//nycu1.blend", "coll": "RegionRoot2", "pos": (1170.0, 0.0, 0.0),
+          "lod": {"hide": "RegionRoot2_LOD1", "park": "RegionRoot2_LOD2"}},
+    "C": {"blend": "//nycu2.blend", "coll": "RegionRoot3", "pos": (-1170.0, 0.0, 0.0),
+          "lod": {"hide": "RegionRoot3_LOD1", "park": "RegionRoot3_LOD2"}},
 }
 
+# 區域切換的遲滯 / 去彈跳（RegionLifecycle）：升級立即執行，降級要等
+REGION_MIN_DWELL = 2.0         # 每個狀態至少維持幾秒才允許降級
+REGION_DEBOUNCE = {"hide": 0.5, "park": 3.0, "unload": 10.0}  # 降級請求需持續的秒數
+REGION_MARGIN = 150.0          # 降級時距離需再超過邊界多少公尺
+# show / hide / park 距離與區域中心由發送端（test.py / cosim_server.py）放在 header 傳來；收到之前只用時間條件
+
+# === 日誌 ===
+uav_log.setup(LOG_LEVEL, file=bpy.path.abspath(LOG_FILE) if LOG_FILE else None)
+log = get_logger("region-watch")
+pose_log = get_logger("uav-watch")
+
 # === 狀態 ===
-loader = RegionLoader(verbose=True)
+tracer = LatencyTracer(report_interval=5.0)  # 每 5 秒印出各階段 p50/p95/p99
+# 重跑腳本時：舊的 watcher / 排程器先停止並交出 timer；RegionLoader 沿用，已連結的 library 不必重載
+loader = service("region_loader", RegionLoader, verbose=True, tracer=tracer, keep=True)
+jobs = service("jobs", JobScheduler, budget_ms=8.0, interval=0.01)
+overlay = LinkOverlay(uav_name="UAV", field="sinr_db")  # 共同模擬時的連結品質
+regions = RegionLifecycle(loader, REGION_MAP, jobs, min_dwell=REGION_MIN_DWELL,
+                          hide_debounce=REGION_DEBOUNCE["hide"], park_debounce=REGION_DEBOUNCE["park"],
+                          unload_debounce=REGION_DEBOUNCE["unload"], margin=REGION_MARGIN)
 
 
 # === 回調 1：控制區域載入/顯示/隱藏 ===
 def on_region_update(data):
-    """依據 data['regions'] 控制各區域的載入與可見性"""
+    """
+    依據 data['regions'] 更新各區域的目標狀態；實際載入 / 卸載由 regions（RegionLifecycle）
+    在排程器中依遲滯與去彈跳規則執行。
+    """
     if not isinstance(data, dict) or "regions" not in data:
         return
-
-    regions = data["regions"]
-    remove_unlisted = data.get("remove_unlisted", False)
-
-    for region, action in regions.items():
-        region = region.strip().upper()
-        if region not in REGION_MAP:
-            print(f"[region-watch] 未知區域 '{region}'，跳過。")
-            continue
-
-        info = REGION_MAP[region]
-        blend_path = bpy.path.abspath(info["blend"])
-        coll_name = info["coll"]
-        pos = info.get("pos", (0.0, 0.0, 0.0))
-
-        inst_name = f"REGION_{region}_INST"
-        inst = bpy.data.objects.get(inst_name)
-        col = bpy.data.collections.get(coll_name)
-        action = str(action).lower().strip()
-
-        if action in ("show", "hide"):
-            if not col:
-                print(f"[region-watch] 載入 {region}（初始狀態: {action}）")
-                try:
-                    col = loader.load_collection(blend_path, coll_name)
-                    inst = loader.create_instance(coll_name, inst_name, visible=(action == "show"))
-                    inst.location = pos
-                except Exception as e:
-                    print(f"[region-watch] 無法載入 {region}: {e}")
-                    continue
-            else:
-                loader.set_visible(inst, (action == "show"))
-                print(f"[region-watch] {'顯示' if action == 'show' else '隱藏'} 區域 {region}")
-
-    # 移除未列出的區域
-    if remove_unlisted:
-        listed = set(k.strip().upper() for k in regions.keys())
-        for key, info in REGION_MAP.items():
-            if key not in listed:
-                coll_name = info["coll"]
-                if coll_name in bpy.data.collections:
-                    print(f"[region-watch] 移除未列出區域 {key}")
-                    try:
-                        loader.unload(coll_name)
-                    except Exception as e:
-                        print(f"[region-watch] 無法移除 {key}: {e}")
+    regions.request(data["regions"], data.get("remove_unlisted", False),
+                    centers=data.get("region_centers"), thresholds=data.get("region_thresholds"))
 
 
 # === 回調 2：控制 UAV 移動 ===
@@ -100,25 +104,51 @@ def on_uav_update(data):
     x = float(uav.get("x", 0.0))
     y = float(uav.get("y", 0.0))
     z = float(uav.get("z", 0.0))
+    regions.observe((x, y, z))
 
     obj = bpy.data.objects.get("UAV")  # 物件名稱可自行更改
     if obj is None:
-        print("[uav-watch] 找不到物件 'UAV'")
+        pose_log.every("missing", "找不到物件 'UAV'", interval=5.0, level=logging.WARNING)
         return
 
     obj.location = (x, y, z)
-    print(f"[uav-watch] UAV → ({x:.2f}, {y:.2f}, {z:.2f})")
+    pose_log.every("pose", "UAV → (%.2f, %.2f, %.2f)", x, y, z)
+
+
+# === 回調 3：連結品質疊加層 ===
+def on_link_update(data):
+    """依據 data['links']（共同模擬伺服器的每步指標）更新連結顏色"""
+    uav = data.get("uav", {})
+    overlay.update((uav.get("x", 0.0), uav.get("y", 0.0), uav.get("z", 0.0)), data["links"])
 
 
 # === 啟動單一 JSON 監聽，但綁兩個 callback ===
 def start_watch():
-    watcher = JSONWatcher(json_path=JSON_PATH, interval=INTERVAL, verbose=True)
-    watcher.add_callback(on_region_update)
-    watcher.add_callback(on_uav_update)
+    jobs.start()
+    if USE_COSIM:
+        watcher = service("watcher", CoSimClient, *COSIM_ADDR, interval=0.01, verbose=True,
+                          scheduler=jobs, tracer=tracer)
+        # 伺服器另外送只有連結指標的 record：依資料內容派送，不取代尚未完成的區域 / 姿態工作
+        watcher.add_callback(on_region_update, PRIO_REGION, requires="regions")
+        watcher.add_callback(on_uav_update, PRIO_POSE, requires="uav")
+        watcher.add_callback(on_link_update, PRIO_POSE, requires="links")
+    else:
+        path = POSE_PATH if USE_BINARY_POSE else JSON_PATH
+        watcher = service("watcher", JSONWatcher, json_path=path, interval=INTERVAL, verbose=True,
+                          scheduler=jobs, tracer=tracer, decoder=PoseDecoder() if USE_BINARY_POSE else None)
+        watcher.add_callback(on_region_update, PRIO_REGION)
+        watcher.add_callback(on_uav_update, PRIO_POSE)
     watcher.start()
-    print(f"[main] 已啟動監聽：{bpy.path.abspath(JSON_PATH)}")
+    get_logger("main").info("已啟動監聽：%s", COSIM_ADDR if USE_COSIM else watcher.json_path)
     return watcher
 
 
+def export_trace(path=TRACE_CSV):
+    """將目前的延遲紀錄匯出成 CSV（可在 Python Console 呼叫）。"""
+    out = tracer.to_csv(bpy.path.abspath(path))
+    get_logger("trace").info("已匯出 %s", out)
+    return out
+
+
 # === 自動啟動 ===
 watcher = start_watch()
@@ -0,0 +1,83 @@
+import os, struct
+import numpy as np
+
+# === 傳播路徑幾何格式（版本 1，little-endian）===
+#   "UAVP" | ver u8 | n_paths u32 | n_verts u32 |
+#   counts u8 × n_paths（每條折線的頂點數）| kinds u8 × n_paths（交互作用類型的 bitwise OR）|
+#   verts f32 × n_verts × 3
+# 每條路徑是一條折線：發射端 → 各交互作用點 → 接收端，全部折線依序串接。
+
+VERSION = 1
+MAGIC = b"UAVP"
+_HEAD = struct.Struct("<4sBII")
+
+
+def _numpy(v):
+    """Dr.Jit / TF 張量或 list → ndarray。"""
+    return v.numpy() if hasattr(v, "numpy") else np.asarray(v)
+
+
+def pack_polylines(vertices, interactions, valid, sources, targets):
+    """
+    vertices [D, R, T, P, 3]、interactions [D, R, T, P]、valid [R, T, P]、
+    sources [T, 3]、targets [R, 3] → (counts [N] u8, kinds [N] u8, verts [M, 3] f32)。
+    交互作用為 0（NONE）的深度不輸出頂點；全部以陣列運算完成，不逐條路徑迴圈。
+    """
+    vertices = np.asarray(vertices, np.float32)
+    inter = np.asarray(interactions).astype(np.uint8)
+    depth, num_rx, num_tx, num_paths = inter.shape
+
+    # [R, T, P, D + 2, 3]：第 0 個是發射端、最後一個是接收端
+    pts = np.empty((num_rx, num_tx, num_paths, depth + 2, 3), np.float32)
+    pts[..., 0, :] = np.asarray(sources, np.float32)[None, :, None, :]
+    pts[..., 1:-1, :] = np.moveaxis(vertices, 0, 3)
+    pts[..., -1, :] = np.asarray(targets, np.float32)[:, None, None, :]
+
+    hit = np.moveaxis(inter, 0, 3) != 0                       # [R, T, P, D]
+    keep = np.ones((num_rx, num_tx, num_paths, depth + 2), bool)
+    keep[..., 1:-1] = hit
+
+    sel = np.asarray(valid, bool)
+    counts = keep[sel].sum(axis=1).astype(np.uint8)
+    kinds = np.bitwise_or.reduce(np.moveaxis(inter, 0, 3)[sel], axis=1).astype(np.uint8)
+    verts = pts[sel][keep[sel]]
+    return counts, kinds, verts
+
+
+def encode_paths(paths):
+    """Sionna RT Paths → bytes；天線陣列未合成（synthetic_array=False）時只取第 0 根天線。"""
+    vertices = _numpy(paths.vertices)
+    interactions = _numpy(paths.interactions)
+    valid = _numpy(paths.valid)
+    sources = _numpy(paths.sources).reshape(-1, 3)
+    targets = _numpy(paths.targets).reshape(-1, 3)
+    if interactions.ndim == 6:  # [D, R, R_ant, T, T_ant, P]
+        num_rx, num_tx = interactions.shape[1], interactions.shape[3]
+        vertices = vertices[:, :, 0, :, 0]
+        interactions = interactions[:, :, 0, :, 0]
+        valid = valid[:, 0, :, 0]
+        sources = sources.reshape(num_tx, -1, 3)[:, 0]
+        targets = targets.reshape(num_rx, -1, 3)[:, 0]
+    counts, kinds, verts = pack_polylines(vertices, interactions, valid, sources, targets)
+    return _HEAD.pack(MAGIC, VERSION, counts.size, len(verts)) + counts.tobytes() \
+        + kinds.tobytes() + verts.astype("<f4").tobytes()
+
+
+def write_paths(path, blob):
+    """寫到暫存檔後原子性取代，Blender 端不會讀到半個檔案。"""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(blob)
+    os.replace(tmp, path)
+
+
+def decode_paths(buf):
+    """回傳 {"counts" [N] u8, "kinds" [N] u8, "verts" [M × 3] f32}（零拷貝指向 buf）。"""
+    magic, ver, n_paths, n_verts = _HEAD.unpack_from(buf, 0)
+    if magic != MAGIC or ver != VERSION:
+        raise ValueError(f"[paths] 不支援的格式：{magic!r} v{ver}")
+    off = _HEAD.size
+    counts = np.frombuffer(buf, np.uint8, n_paths, off)
+    kinds = np.frombuffer(buf, np.uint8, n_paths, off + n_paths)
+    verts = np.frombuffer(buf, "<f4", n_verts * 3, off + 2 * n_paths)
+    return {"counts": counts, "kinds": kinds, "verts": verts}
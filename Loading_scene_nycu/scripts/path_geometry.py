@@ -0,0 +1,72 @@
+import bpy
+import numpy as np
+from uav_log import get_logger
+
+log = get_logger("paths")
+
+KIND_ATTR = "path_kind"  # 每個頂點所屬路徑的交互作用類型（bitwise OR），可給 Geometry Nodes / 材質上色
+
+
+def polyline_edges(counts):
+    """折線頂點數 [N] → 邊的頂點索引 [E, 2]（相鄰頂點相連，折線之間不相連）。"""
+    counts = np.asarray(counts, np.int64)
+    n = int(counts.sum())
+    if n < 2:
+        return np.empty((0, 2), np.int32)
+    link = np.ones(n - 1, bool)
+    ends = np.cumsum(counts)[:-1] - 1  # 每條折線（最後一條除外）的最後一個頂點
+    link[ends[ends < n - 1]] = False
+    start = np.nonzero(link)[0].astype(np.int32)
+    return np.stack([start, start + 1], axis=1)
+
+
+class PathGeometry:
+    """
+    把 Sionna RT 的所有傳播路徑畫成單一網格物件（只有邊，沒有面）。
+    - 折線數量與各自頂點數（counts）不變時只用 foreach_set 更新座標；
+    - counts 改變時才清空並重建拓撲，同樣全部以 foreach_set 批次寫入；
+    - 不會為每條路徑建立物件。
+    """
+
+    def __init__(self, name="RT_PATHS"):
+        self.name = name
+        self._counts = None
+
+    def _object(self):
+        obj = bpy.data.objects.get(self.name)
+        if obj is None:
+            mesh = bpy.data.meshes.get(self.name) or bpy.data.meshes.new(self.name)
+            obj = bpy.data.objects.new(self.name, mesh)
+            bpy.context.scene.collection.objects.link(obj)
+            obj.hide_select = True
+            self._counts = None
+        return obj
+
+    def _rebuild(self, mesh, counts, n_verts):
+        edges = polyline_edges(counts)
+        mesh.clear_geometry()
+        mesh.vertices.add(n_verts)
+        mesh.edges.add(len(edges))
+        mesh.edges.foreach_set("vertices", edges.ravel())
+        if KIND_ATTR not in mesh.attributes:
+            mesh.attributes.new(KIND_ATTR, "INT", "POINT")
+        self._counts = counts.copy()
+        log.info("重建路徑網格：%d 條路徑、%d 個頂點", len(counts), n_verts)
+
+    def update(self, data):
+        """data：path_codec.decode_paths() 的結果；回傳是否重建了拓撲。"""
+        counts, verts = data["counts"], data["verts"]
+        n_verts = len(verts) // 3
+        mesh = self._object().data
+
+        rebuilt = self._counts is None or not np.array_equal(counts, self._counts) \
+            or len(mesh.vertices) != n_verts
+        if rebuilt:
+            self._rebuild(mesh, counts, n_verts)
+
+        mesh.vertices.foreach_set("co", verts)
+        kinds = np.repeat(data["kinds"].astype(np.int32), counts.astype(np.int64))
+        mesh.attributes[KIND_ATTR].data.foreach_set("value", kinds)
+        mesh.update()
+        log.every("update", "更新 %d 條路徑（%s）", len(counts), "重建" if rebuilt else "只更新座標")
+        return rebuilt
@@ -0,0 +1,234 @@
+import json, os, struct, zlib
+
+# === 二進位姿態訊息格式（版本 2，little-endian）===
+# 一次性的 session header：
+#   "UAVH" | ver u8 | header_id u32 | payload_len u32 | payload（緊湊 JSON：origin / bbox / regions / objects ...）
+#   發送端決定區域狀態用的中心與距離也放在 header（"region_centers" / "region_thresholds"），
+#   接收端的遲滯判斷直接沿用，兩端不必各自維護一份數字。
+# 每次更新的 frame（固定長度 + 區域狀態）：
+#   "UAVF" | ver u8 | header_id u32 | seq u32 | t_send f64 | obj u16 | x f32 | y f32 | z f32 | n u8 | n × state u8
+# 連結指標（每步一次，欄位名稱與連結名稱放在 header 的 "metric_fields" / "links"）：
+#   "UAVM" | ver u8 | header_id u32 | seq u32 | n_links u16 | n_fields u8 | has_pos u8
+#          | n_links × n_fields × f32 | has_pos 時再接 n_links × (x, y, z) f32（接收端目前位置，會移動）
+# 消費端回覆的 ack（累積式：確認 seq 以前的都已套用）：
+#   "UAVA" | ver u8 | header_id u32 | seq u32
+# 檔案傳輸時一個檔案 = header + 最新 frame，以 os.replace 原子性覆寫；
+# socket 傳輸時每筆 record 前加 u32 長度（pack / StreamReader）。
+# frame 帶完整區域狀態（每區 1 byte），漏讀 frame 也不會漏掉狀態變化；
+# 解碼端每個 frame 都輸出完整的 "regions"：消費端的區域工作被較新的 frame 取代時，
+# 新工作帶的仍是完整狀態，不會因為「只在變化時送出」而永遠遺失某次變化。
+
+VERSION = 2
+HEADER_MAGIC = b"UAVH"
+FRAME_MAGIC = b"UAVF"
+METRICS_MAGIC = b"UAVM"
+ACK_MAGIC = b"UAVA"
+
+_HEAD = struct.Struct("<4sBII")
+_FRAME = struct.Struct("<4sBIIdHfffB")
+_METRICS = struct.Struct("<4sBIIHBB")
+_ACK = struct.Struct("<4sBII")
+_LEN = struct.Struct("<I")
+
+# 區域狀態代碼（0 = 未列出，代表應卸載）
+STATES = ("", "show", "hide", "park")
+STATE_CODE = {name: i for i, name in enumerate(STATES)}
+
+
+def encode_header(info):
+    """info: dict（例如 {"regions": ["A", "B", "C"], "remove_unlisted": True, "objects": ["UAV"]}）。"""
+    payload = json.dumps(info, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    header_id = zlib.crc32(payload)
+    return _HEAD.pack(HEADER_MAGIC, VERSION, header_id, len(payload)) + payload, header_id
+
+
+def encode_frame(header_id, seq, t_send, xyz, states=(), obj=0):
+    """states：依 header["regions"] 順序的狀態代碼（見 STATE_CODE）。"""
+    x, y, z = xyz
+    return _FRAME.pack(FRAME_MAGIC, VERSION, header_id, seq & 0xFFFFFFFF, t_send,
+                       obj, x, y, z, len(states)) + bytes(states)
+
+
+def decode_frame(buf, offset=0):
+    """回傳 (header_id, seq, t_send, obj, (x, y, z), states bytes, 下一筆的 offset)。"""
+    magic, ver, header_id, seq, t_send, obj, x, y, z, n = _FRAME.unpack_from(buf, offset)
+    if magic != FRAME_MAGIC or ver != VERSION:
+        raise ValueError(f"[pose] 不支援的 frame：{magic!r} v{ver}")
+    start = offset + _FRAME.size
+    return header_id, seq, t_send, obj, (x, y, z), bytes(buf[start:start + n]), start + n
+
+
+def encode_metrics(header_id, seq, values, n_fields=1, positions=None):
+    """values：長度 n_links × n_fields 的扁平序列（連結為主序）；positions：n_links × (x, y, z) 或 None。"""
+    n_links = len(values) // n_fields
+    out = _METRICS.pack(METRICS_MAGIC, VERSION, header_id, seq & 0xFFFFFFFF, n_links, n_fields,
+                        positions is not None) + struct.pack(f"<{n_links * n_fields}f", *values)
+    if positions is not None:
+        out += struct.pack(f"<{n_links * 3}f", *(c for p in positions for c in p))
+    return out
+
+
+def decode_metrics(buf, offset=0):
+    """回傳 (header_id, seq, n_fields, values tuple, positions [[x, y, z], ...] 或 None)。"""
+    magic, ver, header_id, seq, n_links, n_fields, has_pos = _METRICS.unpack_from(buf, offset)
+    if magic != METRICS_MAGIC or ver != VERSION:
+        raise ValueError(f"[pose] 不支援的 metrics：{magic!r} v{ver}")
+    start = offset + _METRICS.size
+    values = struct.unpack_from(f"<{n_links * n_fields}f", buf, start)
+    positions = None
+    if has_pos:
+        flat = struct.unpack_from(f"<{n_links * 3}f", buf, start + 4 * n_links * n_fields)
+        positions = [list(flat[i:i + 3]) for i in range(0, len(flat), 3)]
+    return header_id, seq, n_fields, values, positions
+
+
+def encode_ack(header_id, seq):
+    return _ACK.pack(ACK_MAGIC, VERSION, header_id, seq & 0xFFFFFFFF)
+
+
+def decode_ack(buf, offset=0):
+    """回傳 (header_id, seq)。"""
+    magic, ver, header_id, seq = _ACK.unpack_from(buf, offset)
+    if magic != ACK_MAGIC or ver != VERSION:
+        raise ValueError(f"[pose] 不支援的 ack：{magic!r} v{ver}")
+    return header_id, seq
+
+
+def pack(record):
+    """socket 傳輸：record 前加 u32 長度。"""
+    return _LEN.pack(len(record)) + record
+
+
+class StreamReader:
+    """把 socket 收到的位元組切回一筆筆 record。"""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def feed(self, data):
+        self._buf += data
+        records = []
+        while len(self._buf) >= _LEN.size:
+            size = _LEN.unpack_from(self._buf, 0)[0]
+            end = _LEN.size + size
+            if len(self._buf) < end:
+                break
+            records.append(bytes(self._buf[_LEN.size:end]))
+            del self._buf[:end]
+        return records
+
+
+def decode_header(buf, offset=0):
+    """回傳 (header_id, info dict, 下一筆的 offset)。"""
+    magic, ver, header_id, size = _HEAD.unpack_from(buf, offset)
+    if magic != HEADER_MAGIC or ver != VERSION:
+        raise ValueError(f"[pose] 不支援的 header：{magic!r} v{ver}")
+    start = offset + _HEAD.size
+    return header_id, json.loads(bytes(buf[start:start + size]).decode("utf-8")), start + size
+
+
+class PoseEncoder:
+    """生產端：header 只編碼一次，之後每次只打包一個 frame。"""
+
+    def __init__(self, info):
+        self.info = info
+        self.regions = list(info.get("regions", []))
+        self.header, self.header_id = encode_header(info)
+
+    def states(self, regions):
+        """{"A": "show", ...} → 依 header 區域順序的狀態代碼。"""
+        return [STATE_CODE[regions.get(r, "")] for r in self.regions]
+
+    def frame(self, seq, t_send, xyz, regions=None, obj=0):
+        return encode_frame(self.header_id, seq, t_send, xyz,
+                            self.states(regions or {}), obj)
+
+    def metrics(self, seq, values, positions=None):
+        """values 依 header["links"] × header["metric_fields"] 排列；positions 為各連結接收端目前位置。"""
+        return encode_metrics(self.header_id, seq, values,
+                              max(1, len(self.info.get("metric_fields", [])) or 1), positions)
+
+    def write(self, path, frame):
+        """header + frame 寫到暫存檔後原子性取代，讀取端不會讀到半個檔案。"""
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.header)
+            f.write(frame)
+        os.replace(tmp, path)
+
+
+class PoseDecoder:
+    """
+    消費端：header 依 header_id 快取，只有換 session 才重新解析。
+    decode() 輸出與舊 JSON 相容的 dict：
+      {"uav": {"x", "y", "z"}, "trace": {"seq", "t_send"}}，
+      header 有列出區域時另帶完整的 "regions" 與 "remove_unlisted"（每個 frame 都有），
+      header 有 "region_centers" / "region_thresholds" 時也一併帶上。
+    """
+
+    def __init__(self):
+        self.header_id = None
+        self.info = {}
+
+    def _use_header(self, header_id, info):
+        self.header_id = header_id
+        self.info = info
+
+    def decode_frame(self, buf, offset=0):
+        header_id, seq, t_send, obj, (x, y, z), states, end = decode_frame(buf, offset)
+        if header_id != self.header_id:
+            raise ValueError("[pose] frame 的 header_id 與目前 session 不符")
+        objects = self.info.get("objects", ["UAV"])
+        data = {
+            "uav": {"x": x, "y": y, "z": z,
+                    "name": objects[obj] if obj < len(objects) else str(obj)},
+            "trace": {"seq": seq, "t_send": t_send},
+        }
+        names = self.info.get("regions", [])
+        if names:
+            data["regions"] = {names[i]: STATES[c] for i, c in enumerate(states)
+                               if c and i < len(names)}
+            data["remove_unlisted"] = self.info.get("remove_unlisted", True)
+            for key in ("region_centers", "region_thresholds"):
+                if key in self.info:
+                    data[key] = self.info[key]
+        return data, end
+
+    def decode_metrics(self, buf, offset=0):
+        """
+        回傳 {"links": {"names", "fields", "values", "positions"}, "trace": {"seq"}}；values 為扁平 tuple。
+        positions 取這筆 record 帶的位置（接收端會移動），沒有時退回 header 的 "link_positions"。
+        """
+        header_id, seq, n_fields, values, positions = decode_metrics(buf, offset)
+        if header_id != self.header_id:
+            raise ValueError("[pose] metrics 的 header_id 與目前 session 不符")
+        return {
+            "links": {"names": self.info.get("links", []),
+                      "fields": self.info.get("metric_fields", [])[:n_fields],
+                      "values": values,
+                      "positions": positions or self.info.get("link_positions")},
+            "trace": {"seq": seq},
+        }
+
+    def decode_record(self, record):
+        """socket 傳輸的單筆 record：header 回傳 None，frame / metrics 回傳 dict。"""
+        magic = record[:4]
+        if magic == HEADER_MAGIC:
+            header_id, info, _ = decode_header(record, 0)
+            self._use_header(header_id, info)
+            return None
+        if magic == FRAME_MAGIC:
+            return self.decode_frame(record, 0)[0]
+        if magic == METRICS_MAGIC:
+            return self.decode_metrics(record, 0)
+        raise ValueError(f"[pose] 未知的 record：{magic!r}")
+
+    def decode(self, buf):
+        """解碼檔案內容（header + frame）。"""
+        _, _, header_id, size = _HEAD.unpack_from(buf, 0)
+        if header_id == self.header_id:
+            offset = _HEAD.size + size   # 同一 session：跳過 header
+        else:
+            header_id, info, offset = decode_header(buf, 0)
+            self._use_header(header_id, info)
+        return self.decode_frame(buf, offset)[0]
@@ -0,0 +1,73 @@
+import os, struct, zlib
+import numpy as np
+
+# === 無線電地圖紋理格式（版本 1，little-endian）===
+#   "UAVR" | ver u8 | width u16 | height u16 | vmin f32 | vmax f32 |
+#   center x/y/z f32 | size x/y f32 | crc32 u32 | width × height × u16
+# 像素值：0 = 無覆蓋；1..65535 線性對應 vmin..vmax dB（解析度約 (vmax - vmin) / 65534 dB）。
+# 列 0 是地圖 y 最小的一側，與 Blender image.pixels 的列順序相同，不需翻轉。
+
+VERSION = 1
+MAGIC = b"UAVR"
+_HEAD = struct.Struct("<4sBHHff3f2fI")
+
+
+def _numpy(v):
+    """Dr.Jit / TF 張量或 list → ndarray。"""
+    return v.numpy() if hasattr(v, "numpy") else np.asarray(v)
+
+
+def to_db(path_gain, reduce="max"):
+    """path_gain [num_tx, H, W]（或 [H, W]）→ dB [H, W]；多個發射端取最大值或總和。"""
+    pg = _numpy(path_gain).astype(np.float64)
+    if pg.ndim == 3:
+        pg = pg.max(axis=0) if reduce == "max" else pg.sum(axis=0)
+    with np.errstate(divide="ignore"):
+        return 10.0 * np.log10(pg)
+
+
+def encode_radiomap(db, center, size, vmin=-140.0, vmax=-40.0):
+    """dB 網格 [H, W] → bytes；低於 vmin 或非有限值視為無覆蓋。"""
+    db = np.asarray(db, np.float64)
+    height, width = db.shape
+    valid = np.isfinite(db) & (db >= vmin)
+    t = np.clip((np.where(valid, db, vmin) - vmin) / (vmax - vmin), 0.0, 1.0)
+    q = np.where(valid, 1 + np.rint(t * 65534.0), 0).astype("<u2")
+    data = q.tobytes()
+    cx, cy, cz = (float(c) for c in np.ravel(center)[:3])
+    sx, sy = (float(s) for s in np.ravel(size)[:2])
+    return _HEAD.pack(MAGIC, VERSION, width, height, vmin, vmax,
+                      cx, cy, cz, sx, sy, zlib.crc32(data)) + data
+
+
+def encode_rm(rm, vmin=-140.0, vmax=-40.0, reduce="max"):
+    """Sionna RT RadioMap → bytes（使用 rm.path_gain / rm.center / rm.size）。"""
+    return encode_radiomap(to_db(rm.path_gain, reduce), _numpy(rm.center), _numpy(rm.size), vmin, vmax)
+
+
+def write_radiomap(path, blob):
+    """寫到暫存檔後原子性取代，Blender 端不會讀到半個檔案。"""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(blob)
+    os.replace(tmp, path)
+
+
+def decode_radiomap(buf):
+    """
+    回傳 dict：{"width", "height", "vmin", "vmax", "center", "size", "crc", "q"}，
+    q 為 [H × W] uint16（零拷貝指向 buf）。
+    """
+    magic, ver, width, height, vmin, vmax, cx, cy, cz, sx, sy, crc = _HEAD.unpack_from(buf, 0)
+    if magic != MAGIC or ver != VERSION:
+        raise ValueError(f"[radiomap] 不支援的格式：{magic!r} v{ver}")
+    q = np.frombuffer(buf, dtype="<u2", count=width * height, offset=_HEAD.size)
+    return {"width": width, "height": height, "vmin": vmin, "vmax": vmax,
+            "center": (cx, cy, cz), "size": (sx, sy), "crc": crc, "q": q}
+
+
+class RadioMapDecoder:
+    """給 JSONWatcher 的 decoder：檔案內容 → {"radiomap": {...}}。"""
+
+    def decode(self, buf):
+        return {"radiomap": decode_radiomap(buf)}
@@ -0,0 +1,148 @@
+import bpy
+import numpy as np
+from uav_log import get_logger
+
+log = get_logger("radiomap")
+
+# 色階（由弱到強）：在 GPU 端的 ColorRamp 套用，換地圖只需重傳灰階值
+RAMP = [
+    (0.00, (0.27, 0.00, 0.33, 1.0)),
+    (0.25, (0.23, 0.32, 0.55, 1.0)),
+    (0.50, (0.13, 0.57, 0.55, 1.0)),
+    (0.75, (0.37, 0.79, 0.38, 1.0)),
+    (1.00, (0.99, 0.91, 0.14, 1.0)),
+]
+
+
+class RadioMapTexture:
+    """
+    把 Sionna RT 的 path gain 地圖（radiomap_codec 格式）貼到地面平面上。
+    - 影像只在解析度改變時重建，其餘更新以 image.pixels.foreach_set 整批覆寫；
+    - 內容 crc 相同時直接略過，不重傳像素；
+    - 影像存正規化後的 dB 值（R=G=B）與覆蓋遮罩（A），色階由材質的 ColorRamp 處理；
+    - 材質以世界座標 + Mapping 節點對齊地圖中心與大小，不依賴平面的 UV。
+    """
+
+    def __init__(self, plane_name="Plane", image_name="RADIO_MAP", opacity=0.8):
+        self.plane_name = plane_name
+        self.image_name = image_name
+        self.opacity = opacity
+        self._crc = None
+        self._placement = None
+        self._buf = None
+        self._saved_materials = None
+
+    def _image(self, width, height):
+        img = bpy.data.images.get(self.image_name)
+        if img is not None and tuple(img.size) != (width, height):
+            bpy.data.images.remove(img)
+            img = None
+        if img is None:
+            img = bpy.data.images.new(self.image_name, width, height, alpha=True, float_buffer=True)
+            img.colorspace_settings.name = "Non-Color"
+            self._buf = None
+            self._crc = None
+            log.info("建立地圖影像 %dx%d", width, height)
+        if self._buf is None or self._buf.size != width * height * 4:
+            self._buf = np.empty(width * height * 4, np.float32)
+        return img
+
+    def _material(self, img):
+        mat = bpy.data.materials.get(self.image_name)
+        if mat is None:
+            mat = bpy.data.materials.new(self.image_name)
+            mat.use_nodes = True
+            nodes, links = mat.node_tree.nodes, mat.node_tree.links
+            nodes.clear()
+            geo = nodes.new("ShaderNodeNewGeometry")
+            mapping = nodes.new("ShaderNodeMapping")
+            mapping.name = "RM_MAPPING"
+            tex = nodes.new("ShaderNodeTexImage")
+            tex.name = "RM_IMAGE"
+            tex.interpolation = "Closest"
+            tex.extension = "CLIP"
+            ramp = nodes.new("ShaderNodeValToRGB")
+            elems = ramp.color_ramp.elements
+            while len(elems) < len(RAMP):
+                elems.new(0.5)
+            for el, (pos, color) in zip(elems, RAMP):
+                el.position, el.color = pos, color
+            emit = nodes.new("ShaderNodeEmission")
+            clear = nodes.new("ShaderNodeBsdfTransparent")
+            alpha = nodes.new("ShaderNodeMath")
+            alpha.operation = "MULTIPLY"
+            alpha.name = "RM_OPACITY"
+            mix = nodes.new("ShaderNodeMixShader")
+            out = nodes.new("ShaderNodeOutputMaterial")
+            links.new(geo.outputs["Position"], mapping.inputs["Vector"])
+            links.new(mapping.outputs["Vector"], tex.inputs["Vector"])
+            links.new(tex.outputs["Color"], ramp.inputs["Fac"])
+            links.new(ramp.outputs["Color"], emit.inputs["Color"])
+            links.new(tex.outputs["Alpha"], alpha.inputs[0])
+            links.new(alpha.outputs["Value"], mix.inputs["Fac"])
+            links.new(clear.outputs["BSDF"], mix.inputs[1])
+            links.new(emit.outputs["Emission"], mix.inputs[2])
+            links.new(mix.outputs["Shader"], out.inputs["Surface"])
+            if hasattr(mat, "blend_method"):
+                mat.blend_method = "BLEND"
+        mat.node_tree.nodes["RM_IMAGE"].image = img
+        mat.node_tree.nodes["RM_OPACITY"].inputs[1].default_value = self.opacity
+        return mat
+
+    def _place(self, mat, center, size):
+        """世界座標 (x, y) → 影像座標 [0, 1]：u = (x - (cx - sx / 2)) / sx。"""
+        placement = (tuple(center), tuple(size))
+        if placement == self._placement:
+            return
+        (cx, cy, _), (sx, sy) = center, size
+        mapping = mat.node_tree.nodes["RM_MAPPING"]
+        mapping.inputs["Scale"].default_value = (1.0 / sx, 1.0 / sy, 1.0)
+        mapping.inputs["Location"].default_value = (-(cx - sx / 2.0) / sx, -(cy - sy / 2.0) / sy, 0.0)
+        self._placement = placement
+
+    def _attach(self, mat):
+        plane = bpy.data.objects.get(self.plane_name)
+        if plane is None:
+            log.every("missing", "找不到平面 '%s'", self.plane_name, interval=10.0)
+            return
+        mats = plane.data.materials
+        if len(mats) and mats[0] == mat:
+            return
+        if self._saved_materials is None:
+            self._saved_materials = list(mats)
+        if len(mats):
+            mats[0] = mat
+        else:
+            mats.append(mat)
+        log.info("地圖紋理套用到 %s", self.plane_name)
+
+    def detach(self):
+        """還原平面原本的材質。"""
+        plane = bpy.data.objects.get(self.plane_name)
+        if plane is None or self._saved_materials is None:
+            return
+        plane.data.materials.clear()
+        for m in self._saved_materials:
+            plane.data.materials.append(m)
+        self._saved_materials = None
+
+    def update(self, rm):
+        """rm：radiomap_codec.decode_radiomap() 的結果；回傳是否有重傳像素。"""
+        img = self._image(rm["width"], rm["height"])
+        mat = self._material(img)
+        self._place(mat, rm["center"], rm["size"])
+        self._attach(mat)
+        if rm["crc"] == self._crc:
+            return False
+
+        q = rm["q"]
+        px = self._buf.reshape(-1, 4)
+        np.multiply(q, 1.0 / 65535.0, out=px[:, 0], casting="unsafe")
+        px[:, 1] = px[:, 0]
+        px[:, 2] = px[:, 0]
+        px[:, 3] = q > 0
+        img.pixels.foreach_set(self._buf)
+        img.update()
+        self._crc = rm["crc"]
+        log.every("upload", "更新地圖 %dx%d（%.0f ~ %.0f dB）", rm["width"], rm["height"], rm["vmin"], rm["vmax"])
+        return True
@@ -0,0 +1,351 @@
+import bpy, math, logging
+from latency_trace import now
+from uav_log import get_logger
+from scheduler import PRIO_REGION, PRIO_PURGE
+
+log = get_logger("region-fsm")
+
+# === 區域生命週期 ===
+#   unloaded → loading → parked / hidden / visible → unloading → unloaded
+# 升級（載入、顯示）立即執行；降級（隱藏、停放、卸載）要等：
+#   - 目前狀態已維持 min_dwell 秒；
+#   - 降級請求已持續 debounce 秒（期間若又被升級請求取消，就完全不做）；
+#   - 有設定 thresholds 時，UAV 與區域中心的距離要超過該邊界 + margin（距離遲滯）。
+# 區域設定有 "lod": {"hide": 集合, "park": 集合}（build_lod.py 產生）時，
+# hidden / parked 狀態只 link 對應的低解析度代理並顯示在原位置，完整區域會被卸下（不佔記憶體）；
+# 升級到 visible 時才重新 link 完整區域。沒有設定該層 LOD 的區域維持原本作法（完整區域隱藏 / 停放）。
+# 所有 link 都經由 _load_pending 批次進行（每個 .blend 只開一次）。
+UNLOADED, LOADING, PARKED, HIDDEN, VISIBLE, UNLOADING = \
+    "unloaded", "loading", "parked", "hidden", "visible", "unloading"
+
+ACTION_LEVEL = {"unload": 0, "park": 1, "hide": 2, "show": 3}
+STATE_LEVEL = {UNLOADED: 0, PARKED: 1, HIDDEN: 2, VISIBLE: 3}
+LEVEL_STATE = {0: UNLOADED, 1: PARKED, 2: HIDDEN, 3: VISIBLE}
+
+
+class _Region:
+    def __init__(self, name, info, t):
+        self.name = name
+        self.info = info
+        self.state = UNLOADED
+        self.since = t - 1e9      # 進入目前狀態的時間（初始狀態不受 min_dwell 限制）
+        self.target = 0
+        self.target_since = t
+        self.retry_at = 0.0       # 載入失敗後的重試時間
+        self.prev = UNLOADED      # 進入 loading 前的狀態（失敗時退回）
+        self.proxy = None         # 目前顯示的 LOD 代理集合
+        self.lods = dict(info.get("lod") or {})
+
+    @property
+    def inst_name(self):
+        return f"REGION_{self.name}_INST"
+
+    @property
+    def proxy_name(self):
+        return f"REGION_{self.name}_PROXY"
+
+
+class RegionLifecycle:
+    """
+    依 request() 收到的目標狀態（show / hide / park / unload）驅動 RegionLoader，
+    避免 UAV 在邊界附近徘徊時反覆 link / 卸載同一個 .blend。
+
+    thresholds：(show, hide, park) 距離；降到 hide / park / unload 時，距離分別要超過
+    show + margin / hide + margin / park + margin。None 表示只用時間條件。
+    區域中心取 region_map[...]["pos"]（可用 centers 覆寫）。
+    thresholds / centers 應與發送端決定狀態用的相同：request() 收到發送端 header 帶來的值時以它為準。
+    on_instance(region, inst)：建立實例（含 LOD 代理）後呼叫（例如 reverse.py 依地圖偏移放置），預設放在 pos。
+    所有實際動作都在 scheduler 的單一工作（key ("regions", "reconcile")）中依序執行。
+    """
+
+    def __init__(self, loader, region_map, scheduler, min_dwell=2.0, hide_debounce=0.5,
+                 park_debounce=3.0, unload_debounce=10.0, thresholds=None, margin=0.0,
+                 centers=None, on_instance=None, retry=5.0):
+        self.loader = loader
+        self.region_map = region_map
+        self.scheduler = scheduler
+        self.min_dwell = min_dwell
+        self.debounce = {2: hide_debounce, 1: park_debounce, 0: unload_debounce}
+        self.boundary = None
+        self.margin = margin
+        self.centers = {k: v.get("pos", (0.0, 0.0, 0.0)) for k, v in region_map.items()}
+        self.configure(centers, thresholds)
+        self.on_instance = on_instance
+        self.retry = retry
+        t = now()
+        self.regions = {k: _Region(k, v, t) for k, v in region_map.items()}
+        self.pos = None
+        self.stats = {"loads": 0, "unloads": 0, "suppressed": 0}
+        self._due = None
+        self._running = False
+        for r in self.regions.values():
+            self._adopt(r)
+
+    def _adopt(self, r):
+        """
+        重跑腳本時沿用的 RegionLoader（service_registry keep=True）裡已載入的區域：
+        依實例是否存在 / 可見恢復狀態，目標維持現狀，等新的請求再變動。
+        """
+        proxy = bpy.data.objects.get(r.proxy_name)
+        if proxy is not None and proxy.instance_collection is not None \
+                and proxy.instance_collection.name in self.loader.cache:
+            r.proxy = proxy.instance_collection.name
+        if r.info["coll"] in self.loader.cache:
+            inst = bpy.data.objects.get(r.inst_name)
+            if inst is None:
+                r.state = PARKED
+            else:
+                r.state = VISIBLE if self.loader.is_visible(inst) else HIDDEN
+        elif r.proxy is not None:  # 只 link 了代理
+            r.state = HIDDEN if r.proxy == r.lods.get("hide") else PARKED
+        else:
+            return
+        r.target = STATE_LEVEL[r.state]
+        log.info("沿用已載入的區域 %s（%s）", r.name, r.state)
+
+    # === 輸入 ===
+    def configure(self, centers=None, thresholds=None):
+        """更新區域中心 {區域: (x, y)} 與 (show, hide, park) 距離；None 的項目維持原值。"""
+        if centers:
+            self.centers.update({k.strip().upper(): v for k, v in centers.items()})
+        if thresholds is not None:
+            self.boundary = {2: thresholds[0], 1: thresholds[1], 0: thresholds[2]}
+
+    def request(self, regions, remove_unlisted=False, centers=None, thresholds=None):
+        """
+        regions：{區域: "show" | "hide" | "park"}；remove_unlisted 時未列出的區域目標為 unload。
+        centers / thresholds：發送端 header 帶來的區域中心與距離（見 configure()）。
+        """
+        self.configure(centers, thresholds)
+        t = now()
+        wanted = {}
+        for name, action in regions.items():
+            name = name.strip().upper()
+            action = str(action).lower().strip()
+            if name not in self.regions:
+                log.every(f"unknown-{name}", "未知區域 '%s'，跳過。", name, interval=10.0, level=logging.WARNING)
+                continue
+            if action in ACTION_LEVEL:
+                wanted[name] = ACTION_LEVEL[action]
+        if remove_unlisted:
+            for name in self.regions:
+                wanted.setdefault(name, 0)
+
+        changed = False
+        for name, level in wanted.items():
+            r = self.regions[name]
+            if level == r.target:
+                continue
+            changed = True
+            current = STATE_LEVEL.get(r.state)
+            if current is not None and r.target < current <= level:
+                # 降級還沒生效就被取消：這次切換完全省掉
+                self.stats["suppressed"] += 1
+                log.debug("取消 %s 的降級（%s → %s）", name, LEVEL_STATE[r.target], LEVEL_STATE[level])
+            r.target, r.target_since = level, t
+        if changed:  # 每個 frame 都會帶完整狀態，沒有變化時不必排程
+            self.schedule()
+
+    def observe(self, pos):
+        """每次姿態更新呼叫：記錄 UAV 位置，延後的降級到期時排入處理。"""
+        self.pos = pos
+        if self._due is not None and now() >= self._due:
+            self.schedule()
+
+    def schedule(self):
+        if not self._running:
+            self._running = True
+            self.scheduler.submit(self.reconcile, PRIO_REGION, key=("regions", "reconcile"))
+
+    # === 決策 ===
+    def _distance(self, name):
+        cx, cy = self.centers.get(name, (0.0, 0.0, 0.0))[:2]
+        return math.hypot(self.pos[0] - cx, self.pos[1] - cy)
+
+    def _defer(self, t):
+        self._due = t if self._due is None else min(self._due, t)
+
+    def _decide(self, r, t):
+        """回傳現在要前往的等級，或 None（已到達、進行中，或降級尚未到期）。"""
+        current = STATE_LEVEL.get(r.state)
+        if current is None or r.target == current:
+            return None
+        if r.target > current:
+            if t < r.retry_at:
+                self._defer(r.retry_at)
+                return None
+            return r.target
+
+        ready = max(r.since + self.min_dwell, r.target_since + self.debounce[r.target])
+        if t < ready:
+            self._defer(ready)
+            return None
+        if self.boundary is not None and self.pos is not None:
+            if self._distance(r.name) <= self.boundary[r.target] + self.margin:
+                self._defer(t + 0.5)  # 還在遲滯範圍內：維持現狀，稍後再看
+                return None
+        return r.target
+
+    def _needs(self, r, level):
+        """到達 level 需要先 link 的集合：有該層 LOD 時只要代理，否則是完整區域；unload 不需要。"""
+        if level == 0:
+            return None
+        return r.lods.get({2: "hide", 1: "park"}.get(level)) or r.info["coll"]
+
+    def _linked(self, r, level):
+        need = self._needs(r, level)
+        return need is None or need in self.loader.cache
+
+    # === 執行 ===
+    def _enter(self, r, state):
+        if r.state != state:
+            log.debug("%s：%s → %s", r.name, r.state, state)
+        r.state, r.since = state, now()
+        if r.lods and state in STATE_LEVEL:
+            self._sync_proxy(r)
+
+    def _place(self, r, inst):
+        if self.on_instance is not None:
+            self.on_instance(r.name, inst)
+        else:
+            inst.location = r.info.get("pos", (0.0, 0.0, 0.0))
+
+    def _instance(self, r, visible):
+        inst = self.loader.create_instance(r.info["coll"], r.inst_name, visible=visible)
+        self._place(r, inst)
+        return inst
+
+    def _sync_proxy(self, r):
+        """
+        依目前狀態顯示 LOD 代理（hidden → lod["hide"]、parked → lod["park"]），其他狀態移除代理。
+        代理必須已由 _load_pending 批次 link；這裡不載入任何東西。
+        """
+        want = r.lods.get({HIDDEN: "hide", PARKED: "park"}.get(r.state))
+        if want is not None and want not in self.loader.cache:
+            log.warning("%s 的代理 %s 尚未載入，先不顯示", r.name, want)
+            want = None
+        if want == r.proxy:
+            return
+        if want is None:
+            self.loader.park(r.proxy)
+            r.proxy = None
+            return
+        inst = self.loader.set_lod(r.proxy_name, want, visible=True)
+        if r.proxy is None:
+            self._place(r, inst)
+        r.proxy = want
+
+    def _load_pending(self, t):
+        """
+        所有下一步需要 link 新集合的區域（從 unloaded 升級、代理 → 完整區域、完整區域 → 代理）一起載入：
+        RegionLoader.load_collections 依 .blend 分組，每個檔案只開一次。回傳載入成功的區域。
+        """
+        batch = []
+        for r in self.regions.values():
+            level = self._decide(r, t)
+            if level is not None and not self._linked(r, level):
+                batch.append((r, self._needs(r, level)))
+        if not batch:
+            return []
+        for r, _ in batch:
+            r.prev = r.state
+            self._enter(r, LOADING)
+        log.info("載入 %s", "、".join(f"{r.name} {need}（目標：{LEVEL_STATE[r.target]}）" for r, need in batch))
+        try:
+            _, errors = self.loader.load_collections([(r.info["blend"], need) for r, need in batch])
+        except Exception as e:
+            errors = {need: e for _, need in batch}
+
+        loaded = []
+        for r, need in batch:
+            e = errors.get(need)
+            if e is None:
+                self.stats["loads"] += 1
+                loaded.append(r)
+                continue
+            if need != r.info["coll"]:
+                # 還沒跑過 build_lod.py 的 .blend：之後不再嘗試這一層，改用完整區域
+                log.warning("無法載入 %s 的代理 %s（%s），停用此層 LOD", r.name, need, e)
+                r.lods = {k: v for k, v in r.lods.items() if v != need}
+            else:
+                log.error("無法載入 %s: %s", r.name, e)
+                r.retry_at = now() + self.retry
+            self._enter(r, r.prev)
+        return loaded
+
+    def _finish_load(self, r):
+        level = r.target  # 載入期間目標可能已改變
+        try:
+            if level > 0 and self._linked(r, level):
+                self._apply(r, level)
+                return
+        except Exception as e:
+            log.error("無法建立 %s 的實例: %s", r.name, e)
+        # 目標是 unload 時仍要等 debounce 才卸載；目標改成其他層時下一輪再批次載入
+        self._enter(r, PARKED if r.info["coll"] in self.loader.cache else r.prev)
+
+    def _apply(self, r, level):
+        """把區域切換到 level（需要的集合已 link）。"""
+        coll = r.info["coll"]
+        if level == 0:
+            self._enter(r, UNLOADING)
+            log.info("卸載 %s", r.name)
+            try:
+                for c in [coll, *r.lods.values()]:
+                    self.loader.unload(c)
+            except Exception as e:
+                log.error("無法移除 %s: %s", r.name, e)
+            r.proxy = None
+            self.stats["unloads"] += 1
+            self._enter(r, UNLOADED)
+            # 卸載的 library 交給低優先權工作一次清除
+            self.scheduler.submit(self.loader.purge, PRIO_PURGE, key="purge")
+            return
+        if self._needs(r, level) != coll:
+            # 只留代理：完整區域卸下（同檔的代理仍在用，library 保留，完整區域的資料由 purge 清除）
+            if coll in self.loader.cache:
+                self.loader.unload(coll)
+                self.scheduler.submit(self.loader.purge, PRIO_PURGE, key="purge")
+            log.info("%s 改用代理（%s）", r.name, LEVEL_STATE[level])
+        elif level == 1:
+            self.loader.park(coll)
+            log.info("停放區域 %s", r.name)
+        else:
+            inst = bpy.data.objects.get(r.inst_name)
+            if inst is None:
+                self._instance(r, level == 3)
+                if r.state != LOADING:
+                    log.info("恢復停放區域 %s（%s）", r.name, LEVEL_STATE[level])
+            else:
+                self.loader.set_visible(inst, level == 3)
+        self._enter(r, LEVEL_STATE[level])
+
+    def reconcile(self):
+        """generator：把區域推向目標狀態，每個動作後 yield；沒有可做的事才結束。"""
+        try:
+            while True:
+                self._due = None
+                loaded = self._load_pending(now())
+                acted = bool(loaded)
+                if loaded:
+                    yield  # library link 與建立實例分成兩步
+                    for r in loaded:
+                        self._finish_load(r)
+                    yield
+                for r in self.regions.values():
+                    level = self._decide(r, now())
+                    if level is None:
+                        continue
+                    acted = True
+                    if not self._linked(r, level):
+                        continue  # 需要 link 新集合的區域：下一輪一起批次載入
+                    self._apply(r, level)
+                    yield
+                if not acted:
+                    return
+        finally:
+            self._running = False
+
+    def summary(self):
+        """{區域: 狀態}，除錯用。"""
+        return {k: r.state for k, r in self.regions.items()}
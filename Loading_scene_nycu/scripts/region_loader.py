@@ -1,36 +1,119 @@
 import bpy, os
+from latency_trace import now
+from uav_log import get_logger
+
+log = get_logger("RegionLoader")
+
+# 釋放報告中統計的資料類型
+ID_TYPES = ("objects", "meshes", "materials", "collections", "images",
+            "textures", "node_groups", "curves", "libraries")
+
+
+def _norm_path(path):
+    return os.path.normcase(os.path.abspath(bpy.path.abspath(path)))
+
+
+def _estimate_bytes(lib):
+    """粗估某 library 連結進來的網格 / 影像佔用的記憶體（bytes）。"""
+    total = 0
+    for me in bpy.data.meshes:
+        if me.library == lib:
+            total += len(me.vertices) * 12 + len(me.edges) * 8 \
+                + len(me.loops) * 8 + len(me.polygons) * 12
+    for img in bpy.data.images:
+        if img.library == lib and img.has_data:
+            total += img.size[0] * img.size[1] * img.channels * 4
+    return total
+
 
 class RegionLoader:
     """
     用於從外部 .blend 載入指定 Collection 並建立 Collection Instance。
     使用 link=True：資料仍位於外部檔。
+
+    mode:
+      "exclude"：每個實例放在自己的 layer collection，隱藏時在 view layer 上 exclude，
+                 被排除的區域不進 depsgraph，幾乎不佔評估時間。
+      "flags"  ：舊版作法，只切換實例的 hide_viewport / hide_render。
     """
 
-    def __init__(self, verbose=True):
+    def __init__(self, verbose=True, mode="exclude", tracer=None):
         self.verbose = verbose
+        self.mode = mode
+        self.tracer = tracer  # LatencyTracer：記錄 region_load 耗時
         self.cache = {}  # {collection_name: (collection, instance)}
+        self.lib_refs = {}  # {library 檔案路徑: set(collection_name)}
+        self._pending_libs = []  # 等待批次移除的 library 路徑
+        self._orphans = False  # 有連結集合被釋放但其 library 仍在使用：purge() 時要清孤兒 ID
+
+    @classmethod
+    def adopt(cls, old, *args, **kwargs):
+        """
+        重跑腳本時（service_registry keep=True）：以新參數建立 loader，接手舊 loader 已連結的集合與待清除的 library，
+        不必重新 link。old 可能是 reload 前的類別，只讀取資料屬性。
+        """
+        new = cls(*args, **kwargs)
+        new.cache = old.cache
+        new.lib_refs = old.lib_refs
+        new._pending_libs = old._pending_libs
+        new._orphans = getattr(old, "_orphans", False)
+        return new
 
     def load_collection(self, blend_path, coll_name):
         """從指定的 .blend 檔案載入 Collection"""
-        blend = bpy.path.abspath(blend_path)
-        blend = os.path.abspath(blend)
-        if not os.path.exists(blend):
-            raise FileNotFoundError(f"找不到 .blend 檔案：{blend}")
+        loaded, errors = self.load_collections([(blend_path, coll_name)])
+        if coll_name in errors:
+            raise errors[coll_name]
+        return loaded[coll_name]
 
-        if self.verbose:
-            print(f"[RegionLoader] 正在載入 {blend} 中的集合 {coll_name}")
+    def load_collections(self, requests):
+        """
+        批次載入：requests 為 [(blend_path, coll_name), ...]。
+        依 library 分組，每個 .blend 只開一次，並一次 link 該檔中所有要求的集合；已載入的直接跳過。
+        回傳 (loaded {coll_name: collection}, errors {coll_name: 例外})，單一集合失敗不影響其他集合。
+        """
+        groups = {}  # {library 絕對路徑: [coll_name, ...]}
+        for blend_path, coll_name in requests:
+            names = groups.setdefault(os.path.abspath(bpy.path.abspath(blend_path)), [])
+            if coll_name not in names:
+                names.append(coll_name)
 
-        with bpy.data.libraries.load(blend, link=True) as (data_from, data_to):
-            if coll_name not in data_from.collections:
-                raise ValueError(f"[RegionLoader] 檔案中無此集合: {coll_name}\n可用集合: {list(data_from.collections)}")
-            data_to.collections = [coll_name]
+        loaded, errors = {}, {}
+        for blend, names in groups.items():
+            for n in [n for n in names if n in self.cache]:
+                loaded[n] = self.cache[n][0]
+                names.remove(n)
+            if not names:
+                continue
+            if not os.path.exists(blend):
+                for n in names:
+                    errors[n] = FileNotFoundError(f"找不到 .blend 檔案：{blend}")
+                continue
 
-        col = bpy.data.collections.get(coll_name)
-        if not col:
-            raise RuntimeError(f"[RegionLoader] 無法在 bpy.data.collections 中取得 {coll_name}")
+            if self.verbose:
+                log.info("正在載入 %s 中的集合 %s", blend, ", ".join(names))
 
-        self.cache[coll_name] = (col, None)
-        return col
+            t0 = now()
+            with bpy.data.libraries.load(blend, link=True) as (data_from, data_to):
+                available = list(data_from.collections)
+                found = [n for n in names if n in available]
+                data_to.collections = found
+            for n in names:
+                if n not in found:
+                    errors[n] = ValueError(f"[RegionLoader] 檔案中無此集合: {n}\n可用集合: {available}")
+            for n, col in zip(found, data_to.collections):
+                if not col:
+                    errors[n] = RuntimeError(f"[RegionLoader] 無法在 bpy.data.collections 中取得 {n}")
+                    continue
+                self.cache[n] = (col, None)
+                self.lib_refs.setdefault(_norm_path(blend), set()).add(n)
+                loaded[n] = col
+            if _norm_path(blend) in self._pending_libs:
+                self._pending_libs.remove(_norm_path(blend))
+
+            if self.tracer is not None:
+                self.tracer.since("region_load", t0)
+        return loaded, errors
 
     def create_instance(self, coll_name, instance_name=None, visible=True):
         """
@@ -48,7 +131,7 @@ class RegionLoader:
         exist = bpy.data.objects.get(instance_name)
         if exist and exist.instance_collection == col:
             if self.verbose:
-                print(f"[RegionLoader] 重用現有實例：{instance_name}")
+                log.debug("重用現有實例：%s", instance_name)
             self.set_visible(exist, visible)
             self.cache[coll_name] = (col, exist)
             return exist
@@ -57,31 +140,160 @@ class RegionLoader:
         inst = bpy.data.objects.new(instance_name, None)
         inst.instance_type = 'COLLECTION'
         inst.instance_collection = col
-        bpy.context.scene.collection.objects.link(inst)
+        if self.mode == "exclude":
+            self._holder(instance_name).objects.link(inst)
+        else:
+            bpy.context.scene.collection.objects.link(inst)
         self.set_visible(inst, visible)
 
         self.cache[coll_name] = (col, inst)
         if self.verbose:
-            print(f"[RegionLoader] 建立新實例：{instance_name}")
+            log.info("建立新實例：%s", instance_name)
+        return inst
+
+    def set_lod(self, instance_name, coll_name, visible=True):
+        """
+        把實例切換到另一個已載入的集合（例如同一區域的 LOD 代理），只改 instance_collection，
+        不重建物件；實例不存在時才建立。
+        """
+        if coll_name not in self.cache:
+            raise KeyError(f"[RegionLoader] 尚未載入集合 {coll_name}")
+        col, _ = self.cache[coll_name]
+        inst = bpy.data.objects.get(instance_name)
+        if inst is None:
+            return self.create_instance(coll_name, instance_name, visible=visible)
+
+        old = inst.instance_collection
+        if old != col:
+            if old is not None and old.name in self.cache and self.cache[old.name][1] == inst:
+                self.cache[old.name] = (self.cache[old.name][0], None)
+            inst.instance_collection = col
+            if self.verbose:
+                log.debug("%s → %s", instance_name, coll_name)
+        self.cache[coll_name] = (col, inst)
+        self.set_visible(inst, visible)
         return inst
 
 
+    # === view layer 排除 ===
+    def _holder(self, instance_name):
+        """取得（或建立）放置實例的專屬集合，並掛在場景根集合下。"""
+        name = f"{instance_name}__LAYER"
+        holder = bpy.data.collections.get(name)
+        if holder is None:
+            holder = bpy.data.collections.new(name)
+        if holder.name not in bpy.context.scene.collection.children:
+            bpy.context.scene.collection.children.link(holder)
+        return holder
+
+    def _layer_collection(self, inst):
+        """找出實例所在專屬集合對應的 LayerCollection。"""
+        children = bpy.context.view_layer.layer_collection.children
+        for col in inst.users_collection:
+            lc = children.get(col.name)
+            if lc is not None:
+                return lc
+        return None
+
+    def _remove_holder(self, inst):
+        for col in list(inst.users_collection):
+            if col.name.endswith("__LAYER"):
+                bpy.data.collections.remove(col, do_unlink=True)
+
     def set_visible(self, inst, visible=True):
-        """設定實例是否顯示（viewport + render）。"""
+        """設定實例是否顯示；exclude 模式切換 view layer 排除，否則切換 hide flags。"""
         if not inst:
             return
+        lc = self._layer_collection(inst) if self.mode == "exclude" else None
+        if lc is not None:
+            if lc.exclude == visible:
+                lc.exclude = not visible
+            return
         inst.hide_viewport = not visible
         inst.hide_render = not visible
 
+    def is_visible(self, inst):
+        """實例目前是否顯示（與 set_visible 對應）。"""
+        if not inst:
+            return False
+        lc = self._layer_collection(inst) if self.mode == "exclude" else None
+        if lc is not None:
+            return not lc.exclude
+        return not inst.hide_viewport
+
+    def park(self, coll_name):
+        """
+        停放區域：移除實例與其專屬集合，但保留 library 與連結的集合（仍在 cache 中），
+        場景中不再有任何東西需要評估；之後 create_instance 可立即恢復，不必重新 link。
+        """
+        if coll_name not in self.cache:
+            return
+        col, inst = self.cache[coll_name]
+        if inst and inst.name in bpy.data.objects:
+            self._remove_holder(inst)
+            bpy.data.objects.remove(inst, do_unlink=True)
+        self.cache[coll_name] = (col, None)
+        if self.verbose:
+            log.info("已停放 %s", coll_name)
+
     def unload(self, coll_name):
-        """移除指定集合與其實例（若存在）。"""
+        """
+        移除指定集合與其實例（若存在）。
+        該 .blend 已無其他集合使用時，library 會排入待移除清單，由 purge() 批次釋放。
+        """
         if coll_name not in self.cache:
             return
         col, inst = self.cache[coll_name]
         if inst and inst.name in bpy.data.objects:
+            self._remove_holder(inst)
             bpy.data.objects.remove(inst, do_unlink=True)
-        if col and col.users == 0:
+
+        lib_path = _norm_path(col.library.filepath) if col and col.library else None
+        if lib_path is None and col and col.users == 0:
             bpy.data.collections.remove(col, do_unlink=True)
-        if self.verbose:
-            print(f"[RegionLoader] 已釋放 {coll_name}")
         self.cache.pop(coll_name, None)
+
+        if lib_path is not None:
+            refs = self.lib_refs.get(lib_path, set())
+            refs.discard(coll_name)
+            if not refs:
+                self.lib_refs.pop(lib_path, None)
+                if lib_path not in self._pending_libs:
+                    self._pending_libs.append(lib_path)
+            else:
+                self._orphans = True  # 同檔的其他集合（例如 LOD 代理）仍在用：只能靠孤兒清除釋放
+        if self.verbose:
+            log.info("已釋放 %s", coll_name)
+
+    def purge(self, max_libraries=None):
+        """
+        批次移除待釋放的 library（連同其連結的 ID），再清除連結資料留下的孤兒 ID
+        （包含 library 仍在使用、但已被 unload 的集合）。
+        回傳報告 {"libraries": [...], "ids_freed": {類型: 數量}, "est_bytes": int}。
+        """
+        pending = self._pending_libs[:max_libraries] if max_libraries else list(self._pending_libs)
+        report = {"libraries": [], "ids_freed": {}, "est_bytes": 0}
+        if not pending and not self._orphans:
+            return report
+
+        before = {t: len(getattr(bpy.data, t)) for t in ID_TYPES}
+        for lib in list(bpy.data.libraries):
+            path = _norm_path(lib.filepath)
+            if path in pending:
+                report["est_bytes"] += _estimate_bytes(lib)
+                report["libraries"].append(path)
+                bpy.data.libraries.remove(lib)
+        for path in pending:
+            self._pending_libs.remove(path)
+
+        # 只清除連結進來的孤兒 ID；使用者 .blend 裡暫時沒有使用者的本地資料（材質、網格等）不能動
+        bpy.data.orphans_purge(do_local_ids=False, do_linked_ids=True, do_recursive=True)
+        self._orphans = False
+
+        after = {t: len(getattr(bpy.data, t)) for t in ID_TYPES}
+        report["ids_freed"] = {t: before[t] - after[t] for t in ID_TYPES if before[t] != after[t]}
+        if self.verbose:
+            freed = sum(report["ids_freed"].values())
+            log.info("已移除 %d 個 library，釋放 %d 個 ID（約 %.1f MB）",
+                     len(report["libraries"]), freed, report["est_bytes"] / 1048576)
+        return report
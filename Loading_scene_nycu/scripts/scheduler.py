@@ -0,0 +1,119 @@
+import heapq, itertools, time, types
+from uav_log import get_logger, flush_all
+from service_registry import register_timer
+
+log = get_logger("sched")
+
+# === 優先權（數字越小越先執行）===
+PRIO_POSE = 0      # UAV / 地圖姿態更新
+PRIO_REGION = 10   # 區域載入 / 顯示 / 卸載
+PRIO_PURGE = 20    # library 釋放、孤兒清除
+PRIO_IDLE = 30     # 視角對準等可延後的工作
+
+
+class JobScheduler:
+    """
+    Blender 主執行緒的協作式排程器：只註冊一個 bpy.app.timers callback，
+    每個 tick 依優先權執行工作，直到用完 budget_ms。
+
+    工作可以是：
+      - 一般 callable：執行一次即完成；
+      - generator（或回傳 generator 的 callable）：每次 next() 執行一步，
+        yield 之間交還控制權，讓高優先權工作（姿態更新）插隊。
+    同一個 key 的待執行工作會被新提交的取代（例如只保留最新一筆姿態）。
+    timer 以 channel 登記在 service_registry：重跑腳本建立的新排程器會接手同一個 timer。
+    """
+
+    def __init__(self, budget_ms=8.0, interval=0.01, verbose=True, channel="jobs"):
+        self.budget = budget_ms / 1000.0
+        self.interval = interval
+        self.verbose = verbose
+        self.channel = channel
+        self.running = False
+        self._heap = []      # [(priority, seq, key)]
+        self._jobs = {}      # {key: (seq, job)}
+        self._cost = {}      # {key: 上一步耗時 (s)}
+        self._seq = itertools.count()
+
+    def submit(self, job, priority=PRIO_REGION, key=None):
+        """提交工作；回傳 key。"""
+        if key is None:
+            key = ("job", next(self._seq))
+        seq = next(self._seq)
+        self._jobs[key] = (seq, job)
+        heapq.heappush(self._heap, (priority, seq, key))
+        return key
+
+    def cancel(self, key):
+        self._jobs.pop(key, None)
+
+    def pending(self):
+        return len(self._jobs)
+
+    def _step(self, key, job):
+        """執行一步；回傳 (是否完成, 下次要執行的 job)。"""
+        if not isinstance(job, types.GeneratorType):
+            job = job()
+            if not isinstance(job, types.GeneratorType):
+                return True, None
+        try:
+            next(job)
+        except StopIteration:
+            return True, None
+        return False, job
+
+    def run_pending(self, budget=None):
+        """執行工作直到 budget 用完（每次呼叫至少執行一步）。"""
+        budget = self.budget if budget is None else budget
+        start = time.perf_counter()
+        steps = 0
+        while self._heap:
+            priority, seq, key = self._heap[0]
+            entry = self._jobs.get(key)
+            if entry is None or entry[0] != seq:
+                heapq.heappop(self._heap)  # 已被取代或取消
+                continue
+
+            elapsed = time.perf_counter() - start
+            if steps and elapsed + self._cost.get(key, 0.0) > budget:
+                break
+
+            heapq.heappop(self._heap)
+            t0 = time.perf_counter()
+            try:
+                done, job = self._step(key, entry[1])
+            except Exception as e:
+                done, job = True, None
+                log.error("工作 %s 執行錯誤：%s", key, e)
+            self._cost[key] = time.perf_counter() - t0
+            steps += 1
+
+            if done:
+                if self._jobs.get(key, (None,))[0] == seq:
+                    self._jobs.pop(key, None)
+            elif self._jobs.get(key, (None,))[0] == seq:
+                # 同優先權的工作輪流執行
+                self.submit(job, priority, key)
+        return steps
+
+    def _timer(self):
+        if not self.running:
+            return None
+        self.run_pending()
+        return self.interval
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        register_timer(self.channel, self._timer, first_interval=self.interval)
+        if self.verbose:
+            log.info("啟動排程器，每 tick 預算 %.1f ms", self.budget * 1000)
+
+    def stop(self):
+        self.running = False
+        self._heap.clear()
+        self._jobs.clear()
+        if self.verbose:
+            log.info("停止排程器。")
+        flush_all()
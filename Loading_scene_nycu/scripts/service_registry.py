@@ -0,0 +1,131 @@
+import bpy
+from uav_log import get_logger
+
+log = get_logger("services")
+
+# === 跨「重跑腳本」存活的服務登錄表 ===
+# 在文字編輯器重跑 main.py / uav_location_listener.py 時，模組會被 reload、全域變數全部重建，
+# 但上一輪註冊的 bpy.app.timers 仍在執行。登錄表放在 bpy.app.driver_namespace（整個工作階段共用）：
+#   - register_timer(channel, func)：每個 channel 只有一個 timer（trampoline），每次觸發時才查目前登記的 func；
+#     重跑只會替換 func（hot swap），不會再多註冊一個 timer；
+#   - service(name, cls, ...)：同名服務已存在時先 stop() 舊的再建立新的；
+#     keep=True 時以 cls.adopt(old, ...) 建立新物件並接手舊物件的狀態（例如 RegionLoader 的 cache 與已連結的 library）。
+# 開啟另一個 .blend 後由 load_post handler 清空登錄表（舊檔的 ID 已失效，timer 也已被 Blender 移除）；
+# 另存新檔 / 第一次存檔不會觸發 load_post，服務與 timer 照常執行。
+NAMESPACE = "uav_services"
+
+
+def _registry():
+    ns = bpy.app.driver_namespace
+    reg = ns.get(NAMESPACE)
+    if reg is None:
+        reg = ns[NAMESPACE] = {"timers": {}, "services": {}}
+    return reg
+
+
+@bpy.app.handlers.persistent
+def _on_load_post(*_):
+    reg = bpy.app.driver_namespace.pop(NAMESPACE, None)
+    if reg is None:
+        return
+    for name, obj in reg["services"].items():
+        stop = getattr(obj, "stop", None)  # 例如關閉 socket / 執行緒；舊檔的 ID 已失效，失敗就略過
+        if callable(stop):
+            try:
+                stop()
+            except Exception as e:
+                log.warning("開檔時停止服務 %s 失敗：%s", name, e)
+    log.info("已開啟新檔案，清空服務登錄表")
+
+
+# 重跑腳本時先移除上一輪（reload 前）的 handler，只保留一個
+_handlers = bpy.app.handlers.load_post
+for h in [h for h in _handlers if getattr(h, "__name__", "") == _on_load_post.__name__
+          and getattr(h, "__module__", "") == __name__]:
+    _handlers.remove(h)
+_handlers.append(_on_load_post)
+
+
+# === timer channel ===
+def _trampoline(channel):
+    def tick():
+        timers = _registry()["timers"]
+        entry = timers.get(channel)
+        if entry is None or entry["tick"] is not tick:
+            return None  # 已被取代或移除
+        interval = entry["func"]()
+        if interval is None:
+            timers.pop(channel, None)
+        return interval
+    return tick
+
+
+def register_timer(channel, func, first_interval=0.0):
+    """
+    func 的回傳值與 bpy.app.timers 相同（下次間隔秒數，None = 結束）。
+    channel 已有執行中的 timer 時只替換 func，回傳 False；新註冊 timer 時回傳 True。
+    """
+    timers = _registry()["timers"]
+    entry = timers.get(channel)
+    if entry is not None and bpy.app.timers.is_registered(entry["tick"]):
+        entry["func"] = func
+        log.debug("timer %s 已替換 callback", channel)
+        return False
+    tick = _trampoline(channel)
+    timers[channel] = {"func": func, "tick": tick}
+    bpy.app.timers.register(tick, first_interval=first_interval)
+    log.debug("註冊 timer %s", channel)
+    return True
+
+
+def unregister_timer(channel):
+    entry = _registry()["timers"].pop(channel, None)
+    if entry is not None and bpy.app.timers.is_registered(entry["tick"]):
+        bpy.app.timers.unregister(entry["tick"])
+
+
+def active_timers():
+    """目前執行中的 channel 名稱（除錯用）。"""
+    return [k for k, v in _registry()["timers"].items() if bpy.app.timers.is_registered(v["tick"])]
+
+
+# === 服務 ===
+def service(name, cls, *args, keep=False, **kwargs):
+    """
+    取得名為 name 的服務：
+      keep=False：舊的（若有）先 stop()，再以 cls(*args, **kwargs) 建立新的；
+      keep=True ：已有同類別名稱的物件時，以 cls.adopt(old, *args, **kwargs) 建立新物件並接手舊物件的狀態
+                  （新參數照常生效；舊物件可能來自 reload 前的類別，adopt 只讀它的資料屬性）。
+                  cls 沒有 adopt 時退回 keep=False 的作法。
+    """
+    services = _registry()["services"]
+    old = services.get(name)
+    if old is not None:
+        adopt = getattr(cls, "adopt", None)
+        if keep and callable(adopt) and type(old).__qualname__ == cls.__qualname__:
+            obj = services[name] = adopt(old, *args, **kwargs)
+            log.info("沿用服務 %s 的狀態", name)
+            return obj
+        stop = getattr(old, "stop", None)
+        if callable(stop):
+            try:
+                stop()
+            except Exception as e:
+                log.warning("停止舊服務 %s 失敗：%s", name, e)
+    obj = services[name] = cls(*args, **kwargs)
+    return obj
+
+
+def stop_all():
+    """停止所有服務並移除所有 timer（例如要完全重設時在 Python Console 呼叫）。"""
+    reg = _registry()
+    for name, obj in list(reg["services"].items()):
+        stop = getattr(obj, "stop", None)
+        if callable(stop):
+            try:
+                stop()
+            except Exception as e:
+                log.warning("停止服務 %s 失敗：%s", name, e)
+    reg["services"].clear()
+    for channel in list(reg["timers"]):
+        unregister_timer(channel)
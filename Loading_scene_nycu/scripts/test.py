@@ -1,7 +1,15 @@
 import json, time, os, math
+from latency_trace import stamp, now
+from pose_codec import PoseEncoder
+import uav_log
+
+uav_log.setup("INFO")
+log = uav_log.get_logger("update")
 
 # === 基本設定 ===
 JSON_PATH = r"E:\NYCU\topic2\Loading_scene_nycu\jason\uav_from_sionna.json"
+POSE_PATH = r"E:\NYCU\topic2\Loading_scene_nycu\jason\uav_pose.bin"
+USE_BINARY = True  # True: 寫二進位姿態訊息（pose_codec）；False: 寫舊版 JSON
 
 # 三個區域在 X 軸上的中心座標
 REGION_CENTERS = {
@@ -15,11 +23,21 @@ uav = {"x": 0.0, "y": 0.0, "z": 150.0}
 vx = 100.0        # UAV 速度 (Blender 單位/秒)
 dt = 0.05          # 更新間隔 (秒)
 direction = +1    # +1 表示往右，-1 表示往左
+seq = 0           # 訊息序號（延遲追蹤用）
+
+# === 距離閾值設定（連同 REGION_CENTERS 放在 header 傳給接收端，main.py / reverse.py 的遲滯判斷沿用）===
+# UAV 在 ±1500 之間往返，與最遠區域的距離最多 3000：PARK_DIST 要明顯小於它，
+# 接收端（再加 REGION_MARGIN 與 unload 去彈跳）才真的會卸載，四種狀態都會被走到。
+SHOW_DIST = 1000.0   # 進入可視範圍 → show
+HIDE_DIST = 1800.0   # 還在附近但太遠 → hide
+PARK_DIST = 2200.0   # 更遠 → park（保留 library，不留實例）
+# 超過 PARK_DIST 的區域不寫入 JSON（代表要卸載）
 
-# === 距離閾值設定 ===
-SHOW_DIST = 1500.0   # 進入可視範圍 → show
-HIDE_DIST = 2500.0   # 還在附近但太遠 → hide
-# 超過 HIDE_DIST 的區域不寫入 JSON（代表要卸載）
+# 接收端量距離用的中心與距離（header / 舊版 JSON 都會帶）
+REGION_INFO = {
+    "region_centers": {name: [cx, 0.0] for name, cx in REGION_CENTERS.items()},
+    "region_thresholds": [SHOW_DIST, HIDE_DIST, PARK_DIST],
+}
 
 # === 計算工具 ===
 def distance_to_region(region_name):
@@ -36,12 +54,15 @@ def build_json():
             regions[name] = "show"
         elif d <= HIDE_DIST:
             regions[name] = "hide"
+        elif d <= PARK_DIST:
+            regions[name] = "park"
         # 超過範圍的區域不寫入 → 表示應該 unload
 
     return {
         "version": 1,
         "regions": regions,
         "remove_unlisted": True,
+        **REGION_INFO,
         "uav": {
             "x": round(uav["x"], 2),
             "y": round(uav["y"], 2),
@@ -49,6 +70,9 @@ def build_json():
         },
     }
 
+# header（區域表等不變的資訊）只編碼一次
+encoder = PoseEncoder({"regions": list(REGION_CENTERS), "remove_unlisted": True, "objects": ["UAV"], **REGION_INFO})
+
 # === 主模擬迴圈 ===
 print("🚁 UAV 距離式載入模擬開始 (Ctrl+C 停止)\n")
 
@@ -64,13 +88,19 @@ while True:
         uav["x"] = -1500
         direction = +1
 
-    # 建立 JSON 並寫入
-    data = build_json()
-    with open(JSON_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    # 建立訊息並寫入（寫入前打上送出時間）
+    seq += 1
+    if USE_BINARY:
+        data = build_json()
+        frame = encoder.frame(seq, now(), (uav["x"], uav["y"], uav["z"]), data["regions"])
+        encoder.write(POSE_PATH, frame)
+    else:
+        data = stamp(build_json(), seq)
+        with open(JSON_PATH, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
 
     # 印出狀態
     summary = ", ".join(f"{k}:{v}" for k, v in data["regions"].items())
-    print(f"[update] X={uav['x']:7.1f} | {summary}")
+    log.every("tick", "X=%7.1f | %s", uav["x"], summary)
 
     time.sleep(dt)
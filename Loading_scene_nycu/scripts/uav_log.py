@@ -0,0 +1,109 @@
+import logging, sys, time
+
+ROOT = "uav"
+_loggers = {}
+
+
+class _TagFormatter(logging.Formatter):
+    """輸出成原本的 "[tag] 訊息" 格式；檔案輸出另外加上時間。"""
+
+    def __init__(self, with_time=False):
+        super().__init__()
+        self.with_time = with_time
+
+    def format(self, record):
+        tag = record.name[len(ROOT) + 1:] if record.name.startswith(ROOT + ".") else record.name
+        msg = f"[{tag}] {record.getMessage()}"
+        if record.levelno >= logging.WARNING:
+            msg = f"{msg}（{record.levelname}）"
+        if self.with_time:
+            msg = f"{self.formatTime(record, '%H:%M:%S')}.{int(record.msecs):03d} {msg}"
+        return msg
+
+
+def setup(level="INFO", file=None, console=True):
+    """
+    設定共用 logger 的等級與輸出位置（console / 可選的檔案）。
+    重新執行腳本時可重複呼叫，舊的 handler 會先移除，不會重複輸出。
+    """
+    root = logging.getLogger(ROOT)
+    root.setLevel(level)
+    root.propagate = False
+    for h in list(root.handlers):
+        root.removeHandler(h)
+        h.close()
+    if console:
+        h = logging.StreamHandler(sys.stdout)
+        h.setFormatter(_TagFormatter())
+        root.addHandler(h)
+    if file:
+        h = logging.FileHandler(file, encoding="utf-8")
+        h.setFormatter(_TagFormatter(with_time=True))
+        root.addHandler(h)
+    return root
+
+
+class RateLimitedLogger:
+    """
+    帶等級與限流的 logger。
+    一般訊息用 debug / info / warning / error；每個 tick 都會出現的訊息用 every()，
+    同一 key 在 interval 秒內只輸出一次，並附上期間內的累計次數；
+    停止時呼叫 flush()，把最後一段還沒輸出的累計印出來。
+    訊息採 % 格式，只有真的要輸出時才格式化。
+    """
+
+    def __init__(self, tag):
+        self.logger = logging.getLogger(f"{ROOT}.{tag}")
+        self._agg = {}  # {key: [期間內次數, 期間起點, 最後一次的 (level, msg, args)]}
+
+    def debug(self, msg, *args):
+        self.logger.debug(msg, *args)
+
+    def info(self, msg, *args):
+        self.logger.info(msg, *args)
+
+    def warning(self, msg, *args):
+        self.logger.warning(msg, *args)
+
+    def error(self, msg, *args):
+        self.logger.error(msg, *args)
+
+    def every(self, key, msg, *args, interval=1.0, level=logging.INFO):
+        if not self.logger.isEnabledFor(level):
+            return
+        t = time.monotonic()
+        ent = self._agg.get(key)
+        if ent is None:
+            self._agg[key] = [0, t, None]
+            self.logger.log(level, msg, *args)
+            return
+        ent[0] += 1
+        ent[2] = (level, msg, args)
+        if t - ent[1] >= interval:
+            self._emit(ent, t)
+
+    def _emit(self, ent, t):
+        n, span = ent[0], t - ent[1]
+        level, msg, args = ent[2]
+        ent[0], ent[1] = 0, t
+        self.logger.log(level, msg + "（過去 %.1fs 共 %d 次）", *args, span, n)
+
+    def flush(self):
+        """輸出每個 key 被壓下、還沒印出的累計（以最後一次的訊息內容）。"""
+        t = time.monotonic()
+        for ent in self._agg.values():
+            if ent[0]:
+                self._emit(ent, t)
+
+
+def flush_all():
+    """所有 logger 的 flush()：停止監聽 / 排程器時呼叫，最後一段限流訊息不會被吞掉。"""
+    for log in _loggers.values():
+        log.flush()
+
+
+def get_logger(tag):
+    log = _loggers.get(tag)
+    if log is None:
+        log = _loggers[tag] = RateLimitedLogger(tag)
+    return log
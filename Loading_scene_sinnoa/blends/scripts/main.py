@@ -247,11 +247,22 @@ def on_uav_update(data):
 
 
 # === 啟動單一 JSON 監聽，但綁兩個 callback ===
+# 在文字編輯器重跑本腳本時，上一輪的 timer 仍在執行：把執行中的 watcher 放在 bpy.app.driver_namespace
+# （整個工作階段共用），重跑時先停止並移除舊的 timer，避免多個 watcher 同時處理同一個 JSON。
+NAMESPACE = "uav_main_watcher"
+
+
 def start_watch():
+    old = bpy.app.driver_namespace.pop(NAMESPACE, None)
+    if old is not None:
+        old.stop()
+        if bpy.app.timers.is_registered(old._timer):
+            bpy.app.timers.unregister(old._timer)
     watcher = JSONWatcher(json_path=JSON_PATH, interval=INTERVAL, verbose=True)
     watcher.add_callback(on_region_update)
     watcher.add_callback(on_uav_update)
     watcher.start()
+    bpy.app.driver_namespace[NAMESPACE] = watcher
     print(f"[main] 已啟動監聽：{bpy.path.abspath(JSON_PATH)}")
     return watcher
 
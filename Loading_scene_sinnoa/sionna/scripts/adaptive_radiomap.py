@@ -0,0 +1,116 @@
+# === 自適應取樣的 RadioMapSolver：分批加樣本，收斂就停 ===
+import time
+import numpy as np
+
+Z = {0.90: 1.645, 0.95: 1.960, 0.99: 2.576}  # 常態分布雙尾信賴係數
+
+
+def _numpy(v):
+    return v.numpy() if hasattr(v, "numpy") else np.asarray(v)
+
+
+class Welford:
+    """
+    逐批更新每個格子的加權平均與變異數（Welford / West 演算法，不保留每批結果）。
+    權重為該批的樣本數：大批次的估計較準，權重也較大。
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.weight = 0.0
+        self.mean = None
+        self.m2 = None
+
+    def add(self, x, w=1.0):
+        x = np.asarray(x, np.float64)
+        if self.mean is None:
+            self.mean = np.zeros_like(x)
+            self.m2 = np.zeros_like(x)
+        self.n += 1
+        self.weight += w
+        delta = x - self.mean
+        self.mean += (w / self.weight) * delta
+        self.m2 += w * delta * (x - self.mean)
+
+    def var_of_mean(self):
+        """平均值的變異數估計（等權重時即 s² / n）。"""
+        return self.m2 / (self.weight * max(self.n - 1, 1))
+
+
+def set_path_gain(rm, path_gain):
+    """
+    把 path_gain [num_tx, H, W] 寫回 RadioMap，之後 scene.render / preview、rss、sinr、
+    sample_positions 用的都是這份資料（Sionna RT 1.x 的 path_gain 由 _pathgain_map 提供）。
+    """
+    import mitsuba as mi
+    if not hasattr(rm, "_pathgain_map"):
+        raise AttributeError("[adaptive-rm] 這個版本的 RadioMap 沒有 _pathgain_map，無法寫回平均值")
+    rm._pathgain_map = mi.TensorXf(np.ascontiguousarray(path_gain, np.float32))
+    return rm
+
+
+def adaptive_radio_map(solver, scene, max_samples=10**7, batch_samples=10**5, growth=1.5,
+                       tol_db=0.5, confidence=0.95, quantile=0.95, min_batches=4,
+                       roi=None, floor_db=-130.0, seed=0, verbose=True, **solver_kwargs):
+    """
+    以不同 seed 重複呼叫 solver(scene, samples_per_tx=..., ...)，第一批 batch_samples 個樣本，
+    之後每批乘上 growth（減少呼叫次數）；每批的 path gain 當成獨立估計，逐格累積加權平均與變異數。
+
+    停止條件：在關注的格子中，有 quantile 比例的格子其平均值的信賴區間半寬
+    （confidence 信心水準）換算成 dB 後 ≤ tol_db；或累計樣本數達到 max_samples。
+    roi：[H, W] bool 遮罩，或 None（平均 path gain 高於 floor_db 的格子）。
+
+    回傳 dict：
+      path_gain [num_tx, H, W]（各批平均，等同於用 samples 個樣本算一次）、
+      rm（最後一批的 RadioMap，path_gain 已換成上述平均值，可直接 render / preview / sample_positions）、
+      samples、batches、elapsed、est_full、saved、converged、err_db。
+    """
+    z = Z.get(confidence, 1.960)
+    stats = Welford()
+    t0 = time.perf_counter()
+    rm, err_db, converged = None, float("inf"), False
+    samples, size = 0, float(batch_samples)
+
+    while samples < max_samples:
+        n = int(min(size, max_samples - samples))
+        rm = solver(scene, samples_per_tx=n, seed=seed + stats.n, **solver_kwargs)
+        stats.add(_numpy(rm.path_gain), n)
+        samples += n
+        size *= growth
+        if stats.n < min_batches:
+            continue
+
+        mean = stats.mean
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rel = z * np.sqrt(stats.var_of_mean()) / mean
+            mask = (10.0 * np.log10(mean) > floor_db) if roi is None else np.broadcast_to(roi, mean.shape)
+        mask = mask & (mean > 0)
+        if not mask.any():
+            continue
+        err_db = float(np.quantile(10.0 * np.log10(1.0 + rel[mask]), quantile))
+        if verbose:
+            print(f"[adaptive-rm] 第 {stats.n} 批（累計 {samples:.2e} 樣本）："
+                  f"{int(quantile * 100)}% 格子誤差 ≤ {err_db:.2f} dB（{int(mask.sum())} 格）")
+        if err_db <= tol_db:
+            converged = True
+            break
+
+    set_path_gain(rm, stats.mean)
+    elapsed = time.perf_counter() - t0
+    est_full = elapsed * max_samples / samples  # 假設耗時與樣本數成正比
+    result = {
+        "path_gain": stats.mean,
+        "rm": rm,
+        "samples": samples,
+        "batches": stats.n,
+        "elapsed": elapsed,
+        "est_full": est_full,
+        "saved": max(0.0, est_full - elapsed),
+        "converged": converged,
+        "err_db": err_db,
+    }
+    if verbose:
+        state = "收斂" if converged else "未收斂（已達 max_samples）"
+        print(f"[adaptive-rm] {state}：用了 {samples:.2e} / {max_samples:.2e} 樣本，"
+              f"{elapsed:.1f}s（估計省下 {result['saved']:.1f}s）")
+    return result
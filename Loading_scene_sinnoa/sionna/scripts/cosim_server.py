@@ -0,0 +1,345 @@
+# === Sionna RT 共同模擬伺服器：擁有模擬時鐘，與 Blender 以 ack 同步前進 ===
+import os, sys, math, time, socket, selectors
+import numpy as np
+
+# pose_codec / latency_trace 與 Blender 端共用（Loading_scene_nycu/scripts）
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARED_DIR = os.path.normpath(os.path.join(SCRIPTS_DIR, "..", "..", "..", "Loading_scene_nycu", "scripts"))
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
+
+from pose_codec import PoseEncoder, StreamReader, pack, decode_ack
+from latency_trace import now
+from region_composer import REGION_MAP
+from link_metrics import link_gain_db, link_quality
+
+HOST = "127.0.0.1"
+PORT = 5555
+
+# === 區域狀態距離（與 test.py 相同；連同各 tile 中心放在 header 傳給 Blender 端的遲滯判斷）===
+SHOW_DIST = 1000.0
+HIDE_DIST = 1800.0
+PARK_DIST = 2200.0
+
+
+def region_states(pos, region_map=REGION_MAP):
+    """依 UAV 與各 tile 中心的水平距離決定 show / hide / park；更遠的不列出（代表卸載）。"""
+    regions = {}
+    for name, info in region_map.items():
+        px, py = info.get("pos", (0.0, 0.0, 0.0))[:2]
+        d = math.hypot(pos[0] - px, pos[1] - py)
+        if d <= SHOW_DIST:
+            regions[name] = "show"
+        elif d <= HIDE_DIST:
+            regions[name] = "hide"
+        elif d <= PARK_DIST:
+            regions[name] = "park"
+    return regions
+
+
+def ping_pong(start, end, speed):
+    """在 start / end 之間來回的等速軌跡；回傳 f(t) → [x, y, z]。"""
+    start, end = np.asarray(start, float), np.asarray(end, float)
+    length = float(np.linalg.norm(end - start))
+    period = 2.0 * length / speed
+
+    def traj(t):
+        s = (t % period) * speed
+        if s > length:
+            s = 2.0 * length - s
+        return (start + (end - start) * (s / length)).tolist()
+    return traj
+
+
+def to_float(v):
+    """Sionna / Dr.Jit 的純量或單元素陣列 → Python float。"""
+    return float(np.asarray(v, dtype=np.float64).ravel()[0])
+
+
+class _Subscriber:
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.reader = StreamReader()
+        self.out = bytearray()
+        self.acked = -1      # 已確認的最大 seq（ack 為累積式）
+        self.t_wait = None   # 開始等待 ack 的時間
+
+
+class CoSimServer:
+    """
+    共同模擬伺服器：
+      - 模擬時鐘由伺服器持有，每步依 trajectory 移動 UAV、呼叫 movers 移動其他物件，
+        （可選）以 RegionComposer 換 tile，接著執行 PathSolver；
+      - 每步把姿態 frame（含區域狀態）與連結指標以 localhost TCP 推送給所有 Blender 訂閱端；
+      - 訂閱端套用完回覆 ack，未確認的步數達到 window 時暫停前進（backpressure）；
+      - realtime=True 依模擬時間對齊牆鐘，False 則只受 ack 限制（Blender headless 時可快於即時）。
+    所有等待都在 selector.select() 上阻塞，不做 busy sleep。
+    """
+
+    def __init__(self, scene, uav, trajectory, dt=0.05, host=HOST, port=PORT,
+                 window=2, realtime=False, solver=None, solver_kwargs=None,
+                 movers=None, composer=None, region_map=None, object_name="UAV",
+                 ack_timeout=30.0, verbose=True):
+        self.scene = scene
+        self.uav = uav
+        self.trajectory = trajectory
+        self.dt = dt
+        self.host, self.port = host, port
+        self.window = window
+        self.realtime = realtime
+        self.solver = solver
+        self.solver_kwargs = solver_kwargs or {"max_depth": 5}
+        self.movers = list(movers or [])
+        self.composer = composer
+        self.region_map = region_map or (composer.region_map if composer else REGION_MAP)
+        self.ack_timeout = ack_timeout
+        self.verbose = verbose
+
+        self.t = 0.0
+        self.seq = 0
+        self.subscribers = {}   # {fileno: _Subscriber}
+        self._sel = selectors.DefaultSelector()
+        self._listener = None
+        self.stats = {"steps": 0, "solve": 0.0, "wait": 0.0}
+
+        self.links = list(scene.receivers)
+        self.metric_fields = ["gain_db", "rx_dbm", "sinr_db"]
+        self.encoder = PoseEncoder({
+            "regions": list(self.region_map),
+            "remove_unlisted": True,
+            "objects": [object_name],
+            "links": self.links,
+            "metric_fields": self.metric_fields,
+            "dt": dt,
+            "region_centers": {k: list(v.get("pos", (0.0, 0.0, 0.0))[:2]) for k, v in self.region_map.items()},
+            "region_thresholds": [SHOW_DIST, HIDE_DIST, PARK_DIST],
+        })
+
+    # === 連線 ===
+    def listen(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen()
+        sock.setblocking(False)
+        self._sel.register(sock, selectors.EVENT_READ, None)
+        self._listener = sock
+        if self.verbose:
+            print(f"[cosim] 監聽 {self.host}:{self.port}")
+
+    def _accept(self):
+        sock, addr = self._listener.accept()
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sub = _Subscriber(sock, addr)
+        sub.acked = self.seq - 1  # 新訂閱端從下一步開始計算
+        sub.out += pack(self.encoder.header)
+        self.subscribers[sock.fileno()] = sub
+        self._sel.register(sock, selectors.EVENT_READ | selectors.EVENT_WRITE, sub)
+        if self.verbose:
+            print(f"[cosim] 訂閱端連線：{addr}")
+
+    def _drop(self, sub, reason=""):
+        self._sel.unregister(sub.sock)
+        self.subscribers.pop(sub.sock.fileno(), None)
+        sub.sock.close()
+        if self.verbose:
+            print(f"[cosim] 訂閱端斷線：{sub.addr} {reason}")
+
+    def _handle(self, sub, events):
+        if events & selectors.EVENT_READ:
+            try:
+                data = sub.sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                data = None
+            except OSError as e:
+                return self._drop(sub, str(e))
+            if data == b"":
+                return self._drop(sub)
+            for record in sub.reader.feed(data or b""):
+                header_id, seq = decode_ack(record)
+                if header_id == self.encoder.header_id and seq > sub.acked:
+                    sub.acked = seq
+                    sub.t_wait = None
+        if events & selectors.EVENT_WRITE and sub.out:
+            try:
+                sent = sub.sock.send(sub.out)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError as e:
+                return self._drop(sub, str(e))
+            del sub.out[:sent]
+        # 只有待送資料時才關心可寫事件，避免 select 空轉
+        mask = selectors.EVENT_READ | (selectors.EVENT_WRITE if sub.out else 0)
+        self._sel.modify(sub.sock, mask, sub)
+
+    def poll(self, timeout):
+        """等待 socket 事件最多 timeout 秒（None = 無限期），處理連線、ack 與送出。"""
+        for key, events in self._sel.select(timeout):
+            if key.data is None:
+                self._accept()
+            else:
+                self._handle(key.data, events)
+
+    def wait_for_subscribers(self, count=1, timeout=None):
+        """阻塞直到至少 count 個訂閱端連線；回傳是否達成。"""
+        deadline = None if timeout is None else now() + timeout
+        while len(self.subscribers) < count:
+            remaining = None if deadline is None else deadline - now()
+            if remaining is not None and remaining <= 0:
+                return False
+            self.poll(remaining)
+        return True
+
+    # === 同步 ===
+    def _lagging(self):
+        return [s for s in self.subscribers.values() if self.seq - 1 - s.acked >= self.window]
+
+    def _wait_window(self):
+        """backpressure：任一訂閱端未確認步數達到 window 就等待其 ack；逾時者斷線。"""
+        t0 = now()
+        while True:
+            lagging = self._lagging()
+            if not lagging:
+                break
+            t = now()
+            for sub in lagging:
+                if sub.t_wait is None:
+                    sub.t_wait = t
+                elif t - sub.t_wait > self.ack_timeout:
+                    self._drop(sub, f"（{self.ack_timeout:.0f}s 未回覆 ack）")
+            if self._lagging():
+                self.poll(min(s.t_wait for s in self._lagging()) + self.ack_timeout - t)
+        self.stats["wait"] += now() - t0
+
+    def _wait_until(self, deadline):
+        """realtime 模式：一邊處理 socket 事件一邊等到 deadline。"""
+        while True:
+            remaining = deadline - now()
+            if remaining <= 0:
+                return
+            self.poll(remaining)
+
+    def _publish(self, records):
+        data = b"".join(pack(r) for r in records)
+        for sub in list(self.subscribers.values()):
+            sub.out += data
+            self._handle(sub, selectors.EVENT_WRITE)
+
+    # === 模擬 ===
+    def link_metrics(self, paths):
+        """每個接收端一組指標，依 header["links"] × header["metric_fields"] 排列。"""
+        names = list(self.scene.transmitters)
+        powers = [to_float(self.scene.transmitters[n].power_dbm) for n in names]
+        noise_dbm = 10.0 * np.log10(to_float(self.scene.thermal_noise_power)) + 30.0
+        return link_quality(link_gain_db(paths), powers, names.index(self.uav.name), noise_dbm).tolist()
+
+    def link_positions(self):
+        """各連結接收端目前的位置（接收端可能被 movers 移動，每步隨指標一起送出）。"""
+        return [[to_float(c) for c in self.scene.receivers[n].position] for n in self.links]
+
+    def step(self):
+        """前進一步：移動 → （換 tile）→ 解路徑 → 推送。"""
+        pos = [float(c) for c in self.trajectory(self.t)]
+        self.uav.position = pos
+        for move in self.movers:
+            move(self.t, self.dt)
+        if self.composer is not None:
+            self.scene = self.composer.update(pos)
+
+        values = None
+        if self.solver is not None and self.links:
+            t0 = now()
+            paths = self.solver(self.scene, **self.solver_kwargs)
+            values = self.link_metrics(paths)
+            self.stats["solve"] += now() - t0
+
+        records = [self.encoder.frame(self.seq, now(), pos, region_states(pos, self.region_map))]
+        if values is not None:
+            records.append(self.encoder.metrics(self.seq, values, self.link_positions()))
+        self._publish(records)
+
+        self.seq += 1
+        self.t += self.dt
+        self.stats["steps"] += 1
+        return pos, values
+
+    def run(self, duration=None, steps=None, min_subscribers=1, connect_timeout=None):
+        """
+        執行直到 duration（模擬秒數）或 steps 步；Ctrl+C 可中止。
+        min_subscribers > 0 時先等待 Blender 連線再開始計時。
+        """
+        if self._listener is None:
+            self.listen()
+        if min_subscribers and not self.wait_for_subscribers(min_subscribers, connect_timeout):
+            print(f"[cosim] {connect_timeout}s 內沒有訂閱端連線，結束。")
+            return self.stats
+
+        total = steps if steps is not None else (
+            None if duration is None else int(round(duration / self.dt)))
+        t_start = now()
+        try:
+            while total is None or self.stats["steps"] < total:
+                self._wait_window()
+                pos, values = self.step()
+                if self.realtime:
+                    self._wait_until(t_start + self.stats["steps"] * self.dt)
+                else:
+                    self.poll(0)
+                if self.verbose and self.stats["steps"] % max(1, int(1.0 / self.dt)) == 0:
+                    k = len(self.metric_fields)
+                    gains = "" if values is None else " | SINR " + ", ".join(
+                        f"{n}:{v:.1f}dB" for n, v in zip(self.links, values[k - 1::k]))
+                    print(f"[cosim] t={self.t:7.2f}s X={pos[0]:7.1f}{gains}")
+        except KeyboardInterrupt:
+            print("[cosim] 中止。")
+        self.report(now() - t_start)
+        return self.stats
+
+    def report(self, wall):
+        n = max(1, self.stats["steps"])
+        sim = self.stats["steps"] * self.dt
+        print(f"[cosim] {self.stats['steps']} 步，模擬 {sim:.2f}s / 牆鐘 {wall:.2f}s"
+              f"（{sim / max(wall, 1e-9):.1f}× 即時），"
+              f"平均 solve {self.stats['solve'] / n * 1000:.1f} ms、"
+              f"等待 ack {self.stats['wait'] / n * 1000:.1f} ms")
+        if hasattr(self.solver, "report"):  # PathCache 的命中率
+            self.solver.report()
+
+    def close(self):
+        for sub in list(self.subscribers.values()):
+            self._drop(sub)
+        if self._listener is not None:
+            self._sel.unregister(self._listener)
+            self._listener.close()
+            self._listener = None
+
+
+# === 範例：UAV 在 C ↔ B 之間來回，tile 依位置載入 ===
+if __name__ == "__main__":
+    from sionna.rt import Transmitter, Receiver, PlanarArray, PathSolver
+    from region_composer import RegionComposer
+    from path_cache import PathCache
+
+    composer = RegionComposer(radius=1500.0)
+    scene = composer.update([0.0, 0.0, 150.0])
+    scene.tx_array = PlanarArray(num_rows=1, num_cols=1, vertical_spacing=0.5,
+                                 horizontal_spacing=0.5, pattern="tr38901", polarization="V")
+    scene.rx_array = PlanarArray(num_rows=1, num_cols=1, vertical_spacing=0.5,
+                                 horizontal_spacing=0.5, pattern="iso", polarization="V")
+    uav = Transmitter(name="uav", position=[0.0, 0.0, 150.0], power_dbm=23)
+    scene.add(uav)
+    for i, p in enumerate([[30, 0, 1.5], [20, 0, 1.5], [-200, 50, 1.5]]):
+        scene.add(Receiver(name=f"rx-{i}", position=p))
+
+    server = CoSimServer(scene, uav, ping_pong([-1500, 0, 150], [1500, 0, 150], speed=100.0),
+                         dt=0.05, realtime=False,
+                         # 來回飛行會重複經過相同位置：以 1 m 格子快取路徑結果，並存到磁碟供下次執行使用
+                         solver=PathCache(PathSolver(), grid=1.0,
+                                          disk_dir=os.path.join(SCRIPTS_DIR, "path_cache")),
+                         solver_kwargs={"max_depth": 5}, composer=composer)
+    try:
+        server.run()
+    finally:
+        server.close()
@@ -0,0 +1,25 @@
+# === 連結指標：由 Sionna RT 的路徑結果算出每對 (接收端, 發射端) 的增益 / 接收功率 / SINR ===
+# cosim_server.py（即時推送給 Blender）與 rt_sweep.py（參數掃描）共用。
+import numpy as np
+
+
+def link_gain_db(paths):
+    """每對 (接收端, 發射端) 的通道增益 (dB)：路徑能量總和、天線對取平均 → [num_rx, num_tx]。"""
+    a, _ = paths.cir(out_type="numpy")  # [num_rx, rx_ant, num_tx, tx_ant, P, T]
+    gain = np.sum(np.abs(a) ** 2, axis=-2).mean(axis=(1, 3, 4))
+    return 10.0 * np.log10(np.maximum(gain, 1e-30))
+
+
+def link_quality(gain_db, tx_power_dbm, tx_index, noise_dbm):
+    """
+    每個接收端的 [增益 dB, 接收功率 dBm, SINR dB]（扁平、連結為主序）。
+    訊號為 tx_index 發射端，其餘發射端都視為干擾。
+    """
+    rx_mw = 10.0 ** ((gain_db + np.asarray(tx_power_dbm)[None, :]) / 10.0)  # [num_rx, num_tx]
+    signal = rx_mw[:, tx_index]
+    interference = rx_mw.sum(axis=1) - signal
+    sinr = signal / (interference + 10.0 ** (noise_dbm / 10.0))
+    out = np.stack([gain_db[:, tx_index],
+                    10.0 * np.log10(np.maximum(signal, 1e-30)),
+                    10.0 * np.log10(np.maximum(sinr, 1e-30))], axis=1)
+    return out.ravel()
@@ -0,0 +1,275 @@
+# === PathSolver 結果快取：以量化後的 TX / RX 位置為 key，記憶體 LRU + 磁碟 npz ===
+import os, json, hashlib, itertools
+from collections import OrderedDict
+import numpy as np
+
+
+def _numpy(v):
+    return v.numpy() if hasattr(v, "numpy") else np.asarray(v)
+
+
+def _vec(v):
+    return np.asarray(_numpy(v), np.float64).reshape(-1)[:3]
+
+
+def _sha(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:20]
+
+
+_MATERIAL_PARAMS = ("relative_permittivity", "conductivity", "thickness", "scattering_coefficient", "xpd_coefficient")
+_PATTERN_PARAMS = ("alpha_r", "alpha_i", "lambda_")
+
+
+def _params(obj, names):
+    values = {k: getattr(obj, k, None) for k in names}
+    return {k: round(float(_vec(v)[0]), 9) for k, v in values.items() if v is not None}
+
+
+def _object_signature(obj, geometry=True):
+    """SceneObject 的材質（名稱 + 參數 + 散射樣式）與網格（頂點 / 面數，geometry=True 時再加頂點內容的雜湊）。"""
+    mat = getattr(obj, "radio_material", None)
+    pattern = getattr(mat, "scattering_pattern", None)
+    sig = [getattr(mat, "name", None), _params(mat, _MATERIAL_PARAMS),
+           type(pattern).__name__, _params(pattern, _PATTERN_PARAMS)]
+    mesh = getattr(obj, "mi_mesh", None)
+    if mesh is not None:
+        sig.append([mesh.vertex_count(), mesh.face_count()])
+        if geometry:  # .ply 改過、重新載入後頂點不同 → key 不同，磁碟上的舊結果不會被誤用
+            sig.append(hashlib.sha1(np.asarray(mesh.vertex_positions_buffer(), np.float32).tobytes()).hexdigest()[:20])
+    return _sha(sig)
+
+
+class CachedPaths:
+    """
+    快取下來的路徑結果，可取代 Paths 給 link_gain_db() 等只用 cir() 的程式：
+      a [num_rx, rx_ant, num_tx, tx_ant, P, T]、tau、interactions、valid（numpy）。
+    cir() 的參數在建立 PathCache 時就固定（cir_kwargs），呼叫時傳入的參數會被忽略。
+    source："solve" / "memory" / "disk" / "interp"。
+    """
+
+    def __init__(self, a, tau, interactions=None, valid=None, source="solve"):
+        self.a = a
+        self.tau = tau
+        self.interactions = interactions
+        self.valid = valid
+        self.source = source
+
+    @property
+    def nbytes(self):
+        return sum(v.nbytes for v in (self.a, self.tau, self.interactions, self.valid) if v is not None)
+
+    def cir(self, out_type="numpy", **kwargs):
+        return self.a, self.tau
+
+
+class PathCache:
+    """
+    包在 PathSolver 外面：cache(scene, **solver_kwargs) 與 solver(scene, **solver_kwargs) 用法相同。
+
+    key = 場景指紋 + solver 參數 + cir 參數 + 每個 TX / RX 量化後的位置、方向、速度：
+      - 位置以 grid（公尺）量化；方向以 angle_grid（弧度）、速度以 velocity_grid（m/s）量化；
+      - 頻率、天線陣列的指紋每個 scene 只算一次；物件名稱每次呼叫重新取（RegionComposer 換 tile 後
+        key 立即不同，磁碟上的結果也不會用錯幾何）；會移動的物件名稱放在 dynamic，每次重新取位置；
+      - 每個物件的材質名稱與參數、網格簽章（頂點 / 面數與頂點內容雜湊；dynamic 物件只計數量）
+        在第一次看到該物件時算一次，執行中改材質 / 網格後呼叫 invalidate() 重算；
+      - 同一格內的位置視為相同，回傳第一次在該格實際追蹤的結果。
+    記憶體層是 LRU（max_bytes 上限）；disk_dir 不為 None 時另存 npz，重開程式後仍可命中。
+    interpolate=True 時，未命中但有 min_neighbors 個以上相鄰格已快取，就不追蹤：
+    以最近一格的路徑為準，依距離反比加權相鄰格的連結功率修正振幅（相位取最近一格）。
+    """
+
+    def __init__(self, solver, grid=1.0, angle_grid=np.radians(1.0), velocity_grid=0.5,
+                 max_bytes=512 * 2**20, disk_dir=None, dynamic=(), scene_key=None,
+                 interpolate=False, min_neighbors=2, cir_kwargs=None, verbose=False):
+        self.solver = solver
+        self.grid = grid
+        self.angle_grid = angle_grid
+        self.velocity_grid = velocity_grid
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.dynamic = tuple(dynamic)
+        self.scene_key = scene_key
+        self.interpolate = interpolate
+        self.min_neighbors = min_neighbors
+        self.cir_kwargs = cir_kwargs or {}
+        self.verbose = verbose
+        self._mem = OrderedDict()  # {key: CachedPaths}
+        self._bytes = 0
+        self._fingerprints = {}    # {id(scene): (scene, 靜態指紋)}；保留 scene 參考，id 不會被別的物件重用
+        self._objects = {}         # {id(SceneObject): (obj, 材質 / 網格簽章)}
+        self.stats = {"memory": 0, "disk": 0, "interp": 0, "solve": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # === key ===
+    def _static_fingerprint(self, scene):
+        entry = self._fingerprints.get(id(scene))
+        if entry is None or entry[0] is not scene:
+            arrays = []
+            for arr in (scene.tx_array, scene.rx_array):
+                pos = getattr(arr, "normalized_positions", None)
+                arrays.append([getattr(arr, "num_ant", None), type(getattr(arr, "antenna_pattern", None)).__name__,
+                               None if pos is None else np.round(_numpy(pos), 6).tolist()])
+            entry = self._fingerprints[id(scene)] = (scene, _sha({
+                "key": self.scene_key,
+                "frequency": float(_vec(scene.frequency)[0]),
+                "arrays": arrays,
+            }))
+        return entry[1]
+
+    def _q(self, v, step):
+        return tuple(int(x) for x in np.round(_vec(v) / step))
+
+    def _devices(self, scene):
+        """{名稱: (量化位置, 量化方向, 量化速度)}，依名稱排序。"""
+        devs = {}
+        for kind, group in (("tx", scene.transmitters), ("rx", scene.receivers)):
+            for name in sorted(group):
+                d = group[name]
+                vel = getattr(d, "velocity", None)
+                devs[f"{kind}:{name}"] = (
+                    self._q(d.position, self.grid),
+                    self._q(d.orientation, self.angle_grid),
+                    None if vel is None else self._q(vel, self.velocity_grid),
+                )
+        return devs
+
+    def _object(self, name, obj):
+        entry = self._objects.get(id(obj))
+        if entry is None or entry[0] is not obj:
+            entry = self._objects[id(obj)] = (obj, _object_signature(obj, geometry=name not in self.dynamic))
+        return entry[1]
+
+    def _context(self, scene, solver_kwargs):
+        dyn = {}
+        for name in self.dynamic:
+            obj = scene.get(name)
+            dyn[name] = (self._q(obj.position, self.grid), self._q(obj.orientation, self.angle_grid))
+        objects = sorted((name, self._object(name, obj)) for name, obj in scene.objects.items())
+        if len(self._objects) > 2 * len(objects):  # 換 tile 後不再用到的物件不要一直留著
+            current = {id(o) for o in scene.objects.values()}
+            self._objects = {k: v for k, v in self._objects.items() if k in current}
+        return _sha([self._static_fingerprint(scene), objects, solver_kwargs, self.cir_kwargs, dyn])
+
+    @staticmethod
+    def _key(context, devices):
+        return _sha([context, sorted(devices.items())])
+
+    def invalidate(self, scene=None):
+        """
+        頻率 / 天線陣列 / 材質 / 網格在執行中改變後呼叫，下次呼叫時重新計算指紋與物件簽章（物件增減不需要）。
+        改變後的 key 與舊的不同，不會命中舊結果；已存的結果不清除（改回原設定時仍可命中）。
+        """
+        if scene is None:
+            self._fingerprints.clear()
+            self._objects.clear()
+        else:
+            self._fingerprints.pop(id(scene), None)
+            objs = {id(o) for o in scene.objects.values()}
+            self._objects = {k: v for k, v in self._objects.items() if k not in objs}
+
+    # === 儲存層 ===
+    def _put(self, key, entry):
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        self._mem[key] = entry
+        self._bytes += entry.nbytes
+        while self._bytes > self.max_bytes and len(self._mem) > 1:
+            _, ev = self._mem.popitem(last=False)
+            self._bytes -= ev.nbytes
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npz")
+
+    def _get(self, key, count=True):
+        """記憶體 → 磁碟；找不到回傳 None。count=False 時不計入命中統計（查相鄰格用）。"""
+        entry = self._mem.get(key)
+        if entry is not None:
+            self._mem.move_to_end(key)
+            if count:
+                self.stats["memory"] += 1
+            return entry
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            with np.load(self._disk_path(key)) as z:
+                entry = CachedPaths(z["a"], z["tau"], z["interactions"] if "interactions" in z else None,
+                                    z["valid"] if "valid" in z else None, source="disk")
+            self._put(key, entry)
+            if count:
+                self.stats["disk"] += 1
+            return entry
+        return None
+
+    def _save(self, key, entry):
+        self._put(key, entry)
+        if self.disk_dir:
+            arrays = {k: v for k, v in (("a", entry.a), ("tau", entry.tau),
+                                         ("interactions", entry.interactions), ("valid", entry.valid))
+                      if v is not None}
+            tmp = self._disk_path(key) + ".tmp.npz"
+            np.savez(tmp, **arrays)
+            os.replace(tmp, self._disk_path(key))
+
+    # === 內插 ===
+    def _interpolate(self, scene, context, devices):
+        """相鄰格（每個裝置、每軸 ±1 格）中已快取的結果 → 振幅修正後的最近一格，或 None。"""
+        found = []  # (距離, entry)
+        for name, (qpos, qori, qvel) in devices.items():
+            kind, dev = name.split(":", 1)
+            actual = _vec((scene.transmitters if kind == "tx" else scene.receivers)[dev].position)
+            for off in itertools.product((-1, 0, 1), repeat=3):
+                if off == (0, 0, 0):
+                    continue
+                cell = tuple(q + o for q, o in zip(qpos, off))
+                entry = self._get(self._key(context, dict(devices, **{name: (cell, qori, qvel)})), count=False)
+                if entry is not None:
+                    found.append((float(np.linalg.norm(np.asarray(cell) * self.grid - actual)), entry))
+        if len(found) < self.min_neighbors:
+            return None
+        found.sort(key=lambda de: de[0])
+        nearest = found[0][1]
+        shape = nearest.a.shape
+        same = [(d, e) for d, e in found if e.a.shape[:4] == shape[:4]]
+        w = np.array([1.0 / max(d, 1e-6) for d, _ in same])
+        power = sum(wi * np.sum(np.abs(e.a) ** 2, axis=(-2, -1)) for wi, (_, e) in zip(w, same)) / w.sum()
+        base = np.sum(np.abs(nearest.a) ** 2, axis=(-2, -1))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scale = np.where(base > 0, np.sqrt(power / base), 0.0)
+        a = (nearest.a * scale[..., None, None]).astype(nearest.a.dtype)
+        return CachedPaths(a, nearest.tau, nearest.interactions, nearest.valid, source="interp")
+
+    # === 呼叫 ===
+    def __call__(self, scene, **solver_kwargs):
+        context = self._context(scene, solver_kwargs)
+        devices = self._devices(scene)
+        key = self._key(context, devices)
+
+        entry = self._get(key)
+        if entry is not None:
+            return entry
+        if self.interpolate:
+            entry = self._interpolate(scene, context, devices)
+            if entry is not None:
+                self.stats["interp"] += 1
+                return entry
+
+        paths = self.solver(scene, **solver_kwargs)
+        a, tau = paths.cir(out_type="numpy", **self.cir_kwargs)
+        entry = CachedPaths(np.asarray(a), np.asarray(tau),
+                            np.asarray(_numpy(paths.interactions)).astype(np.uint8),
+                            np.asarray(_numpy(paths.valid)).astype(bool))
+        self._save(key, entry)
+        self.stats["solve"] += 1
+        if self.verbose:
+            print(f"[path-cache] 追蹤 {key}（命中率 {self.hit_rate():.1%}）")
+        return entry
+
+    def hit_rate(self):
+        total = sum(self.stats.values())
+        return 0.0 if total == 0 else 1.0 - self.stats["solve"] / total
+
+    def report(self):
+        s = self.stats
+        print(f"[path-cache] 命中率 {self.hit_rate():.1%}：記憶體 {s['memory']}、磁碟 {s['disk']}、"
+              f"內插 {s['interp']}、實際追蹤 {s['solve']}；"
+              f"記憶體 {len(self._mem)} 筆 / {self._bytes / 2**20:.1f} MB")
@@ -0,0 +1,157 @@
+# === Sionna RT 區域組合器：只把 UAV 附近的 tile 載入 RT 場景 ===
+import os, time
+import xml.etree.ElementTree as ET
+
+# === 對應表：與 Blender 端 REGION_MAP 相同的 key / 偏移（公尺 = BU） ===
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+XML_DIR = os.path.join(SCRIPTS_DIR, "..", "blender_xml")
+
+REGION_MAP = {
+    "A": {"xml": os.path.join(XML_DIR, "nycu", "nycu.xml"), "pos": (0.0, 0.0, 0.0)},
+    "B": {"xml": os.path.join(XML_DIR, "nycu_right", "nycu_right.xml"), "pos": (1300.0, 0.0, 0.0)},
+    "C": {"xml": os.path.join(XML_DIR, "nycu_left", "nycu_left.xml"), "pos": (-1300.0, 0.0, 0.0)},
+}
+
+DEFAULT_THICKNESS = 0.1  # ITU 材質預設厚度 (m)
+
+
+def parse_tile_xml(xml_path):
+    """
+    解析 Mitsuba tile XML，回傳 [(shape_id, ply 絕對路徑, 材質名, itu_type, thickness), ...]。
+    只處理 type="ply" 的 shape；材質 id "mat-itu_xxx" 對應 ITU 材質 "xxx"。
+    """
+    root = ET.parse(xml_path).getroot()
+    base = os.path.dirname(os.path.abspath(xml_path))
+
+    materials = {}
+    for bsdf in root.iter("bsdf"):
+        mat_id = bsdf.get("id", "")
+        name = mat_id[4:] if mat_id.startswith("mat-") else mat_id
+        itu_type, thickness = None, DEFAULT_THICKNESS
+        if bsdf.get("type") == "itu-radio-material":
+            for p in bsdf:
+                if p.get("name") == "type":
+                    itu_type = p.get("value")
+                elif p.get("name") == "thickness":
+                    thickness = float(p.get("value"))
+        elif name.startswith("itu_"):
+            itu_type = name[len("itu_"):]
+        materials[mat_id] = (name, itu_type, thickness)
+
+    shapes = []
+    for shape in root.iter("shape"):
+        if shape.get("type") != "ply":
+            continue
+        fname, mat_ref = None, None
+        for p in shape:
+            if p.tag == "string" and p.get("name") == "filename":
+                fname = os.path.join(base, p.get("value"))
+            elif p.tag == "ref" and p.get("name") == "bsdf":
+                mat_ref = p.get("id")
+        if fname is None or mat_ref not in materials:
+            raise ValueError(f"[composer] {xml_path} 的 shape {shape.get('id')} 缺少 filename 或材質")
+        name, itu_type, thickness = materials[mat_ref]
+        shapes.append((shape.get("id"), os.path.normpath(fname), name, itu_type, thickness))
+    return shapes
+
+
+class RegionComposer:
+    """
+    依 UAV 位置與影響半徑，從多個 tile XML 組出單一 Sionna RT 場景。
+    - tile 的解析結果依 (路徑, mtime) 快取，重複呼叫不會重新解析。
+    - 只有進入/離開半徑的 tile 會透過 scene.edit() 新增/移除，其餘幾何不動。
+    """
+
+    def __init__(self, region_map=None, radius=1500.0, verbose=True):
+        self.region_map = region_map if region_map is not None else REGION_MAP
+        self.radius = radius
+        self.verbose = verbose
+        self.scene = None
+        self.active = {}       # {region: [object name, ...]}
+        self._tile_cache = {}  # {xml_path: (mtime, shapes)}
+        self._materials = {}   # {name: RadioMaterial}
+
+    # === 選擇 tile ===
+    def distance_to_region(self, region, uav_pos):
+        """UAV 到 tile 的水平距離；REGION_MAP 可用 "extent" 指定 tile 半寬。"""
+        info = self.region_map[region]
+        px, py = info.get("pos", (0.0, 0.0, 0.0))[:2]
+        d = ((uav_pos[0] - px) ** 2 + (uav_pos[1] - py) ** 2) ** 0.5
+        return max(0.0, d - info.get("extent", 0.0))
+
+    def regions_near(self, uav_pos):
+        return sorted(r for r in self.region_map
+                      if self.distance_to_region(r, uav_pos) <= self.radius)
+
+    # === tile 快取 ===
+    def tile_shapes(self, region):
+        xml_path = os.path.abspath(self.region_map[region]["xml"])
+        mtime = os.path.getmtime(xml_path)
+        cached = self._tile_cache.get(xml_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        shapes = parse_tile_xml(xml_path)
+        self._tile_cache[xml_path] = (mtime, shapes)
+        return shapes
+
+    def _material(self, name, itu_type, thickness):
+        from sionna.rt import ITURadioMaterial
+
+        if self.scene is not None and name in self.scene.radio_materials:
+            return self.scene.radio_materials[name]
+        if name not in self._materials:
+            if itu_type is None:
+                raise ValueError(f"[composer] 材質 {name} 不是 ITU 材質，無法自動建立")
+            self._materials[name] = ITURadioMaterial(name, itu_type, thickness)
+        return self._materials[name]
+
+    def _build_objects(self, region):
+        """讀取 tile 的 ply，套用 REGION_MAP 偏移後建立 SceneObject。"""
+        import mitsuba as mi
+        from sionna.rt import SceneObject
+
+        pos = self.region_map[region].get("pos", (0.0, 0.0, 0.0))
+        objs = []
+        for shape_id, fname, mat_name, itu_type, thickness in self.tile_shapes(region):
+            mesh = mi.load_dict({
+                "type": "ply",
+                "filename": fname,
+                "face_normals": True,
+                "to_world": mi.ScalarTransform4f().translate([float(c) for c in pos]),
+            })
+            objs.append(SceneObject(mi_mesh=mesh,
+                                    name=f"{region}_{shape_id}",
+                                    radio_material=self._material(mat_name, itu_type, thickness)))
+        return objs
+
+    # === 主流程 ===
+    def update(self, uav_pos, **scene_kwargs):
+        """
+        依 UAV 位置更新場景並回傳 scene。
+        第一次呼叫建立空場景（scene_kwargs 傳給 load_scene），之後只做差量 edit。
+        """
+        from sionna.rt import load_scene
+
+        wanted = set(self.regions_near(uav_pos))
+        if self.scene is None:
+            self.scene = load_scene(**scene_kwargs)
+
+        to_add = sorted(wanted - set(self.active))
+        to_remove = sorted(set(self.active) - wanted)
+        if not to_add and not to_remove:
+            return self.scene
+
+        t0 = time.perf_counter()
+        add_objs, remove_names = [], []
+        for region in to_remove:
+            remove_names.extend(self.active.pop(region))
+        for region in to_add:
+            objs = self._build_objects(region)
+            add_objs.extend(objs)
+            self.active[region] = [o.name for o in objs]
+
+        self.scene.edit(add=add_objs or None, remove=remove_names or None)
+        if self.verbose:
+            dt = (time.perf_counter() - t0) * 1000.0
+            print(f"[composer] +{to_add} -{to_remove} → 目前 tile {sorted(self.active)}（{dt:.0f} ms）")
+        return self.scene
@@ -0,0 +1,260 @@
+# === Sionna RT 參數掃描：網格 / 隨機搜尋 + 行程池 + 可續跑的結果記錄 ===
+import os, json, time, hashlib, itertools, random
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SCENE = os.path.normpath(os.path.join(SCRIPTS_DIR, "..", "blender_xml", "nycu_right", "nycu_right.xml"))
+
+# 設定 key 一律是平坦的點號名稱，沒指定的用這裡的預設值（與 sionna-rt.py 相同）
+DEFAULTS = {
+    "kind": "radiomap",                 # "radiomap" 或 "paths"
+    "scene": DEFAULT_SCENE,
+    "scene.frequency": 3.5e9,
+    "tx.position": [30.0, 20.0, 50.0],
+    "tx.power_dbm": 23.0,
+    "array.num_rows": 1,
+    "array.num_cols": 1,
+    "array.pattern": "tr38901",
+    "array.polarization": "V",
+    "rx.positions": [[30.0, 0.0, 1.5], [20.0, 0.0, 1.5]],
+    "solver.max_depth": 5,
+    "solver.samples_per_tx": 10**6,
+    "solver.max_num_paths_per_src": 10**6,
+    "rm.cell_size": [1.0, 1.0],
+    "rm.coverage_db": -110.0,           # path gain 高於此值的格子算有覆蓋
+}
+
+
+# === 搜尋空間 ===
+def grid(spec):
+    """spec: {"solver.max_depth": [5, 12], ...} → 所有組合（key 排序固定，結果可重現）。"""
+    keys = sorted(spec)
+    for combo in itertools.product(*(spec[k] for k in keys)):
+        yield dict(zip(keys, combo))
+
+
+def _draw(rng, v):
+    if isinstance(v, tuple) and v and v[0] in ("uniform", "loguniform", "int"):
+        kind, lo, hi = v
+        if kind == "uniform":
+            return rng.uniform(lo, hi)
+        if kind == "loguniform":
+            return float(np.exp(rng.uniform(np.log(lo), np.log(hi))))
+        return rng.randint(lo, hi)
+    if isinstance(v, list):
+        return rng.choice(v)
+    return v
+
+
+def random_search(spec, n, seed=0):
+    """
+    spec 的值可以是候選 list、("uniform", lo, hi)、("loguniform", lo, hi)、("int", lo, hi) 或固定值。
+    同一個 seed 產生相同的點序列。
+    """
+    rng = random.Random(seed)
+    keys = sorted(spec)
+    for _ in range(n):
+        yield {k: _draw(rng, spec[k]) for k in keys}
+
+
+def point_key(cfg):
+    """設定的穩定雜湊（與 key 順序無關），用來判斷是否已完成。"""
+    return hashlib.sha1(json.dumps(cfg, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+# === worker ===
+_scenes = {}  # 每個 worker 行程的場景快取 {xml 路徑: scene}
+
+
+def _scene(path):
+    from sionna.rt import load_scene
+
+    scene = _scenes.get(path)
+    if scene is None:
+        scene = _scenes[path] = load_scene(path)
+    return scene
+
+
+def run_point(cfg):
+    """在目前行程執行一個設定點，回傳 metrics dict。場景在同一 worker 內重複使用。"""
+    from sionna.rt import Transmitter, Receiver, PlanarArray, PathSolver, RadioMapSolver
+    from link_metrics import link_gain_db
+
+    c = dict(DEFAULTS, **cfg)
+    scene = _scene(c["scene"])
+    scene.frequency = c["scene.frequency"]
+    scene.tx_array = PlanarArray(num_rows=c["array.num_rows"], num_cols=c["array.num_cols"],
+                                 vertical_spacing=0.5, horizontal_spacing=0.5,
+                                 pattern=c["array.pattern"], polarization=c["array.polarization"])
+    scene.rx_array = PlanarArray(num_rows=1, num_cols=1, vertical_spacing=0.5,
+                                 horizontal_spacing=0.5, pattern="iso", polarization="V")
+    for name in list(scene.transmitters) + list(scene.receivers):
+        scene.remove(name)
+    scene.add(Transmitter(name="tx", position=c["tx.position"], power_dbm=c["tx.power_dbm"]))
+
+    t0 = time.perf_counter()
+    if c["kind"] == "radiomap":
+        rm = RadioMapSolver()(scene, max_depth=c["solver.max_depth"],
+                              cell_size=tuple(c["rm.cell_size"]),
+                              samples_per_tx=int(c["solver.samples_per_tx"]))
+        pg = np.asarray(rm.path_gain.numpy())[0]
+        with np.errstate(divide="ignore"):
+            db = 10.0 * np.log10(pg)
+        hit = db[np.isfinite(db)]
+        metrics = {
+            "coverage": float(np.mean(db >= c["rm.coverage_db"])),
+            "pg_mean_db": float(hit.mean()) if hit.size else float("nan"),
+            "pg_p10_db": float(np.percentile(hit, 10)) if hit.size else float("nan"),
+            "pg_p50_db": float(np.percentile(hit, 50)) if hit.size else float("nan"),
+        }
+    else:
+        for i, p in enumerate(c["rx.positions"]):
+            scene.add(Receiver(name=f"rx-{i}", position=p))
+        paths = PathSolver()(scene, max_depth=c["solver.max_depth"],
+                             max_num_paths_per_src=int(c["solver.max_num_paths_per_src"]),
+                             samples_per_src=int(c["solver.samples_per_tx"]))
+        gain = link_gain_db(paths)[:, 0]
+        metrics = {
+            "gain_mean_db": float(gain.mean()),
+            "gain_min_db": float(gain.min()),
+            "num_paths": int(np.asarray(paths.valid.numpy()).sum()),
+        }
+    metrics["solve_s"] = time.perf_counter() - t0
+    return metrics
+
+
+# === 掃描 ===
+class Sweep:
+    """
+    把設定點分派到本機行程池執行：
+      - 每完成一點立刻附加到 out_dir/journal.jsonl（設定 + 指標），中斷後重跑會略過已完成的點；
+      - 失敗的點也會記錄錯誤，但下次仍會重試；
+      - table() / save() 把 journal 整理成欄式表格（results.npz，每欄一個陣列）。
+    workers=0 時在目前行程依序執行（例如只有一張 GPU 時）。
+    """
+
+    def __init__(self, points, out_dir, workers=2, verbose=True):
+        self.points = [dict(p) for p in points]
+        self.out_dir = out_dir
+        self.workers = workers
+        self.verbose = verbose
+        os.makedirs(out_dir, exist_ok=True)
+        self.journal = os.path.join(out_dir, "journal.jsonl")
+
+    def records(self):
+        """journal 內成功完成的紀錄 {key: record}（同一點以最後一筆為準）。"""
+        done = {}
+        if not os.path.exists(self.journal):
+            return done
+        with open(self.journal, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 中斷時寫到一半的最後一行
+                if "metrics" in rec:
+                    done[rec["key"]] = rec
+        return done
+
+    def _append(self, rec):
+        with open(self.journal, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+
+    def run(self):
+        done = self.records()
+        pending = [(point_key(p), p) for p in self.points if point_key(p) not in done]
+        # 相同場景排在一起，worker 較容易重用已載入的場景
+        pending.sort(key=lambda kp: str(kp[1].get("scene", DEFAULT_SCENE)))
+        if self.verbose:
+            print(f"[sweep] 共 {len(self.points)} 點，已完成 {len(self.points) - len(pending)}，待執行 {len(pending)}")
+
+        t0 = time.perf_counter()
+        finished = 0
+
+        def record(key, cfg, metrics=None, error=None):
+            nonlocal finished
+            rec = {"key": key, "config": cfg, "t": time.time()}
+            if error is None:
+                rec["metrics"] = metrics
+                finished += 1
+            else:
+                rec["error"] = error
+            self._append(rec)
+            if self.verbose:
+                status = "完成" if error is None else f"失敗：{error}"
+                print(f"[sweep] ({finished}/{len(pending)}) {key} {status}（{time.perf_counter() - t0:.0f}s）")
+
+        if self.workers <= 0:
+            for key, cfg in pending:
+                try:
+                    record(key, cfg, run_point(cfg))
+                except Exception as e:
+                    record(key, cfg, error=repr(e))
+        else:
+            # spawn：TensorFlow / Dr.Jit 不支援 fork 後再使用
+            ctx = mp.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx) as pool:
+                futures = {pool.submit(run_point, cfg): (key, cfg) for key, cfg in pending}
+                for fut in as_completed(futures):
+                    key, cfg = futures[fut]
+                    try:
+                        record(key, cfg, fut.result())
+                    except Exception as e:
+                        record(key, cfg, error=repr(e))
+        return self.table()
+
+    def table(self):
+        """
+        欄式表格：{"key": [...], "cfg.<name>": [...], "m.<name>": [...]}（只含目前 points 的已完成點）。
+        數值欄（含等長的 list）的缺值為 NaN；其他欄存成字串（list 以 JSON），缺值為空字串，
+        並另有 "<欄名>.missing" 布林遮罩，不會和真的字串 "nan" 混在一起。
+        """
+        done = self.records()
+        rows = [done[k] for k in (point_key(p) for p in self.points) if k in done]
+        cfg_cols = sorted({k for r in rows for k in r["config"]})
+        met_cols = sorted({k for r in rows for k in r["metrics"]})
+        cols = {"key": np.array([r["key"] for r in rows])}
+        for name, src, keys in (("cfg.", "config", cfg_cols), ("m.", "metrics", met_cols)):
+            for k in keys:
+                vals = [r[src].get(k) for r in rows]
+                missing = np.array([v is None for v in vals], bool)
+                try:
+                    arr = np.array([v for v in vals if v is not None])
+                    if arr.dtype.kind not in "biuf":
+                        raise ValueError
+                    if missing.any():  # 缺值以 NaN 表示（整數 / 布林欄因此轉成 float）
+                        full = np.full((len(vals),) + arr.shape[1:], np.nan)
+                        full[~missing] = arr
+                        arr = full
+                except ValueError:
+                    # 字串、長度不一的 list 等存成字串
+                    arr = np.array(["" if v is None else v if isinstance(v, str) else json.dumps(v) for v in vals])
+                    if missing.any():
+                        cols[name + k + ".missing"] = missing
+                cols[name + k] = arr
+        return cols
+
+    def save(self, name="results.npz"):
+        path = os.path.join(self.out_dir, name)
+        np.savez(path, **self.table())
+        if self.verbose:
+            print(f"[sweep] 已寫入 {path}")
+        return path
+
+
+# === 範例：max_depth × samples_per_tx × cell_size 的網格 ===
+if __name__ == "__main__":
+    spec = {
+        "solver.max_depth": [5, 12],
+        "solver.samples_per_tx": [10**5, 10**6, 10**7],
+        "rm.cell_size": [[1.0, 1.0], [2.0, 2.0]],
+        "tx.position": [[30.0, 20.0, 50.0], [30.0, 46.0, 22.0]],
+    }
+    sweep = Sweep(grid(spec), os.path.join(SCRIPTS_DIR, "sweeps", "rm_depth_samples"), workers=2)
+    sweep.run()
+    sweep.save()
@@ -62,11 +62,22 @@ num_rx_ant = 2 # The receiver is equipped with 16 antennas
 # batch_size_cir = 1000
 batch_size_cir = 6
 
+# Region-aware scene composition (mirrors the Blender-side A/B/C streaming)
+use_region_composer = False
+uav_pos = [1300., 0., 150.] # UAV position used to select nearby tiles
+region_radius = 1500. # Tiles within this radius [m] are loaded
+
 # Load an integrated scene.
 # You can try other scenes, such as `sionna.rt.scene.etoile`. Note that this would require
 # updating the position of the transmitter (see below in this cell).
 # scene = load_scene(sionna.rt.scene.munich)
-scene =  load_scene("../blender_xml/nycu_right/nycu_right.xml")
+if use_region_composer:
+    # 只載入 UAV 附近的 tile（座標系與 Blender 端 REGION_MAP 相同）
+    from region_composer import RegionComposer
+    composer = RegionComposer(radius=region_radius)
+    scene = composer.update(uav_pos)
+else:
+    scene =  load_scene("../blender_xml/nycu_right/nycu_right.xml")
 # scene.preview()
 
 # Transmitter (=basestation) has an antenna pattern from 3GPP 38.901
@@ -104,11 +115,25 @@ max_depth = 12
 # Radio map solver
 rm_solver = RadioMapSolver()
 
+# Adaptive sampling: add samples in batches until the map converges
+# (10**7 becomes an upper bound instead of a fixed cost)
+adaptive_rm = False
+rm_tol_db = 0.5 # Target 95% confidence half-width [dB] on 95% of the covered cells
+
 # Compute the radio map
-rm = rm_solver(scene,
-               max_depth=12,
-               cell_size=(1., 1.),
-               samples_per_tx=10**7)
+if adaptive_rm:
+    from adaptive_radiomap import adaptive_radio_map
+    rm_result = adaptive_radio_map(rm_solver, scene,
+                                   max_samples=10**7,
+                                   tol_db=rm_tol_db,
+                                   max_depth=12,
+                                   cell_size=(1., 1.))
+    rm = rm_result["rm"] # Holds the averaged path gain of all batches (converged map)
+else:
+    rm = rm_solver(scene,
+                   max_depth=12,
+                   cell_size=(1., 1.),
+                   samples_per_tx=10**7)
 
 if no_preview:
     # Render an image
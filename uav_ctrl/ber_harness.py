@@ -0,0 +1,396 @@
+import os, json, time, hashlib, itertools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+
+# === PUSCH 鏈路層 BER / BLER：Eb/No × 偵測器 × CIR 資料集 分派到行程池 ===
+# 每點一個工作；worker 快取已編譯的模型（同一條曲線的其他 Eb/No 點不再重新 trace），
+# 達到目標 block error 數就停，結果逐點附加到 journal.jsonl，中斷後重跑只補未完成的點。
+
+DEFAULTS = {
+    "dataset": "cir_nycu_2RU_2UE",  # CIRStore 目錄
+    "detector": "lmmse",            # "lmmse" 或 "kbest"
+    "perfect_csi": False,
+    "ebno_db": 0.0,
+    "num_tx": 2,                    # 每個 batch 同時傳送的 UE 數
+    "batch_size": 20,
+    "num_prb": 16,
+    "mcs_index": 14,
+    "mcs_table": 1,
+    "num_layers": 1,
+    "subcarrier_spacing": 30e3,
+    "kbest_k": 64,
+    "seed": 42,
+    "max_mc_iter": 1000,
+    "target_block_errors": 200,
+}
+
+CURVE_KEYS = ("dataset", "detector", "perfect_csi", "num_tx", "batch_size", "num_prb",
+              "mcs_index", "mcs_table", "num_layers", "kbest_k")
+
+
+def jobs(datasets, detectors, ebno_dbs, **fixed):
+    """資料集 × 偵測器 × Eb/No 的所有組合（其他參數用 fixed 覆寫 DEFAULTS）。"""
+    for ds, det, ebno in itertools.product(datasets, detectors, ebno_dbs):
+        yield dict(fixed, dataset=ds, detector=det, ebno_db=float(ebno))
+
+
+def point_key(cfg):
+    return hashlib.sha1(json.dumps(cfg, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def curve_of(cfg):
+    """同一條 BER 曲線（只差 Eb/No）的識別字串。"""
+    c = dict(DEFAULTS, **cfg)
+    return json.dumps({k: c[k] for k in CURVE_KEYS}, sort_keys=True)
+
+
+# === worker ===
+def _init_worker(threads, cpu_only):
+    """在載入 TensorFlow 之前設定：每個 worker 只用 threads 條執行緒，避免互搶 CPU。"""
+    if cpu_only:
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+    import tensorflow as tf
+
+    if threads:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    tf.get_logger().setLevel("ERROR")
+
+
+class PUSCHLink:
+    """
+    與 notebook 相同的多使用者 PUSCH 上行鏈路：PUSCHTransmitter → OFDMChannel(CIR) → PUSCHReceiver。
+    run() 以 tf.function 編譯；ebno_db 以 tensor 傳入，換 Eb/No 不會重新 trace。
+    """
+
+    def __init__(self, c):
+        import tensorflow as tf
+        from sionna.phy.channel import OFDMChannel
+        from sionna.phy.nr import PUSCHConfig, PUSCHTransmitter, PUSCHReceiver
+        from sionna.phy.ofdm import KBestDetector, LinearDetector
+        from sionna.phy.mimo import StreamManagement
+        from cir_store import CIRStore
+        from cir_pipeline import CIRPipeline
+
+        store = CIRStore.open(c["dataset"])
+        num_tx, num_layers = c["num_tx"], c["num_layers"]
+        self.batch_size = c["batch_size"]
+        self.perfect_csi = c["perfect_csi"]
+
+        pusch_config = PUSCHConfig()
+        pusch_config.carrier.subcarrier_spacing = c["subcarrier_spacing"] / 1000
+        pusch_config.carrier.n_size_grid = c["num_prb"]
+        pusch_config.num_antenna_ports = store.meta["ue_ant"]
+        pusch_config.num_layers = num_layers
+        pusch_config.precoding = "codebook" if store.meta["ue_ant"] > 1 else "non-codebook"
+        if store.meta["ue_ant"] > 1:
+            pusch_config.tpmi = 1
+        pusch_config.dmrs.dmrs_port_set = list(range(num_layers))
+        pusch_config.dmrs.config_type = 1
+        pusch_config.dmrs.length = 1
+        pusch_config.dmrs.additional_position = 1
+        pusch_config.dmrs.num_cdm_groups_without_data = 2
+        pusch_config.tb.mcs_index = c["mcs_index"]
+        pusch_config.tb.mcs_table = c["mcs_table"]
+
+        # 其他 UE 複製設定，只換 DMRS port
+        pusch_configs = [pusch_config]
+        for i in range(1, num_tx):
+            pc = pusch_config.clone()
+            pc.dmrs.dmrs_port_set = list(range(i * num_layers, (i + 1) * num_layers))
+            pusch_configs.append(pc)
+        self.tx = PUSCHTransmitter(pusch_configs, output_domain="freq")
+        rg = self.tx.resource_grid
+
+        sm = StreamManagement(np.ones([1, num_tx], bool), num_layers)
+        nbits = pusch_config.tb.num_bits_per_symbol
+        if c["detector"] == "lmmse":
+            detector = LinearDetector(equalizer="lmmse", output="bit", demapping_method="maxlog",
+                                      resource_grid=rg, stream_management=sm,
+                                      constellation_type="qam", num_bits_per_symbol=nbits)
+        elif c["detector"] == "kbest":
+            detector = KBestDetector(output="bit", num_streams=num_tx * num_layers, k=c["kbest_k"],
+                                     resource_grid=rg, stream_management=sm,
+                                     constellation_type="qam", num_bits_per_symbol=nbits)
+        else:
+            raise ValueError(f"[ber] 不支援的偵測器：{c['detector']}")
+        self.rx = PUSCHReceiver(self.tx, mimo_detector=detector, input_domain="freq",
+                                channel_estimator="perfect" if self.perfect_csi else None)
+
+        self.channel_model = CIRPipeline([store], self.batch_size, num_tx, seed=c["seed"])
+        self.channel = OFDMChannel(self.channel_model, rg, normalize_channel=True, return_channel=True)
+        self.nbits = nbits
+        self.coderate = self.tx._target_coderate
+        self.run = tf.function(self._run)
+
+    def reseed(self, seed):
+        """
+        每個 Eb/No 點開始前呼叫，結果只由該點決定，與 worker 之前跑過哪些點無關：
+        Sionna 的 tf.random.Generator 以 reset_from_seed() 就地重設（不換物件，已 trace 的 run() 讀的是同一個狀態），
+        CIRPipeline 的 seed / batch 計數是 tf.Variable，同樣不需要重新 trace。
+        """
+        from sionna.phy import config
+
+        config.tf_rng.reset_from_seed(seed)
+        self.channel_model.reseed(seed)
+
+    def _run(self, ebno_db):
+        import tensorflow as tf
+        from sionna.phy.utils import ebnodb2no
+
+        x, b = self.tx(self.batch_size)
+        no = ebnodb2no(ebno_db, self.nbits, self.coderate, self.tx.resource_grid)
+        y, h = self.channel(x, no)
+        b_hat = self.rx(y, no, h) if self.perfect_csi else self.rx(y, no)
+        err = tf.not_equal(b, b_hat)                          # [batch, num_tx, tb_size]
+        # 在圖內加總，只把四個計數傳回 Python
+        return (tf.reduce_sum(tf.cast(err, tf.int64)), tf.size(err, tf.int64),
+                tf.reduce_sum(tf.cast(tf.reduce_any(err, axis=-1), tf.int64)),
+                tf.size(err[..., 0], tf.int64))
+
+
+_links = {}  # 每個 worker 的模型快取 {curve: PUSCHLink}
+
+
+def run_point(cfg, fresh=False):
+    """在目前行程模擬一個 Eb/No 點，回傳 metrics dict。fresh=True 時不用快取的模型（重新建立並 trace）。"""
+    import tensorflow as tf
+
+    c = dict(DEFAULTS, **cfg)
+    curve = curve_of(c)
+    link = None if fresh else _links.get(curve)
+    if link is None:
+        tf.random.set_seed(c["seed"])
+        link = _links[curve] = PUSCHLink(c)
+    link.reseed(int(point_key(c), 16) & 0x7FFFFFFF)  # 每點固定的 seed（由點的設定決定，含 c["seed"]）
+
+    ebno = tf.constant(c["ebno_db"], tf.float32)
+    bits = bit_errs = blocks = block_errs = 0
+    iters = 0
+    t0 = time.perf_counter()
+    while iters < c["max_mc_iter"] and block_errs < c["target_block_errors"]:
+        e, n, be, nb = (int(v) for v in link.run(ebno))
+        bit_errs, bits, block_errs, blocks = bit_errs + e, bits + n, block_errs + be, blocks + nb
+        iters += 1
+    return {
+        "ber": bit_errs / bits,
+        "bler": block_errs / blocks,
+        "bit_errors": bit_errs,
+        "bits": bits,
+        "block_errors": block_errs,
+        "blocks": blocks,
+        "iters": iters,
+        "sim_s": time.perf_counter() - t0,
+    }
+
+
+_COUNTS = ("bit_errors", "bits", "block_errors", "blocks", "iters")
+
+
+def check_reseed(cfg, other_ebno_db):
+    """
+    重現性檢查：cfg 這點單獨跑（新模型）與同一個模型先跑 other_ebno_db 再跑 cfg，計數必須完全相同。
+    不同時丟出 AssertionError（表示 run() 的圖裡還有沒被 reseed() 重設的亂數狀態）。
+    """
+    alone = run_point(cfg, fresh=True)
+    run_point(dict(cfg, ebno_db=other_ebno_db))
+    after = run_point(cfg)
+    a, b = ({k: m[k] for k in _COUNTS} for m in (alone, after))
+    assert a == b, f"[ber] 單獨跑 {a} 與先跑 {other_ebno_db} dB 後 {b} 不同"
+    print(f"[ber] reseed 檢查通過：{a}")
+    return a
+
+
+# === 分派 ===
+class BERHarness:
+    """
+    把 jobs 分派到本機行程池（spawn）：
+      - 每完成一點立刻附加到 out_dir/journal.jsonl，中斷後重跑會略過已完成的點；
+      - early_stop=True 時，某條曲線在某個 Eb/No 已經沒有 block error，
+        更高 Eb/No 的點就不再模擬（記錄為 skipped，BER / BLER 為 0）；
+      - table() / save() / plot() 把 journal 合併成表格與曲線圖。
+    workers=0 時在目前行程依序執行。threads_per_worker 限制每個 worker 的 TF 執行緒數。
+    """
+
+    def __init__(self, jobs, out_dir, workers=4, threads_per_worker=2, cpu_only=True,
+                 early_stop=True, verbose=True):
+        self.jobs = [dict(DEFAULTS, **j) for j in jobs]
+        self.out_dir = out_dir
+        self.workers = workers
+        self.threads = threads_per_worker
+        self.cpu_only = cpu_only
+        self.early_stop = early_stop
+        self.verbose = verbose
+        os.makedirs(out_dir, exist_ok=True)
+        self.journal = os.path.join(out_dir, "journal.jsonl")
+
+    def records(self):
+        """journal 內已完成的紀錄 {key: record}（同一點以最後一筆為準）。"""
+        done = {}
+        if not os.path.exists(self.journal):
+            return done
+        with open(self.journal, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 中斷時寫到一半的最後一行
+                if "metrics" in rec:
+                    done[rec["key"]] = rec
+        return done
+
+    def _append(self, rec):
+        with open(self.journal, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+
+    def _clean(self, done):
+        """每條曲線最低的「零 block error」Eb/No（early stop 的門檻）。"""
+        clean = {}
+        for rec in done.values():
+            if rec["metrics"]["block_errors"] == 0:
+                curve = curve_of(rec["config"])
+                clean[curve] = min(clean.get(curve, np.inf), rec["config"]["ebno_db"])
+        return clean
+
+    def run(self):
+        done = self.records()
+        clean = self._clean(done) if self.early_stop else {}
+        pending = [(point_key(j), j) for j in self.jobs if point_key(j) not in done]
+        # 同一條曲線排在一起、Eb/No 由低到高：worker 重用已編譯的模型，early stop 也較早生效
+        pending.sort(key=lambda kj: (curve_of(kj[1]), kj[1]["ebno_db"]))
+        if self.verbose:
+            print(f"[ber] 共 {len(self.jobs)} 點，已完成 {len(self.jobs) - len(pending)}，待執行 {len(pending)}")
+
+        t0 = time.perf_counter()
+        finished = 0
+
+        def record(key, cfg, metrics=None, error=None, skipped=False):
+            nonlocal finished
+            rec = {"key": key, "config": cfg, "t": time.time()}
+            if error is None:
+                rec["metrics"] = metrics
+                finished += 1
+                if skipped:
+                    rec["skipped"] = True
+                elif metrics["block_errors"] == 0 and self.early_stop:
+                    curve = curve_of(cfg)
+                    clean[curve] = min(clean.get(curve, np.inf), cfg["ebno_db"])
+            else:
+                rec["error"] = error
+            self._append(rec)
+            if self.verbose:
+                if error is not None:
+                    status = f"失敗：{error}"
+                elif skipped:
+                    status = "略過（較低 Eb/No 已無錯誤）"
+                else:
+                    status = f"BER {metrics['ber']:.2e} / BLER {metrics['bler']:.2e}（{metrics['iters']} 批）"
+                print(f"[ber] ({finished}/{len(pending)}) {cfg['detector']} @ {cfg['ebno_db']:.1f} dB {status}"
+                      f"（{time.perf_counter() - t0:.0f}s）")
+
+        def skip(key, cfg):
+            if cfg["ebno_db"] <= clean.get(curve_of(cfg), np.inf):
+                return False
+            zero = {"ber": 0.0, "bler": 0.0, "bit_errors": 0, "bits": 0,
+                    "block_errors": 0, "blocks": 0, "iters": 0, "sim_s": 0.0}
+            record(key, cfg, zero, skipped=True)
+            return True
+
+        if self.workers <= 0:
+            _init_worker(0, False)
+            for key, cfg in pending:
+                if skip(key, cfg):
+                    continue
+                try:
+                    record(key, cfg, run_point(cfg))
+                except Exception as e:
+                    record(key, cfg, error=repr(e))
+            return self.table()
+
+        # 一次只送出 workers 個工作，其餘留在佇列：early stop 時尚未送出的點可以直接略過
+        ctx = mp.get_context("spawn")
+        queue = list(pending)
+        running = {}
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(self.threads, self.cpu_only)) as pool:
+            while queue or running:
+                while queue and len(running) < self.workers:
+                    key, cfg = queue.pop(0)
+                    if not skip(key, cfg):
+                        running[pool.submit(run_point, cfg)] = (key, cfg)
+                if not running:
+                    continue
+                finished_futs, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished_futs:
+                    key, cfg = running.pop(fut)
+                    try:
+                        record(key, cfg, fut.result())
+                    except Exception as e:
+                        record(key, cfg, error=repr(e))
+        return self.table()
+
+    def table(self):
+        """欄式表格：{"curve", "detector", "dataset", "ebno_db", "ber", "bler", ...}，依曲線、Eb/No 排序。"""
+        done = self.records()
+        rows = [done[k] for k in (point_key(j) for j in self.jobs) if k in done]
+        rows.sort(key=lambda r: (curve_of(r["config"]), r["config"]["ebno_db"]))
+        cols = {
+            "curve": np.array([curve_of(r["config"]) for r in rows]),
+            "dataset": np.array([r["config"]["dataset"] for r in rows]),
+            "detector": np.array([r["config"]["detector"] for r in rows]),
+            "perfect_csi": np.array([r["config"]["perfect_csi"] for r in rows], bool),
+            "ebno_db": np.array([r["config"]["ebno_db"] for r in rows], np.float64),
+            "skipped": np.array([r.get("skipped", False) for r in rows], bool),
+        }
+        for k in ("ber", "bler", "bit_errors", "bits", "block_errors", "blocks", "iters", "sim_s"):
+            cols[k] = np.array([r["metrics"][k] for r in rows])
+        return cols
+
+    def save(self, name="results.npz"):
+        path = os.path.join(self.out_dir, name)
+        np.savez(path, **self.table())
+        if self.verbose:
+            print(f"[ber] 已寫入 {path}")
+        return path
+
+    def plot(self, bler=True, name="ber.png"):
+        """每條曲線一條線（略過的點不畫，半對數圖上 0 無法顯示）。"""
+        import matplotlib.pyplot as plt
+
+        t = self.table()
+        key = "bler" if bler else "ber"
+        fig, ax = plt.subplots(figsize=(8, 6))
+        for curve in dict.fromkeys(t["curve"]):
+            sel = (t["curve"] == curve) & ~t["skipped"] & (t[key] > 0)
+            if not sel.any():
+                continue
+            i = np.nonzero(t["curve"] == curve)[0][0]
+            label = f"{os.path.basename(str(t['dataset'][i]))} / {t['detector'][i]}" \
+                    + (" / perfect CSI" if t["perfect_csi"][i] else "")
+            ax.semilogy(t["ebno_db"][sel], t[key][sel], "o-", label=label)
+        ax.set_xlabel(r"$E_b/N_0$ (dB)")
+        ax.set_ylabel(key.upper())
+        ax.grid(True, which="both")
+        ax.legend()
+        path = os.path.join(self.out_dir, name)
+        fig.savefig(path, dpi=150, bbox_inches="tight")
+        if self.verbose:
+            print(f"[ber] 已寫入 {path}")
+        return fig
+
+
+# === 範例：LMMSE / K-Best × 估計 / 完美 CSI ===
+if __name__ == "__main__":
+    ebno_dbs = np.arange(-5.0, 16.0, 2.0)
+    js = list(jobs(["cir_nycu_2RU_2UE"], ["lmmse", "kbest"], ebno_dbs, perfect_csi=False)) \
+        + list(jobs(["cir_nycu_2RU_2UE"], ["lmmse", "kbest"], ebno_dbs, perfect_csi=True))
+    check_reseed(dict(js[0], max_mc_iter=5), other_ebno_db=ebno_dbs[-1])
+    harness = BERHarness(js, os.path.join("ber_runs", "nycu_2RU_2UE"), workers=4, threads_per_worker=2)
+    harness.run()
+    harness.save()
+    harness.plot()
@@ -0,0 +1,132 @@
+import numpy as np
+import tensorflow as tf
+from sionna.phy.channel import ChannelModel
+from cir_store import CIRStore, sample_indices
+
+# === 以 tf.data 供應 CIR 的通道模型（取代 CIRGenerator + CIRDataset）===
+# 資料留在 CIRStore 的記憶體映射中，不複製成 tf.constant（資料集可以比記憶體大）；
+# 每個 batch 依 (seed, 第幾個 batch) 抽 num_tx 個不重複 UE 的索引，只從記憶體映射讀出用到的列。
+# seed 與 batch 計數放在 tf.Variable，已 trace 的圖每次都會讀到 reseed() 之後的值。
+
+
+def open_shards(shards):
+    """
+    shards：CIRStore 或其目錄路徑的 list → CIRStore list（只開啟記憶體映射，不讀入資料）。
+    各 shard 的 num_paths 可以不同（讀出時補 0），其餘維度必須相同。
+    """
+    stores = [s if isinstance(s, CIRStore) else CIRStore.open(s) for s in shards]
+    if not stores:
+        raise ValueError("[cir-pipeline] 沒有任何 shard")
+    ref = stores[0].meta
+    for s in stores[1:]:
+        for k in ("num_bs", "bs_ant", "ue_ant", "num_time_steps"):
+            if s.meta[k] != ref[k]:
+                raise ValueError(f"[cir-pipeline] {s.path} 的 {k}={s.meta[k]} 與 {stores[0].path} 不同（{ref[k]}）")
+    return stores
+
+
+class CIRPipeline(ChannelModel):
+    """
+    可直接交給 OFDMChannel 的通道模型：
+      a   [batch_size, num_rx, num_rx_ant, num_tx, num_tx_ant, num_paths, num_time_steps]
+      tau [batch_size, num_rx, num_tx, num_paths]
+    （上行方向：rx 是基地台、tx 是 UE，與 CIRDataset 相同）
+
+    - 第 k 個 batch 用 [seed, k] 抽樣（無狀態，k 為 tf.Variable 計數），結果只由 seed 決定；
+      seed 與 k 都是 tf.Variable，reseed() 只改變數的值，包在 tf.function 裡呼叫也不需要重新 trace；
+    - 每列抽 num_tx 個 [0, N) 的整數，有重複的列整列重抽（num_tx 遠小於 N，幾乎不會重抽），
+      只需 O(batch_size × num_tx)，不必對全部 N 筆產生隨機數；batch 之間獨立抽樣，不需要 shuffle buffer；
+    - 讀取在 tf.numpy_function 中進行（各 shard 依序讀、重複的列只讀一次）；
+    - dataset 以同樣的 [seed, k] 序列平行 map 並 prefetch，可在圖外批次讀取或量測吞吐量。
+    """
+
+    def __init__(self, shards, batch_size, num_tx, seed=0,
+                 num_parallel_calls=tf.data.AUTOTUNE, prefetch=tf.data.AUTOTUNE,
+                 precision=None, **kwargs):
+        super().__init__(precision=precision, **kwargs)
+        self._stores = open_shards(shards)
+        self._offsets = np.cumsum([0] + [len(s) for s in self._stores])
+        self._size = int(self._offsets[-1])
+        if num_tx > self._size:
+            raise ValueError(f"[cir-pipeline] 資料只有 {self._size} 筆，不足 num_tx={num_tx}")
+
+        ref = self._stores[0].meta
+        self._batch_size = batch_size
+        self._num_tx = num_tx
+        self._num_rx, self._num_rx_ant = ref["num_bs"], ref["bs_ant"]
+        self._num_tx_ant, self._num_time_steps = ref["ue_ant"], ref["num_time_steps"]
+        self._num_paths = max(s.num_paths for s in self._stores)
+        self._num_parallel_calls, self._prefetch = num_parallel_calls, prefetch
+        self._seed = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self._step = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self.reseed(seed)
+
+    def reseed(self, seed):
+        """之後的 batch 從 [seed, 0] 重新開始，只由這個 seed 決定（已 trace 的圖也會讀到新值）。"""
+        self._seed.assign(seed)
+        self._step.assign(0)
+
+    def _read(self, seed):
+        """numpy：依 seed 抽樣並從記憶體映射讀出一個 batch（CIRStore.sample_batch 的多 shard 版本）。"""
+        rng = np.random.default_rng(np.asarray(seed).view(np.uint64))
+        idx = sample_indices(self._size, self._batch_size, self._num_tx, rng).reshape(-1)
+        a = np.zeros((len(idx), self._num_rx, self._num_rx_ant, self._num_tx_ant,
+                      self._num_paths, self._num_time_steps), np.complex64)
+        tau = np.zeros((len(idx), self._num_rx, self._num_paths), np.float32)
+        for s, lo, hi in zip(self._stores, self._offsets[:-1], self._offsets[1:]):
+            m = (idx >= lo) & (idx < hi)
+            if not m.any():
+                continue
+            uniq, inv = np.unique(idx[m] - lo, return_inverse=True)  # 依序讀取記憶體映射，重複的只讀一次
+            p = s.num_paths
+            a[m, ..., :p, :] = s.a[uniq][inv][:, :, :, 0]           # [k, bs, bs_ant, ue_ant, p, T]
+            tau[m, :, :p] = s.tau[uniq][inv][:, :, 0]
+        shape = (self._batch_size, self._num_tx)
+        a = a.reshape(shape + a.shape[1:]).transpose(0, 2, 3, 1, 4, 5, 6)
+        tau = tau.reshape(shape + tau.shape[1:]).transpose(0, 2, 1, 3)
+        return np.ascontiguousarray(a), np.ascontiguousarray(tau)
+
+    def _sample(self, seed):
+        a, tau = tf.numpy_function(self._read, [seed], [tf.complex64, tf.float32], stateful=False)
+        a.set_shape([self._batch_size, self._num_rx, self._num_rx_ant, self._num_tx,
+                     self._num_tx_ant, self._num_paths, self._num_time_steps])
+        tau.set_shape([self._batch_size, self._num_rx, self._num_tx, self._num_paths])
+        return tf.cast(a, self.cdtype), tf.cast(tau, self.rdtype)
+
+    @property
+    def dataset(self):
+        """目前 seed 的 tf.data.Dataset（無限長，與從頭呼叫的 batch 序列相同），可另外 take() / 量測吞吐量。"""
+        seed = self._seed.numpy()
+        dataset = tf.data.Dataset.counter(dtype=tf.int64).map(
+            lambda k: self._sample(tf.stack([tf.constant(seed, tf.int64), k])),
+            num_parallel_calls=self._num_parallel_calls, deterministic=True)
+        return dataset.prefetch(self._prefetch)
+
+    @property
+    def num_rx(self):
+        return self._num_rx
+
+    @property
+    def num_rx_ant(self):
+        return self._num_rx_ant
+
+    @property
+    def num_tx(self):
+        return self._num_tx
+
+    @property
+    def num_tx_ant(self):
+        return self._num_tx_ant
+
+    @property
+    def num_paths(self):
+        return self._num_paths
+
+    @property
+    def num_time_steps(self):
+        return self._num_time_steps
+
+    def __call__(self, batch_size=None, num_time_steps=None, sampling_frequency=None):
+        # 與 CIRDataset 相同：batch_size / num_time_steps 在建構時就固定，參數只為了相容 OFDMChannel 的呼叫方式
+        k = self._step.assign_add(1) - 1
+        return self._sample(tf.stack([self._seed.read_value(), k]))
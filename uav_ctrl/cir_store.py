@@ -0,0 +1,166 @@
+import os, json, warnings
+import numpy as np
+
+# === CIR 資料集：預先配置的記憶體映射陣列（一個目錄 = meta.json + a.npy + tau.npy）===
+# 存成上行（UE → 基地台）方向，每筆是一個 UE：
+#   a   [N, num_bs, bs_ant, 1, ue_ant, max_paths, T] complex64
+#   tau [N, num_bs, 1, max_paths] float32
+# 不足 max_paths 的路徑補 0（檔案建立時就是 0，不必另外 pad）；超過時只保留最強的 max_paths 條。
+
+META = "meta.json"
+
+
+def sample_indices(n, batch_size, num_tx, rng):
+    """[batch_size, num_tx]：每列是 [0, n) 中 num_tx 個不重複的索引（有重複的列整列重抽）。"""
+    if num_tx > n:
+        raise ValueError(f"[cir-store] 資料只有 {n} 筆，不足 num_tx={num_tx}")
+    idx = rng.integers(0, n, (batch_size, num_tx))
+    while True:  # num_tx 遠小於 n 時幾乎不會重抽
+        s = np.sort(idx, axis=1)
+        dup = np.any(s[:, 1:] == s[:, :-1], axis=1)
+        if not dup.any():
+            return idx
+        idx[dup] = rng.integers(0, n, (int(dup.sum()), num_tx))
+
+
+class CIRStore:
+    """
+    取代「a_list / tau_list → pad → concatenate」：每批 paths.cir() 直接寫進預先配置好的位置，
+    峰值記憶體只有一批的大小；取樣時以向量化索引從記憶體映射讀出 num_tx 個不同的 UE。
+    """
+
+    def __init__(self, path, meta, mode):
+        self.path = path
+        self.meta = meta
+        self._a = np.lib.format.open_memmap(os.path.join(path, "a.npy"), mode=mode)
+        self._tau = np.lib.format.open_memmap(os.path.join(path, "tau.npy"), mode=mode)
+
+    @classmethod
+    def create(cls, path, capacity, num_bs, bs_ant, ue_ant, num_time_steps, max_paths=128):
+        """建立空的資料集；capacity 是最多可存的 UE 數。"""
+        os.makedirs(path, exist_ok=True)
+        meta = {
+            "capacity": int(capacity), "size": 0,
+            "num_bs": int(num_bs), "bs_ant": int(bs_ant), "ue_ant": int(ue_ant),
+            "num_time_steps": int(num_time_steps),
+            "max_paths": int(max_paths), "num_paths": 0,
+            "capped_links": 0, "dropped_energy": 0.0,
+        }
+        shape = (capacity, num_bs, bs_ant, 1, ue_ant, max_paths, num_time_steps)
+        np.lib.format.open_memmap(os.path.join(path, "a.npy"), mode="w+", dtype=np.complex64, shape=shape)
+        np.lib.format.open_memmap(os.path.join(path, "tau.npy"), mode="w+", dtype=np.float32,
+                                  shape=(capacity, num_bs, 1, max_paths))
+        store = cls(path, meta, "r+")
+        store.flush()
+        return store
+
+    @classmethod
+    def open(cls, path, mode="r"):
+        """開啟既有資料集；要繼續 append 時用 mode="r+"。"""
+        with open(os.path.join(path, META), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(path, meta, mode)
+
+    def __len__(self):
+        return self.meta["size"]
+
+    @property
+    def num_paths(self):
+        """目前資料中實際用到的最大路徑數（≤ max_paths），也就是 CIRDataset 的 num_paths。"""
+        return self.meta["num_paths"]
+
+    @property
+    def a(self):
+        """[size, num_bs, bs_ant, 1, ue_ant, num_paths, T]（記憶體映射的 view，不複製）"""
+        return self._a[:len(self), ..., :self.num_paths, :]
+
+    @property
+    def tau(self):
+        """[size, num_bs, 1, num_paths]"""
+        return self._tau[:len(self), ..., :self.num_paths]
+
+    # === 寫入 ===
+    def _cap(self, a, tau):
+        """路徑數超過 max_paths 時，每條連結只保留能量最大的 max_paths 條（維持原本順序）。"""
+        k = self.meta["max_paths"]
+        if a.shape[-2] <= k:
+            return a, tau
+        power = np.sum(np.abs(a) ** 2, axis=(1, 3, 5))                # [ue, bs, P]
+        idx = np.sort(np.argpartition(-power, k - 1, axis=-1)[..., :k], axis=-1)
+        kept = np.take_along_axis(power, idx, axis=-1).sum()
+        total = power.sum()
+        if total > 0:
+            self.meta["dropped_energy"] = max(self.meta["dropped_energy"], float(1.0 - kept / total))
+        self.meta["capped_links"] += int(np.count_nonzero((power > 0).sum(axis=-1) > k))
+        a = np.take_along_axis(a, idx[:, None, :, None, :, None], axis=4)
+        tau = np.take_along_axis(tau, idx, axis=-1)
+        return a, tau
+
+    def append(self, a, tau):
+        """
+        a [num_rx, rx_ant, num_tx, tx_ant, P, T]、tau [num_rx, num_tx, P]：paths.cir(out_type="numpy") 的輸出
+        （RT 場景中 rx 是 UE、tx 是基地台）。沒有任何路徑的 UE 直接捨棄，回傳實際寫入的筆數；
+        容量不足時只寫入放得下的部分並發出 RuntimeWarning。
+        """
+        a, tau = np.asarray(a), np.asarray(tau)
+        if tau.ndim == 5:  # 天線陣列未合成：[num_rx, rx_ant, num_tx, tx_ant, P]，取第 0 根天線的延遲
+            tau = tau[:, 0, :, 0]
+        a, tau = self._cap(a, tau)
+        up = a.transpose(0, 2, 3, 1, 4, 5)                            # [ue, bs, bs_ant, ue_ant, P, T]
+        keep = np.any(up != 0, axis=(1, 2, 3, 4, 5))
+        up, tau = up[keep], tau[keep]
+
+        start = len(self)
+        n = min(len(up), self.meta["capacity"] - start)
+        if n < len(up):
+            warnings.warn(f"[cir-store] 已滿（{self.meta['capacity']} 筆），捨棄 {len(up) - n} 筆", RuntimeWarning, stacklevel=2)
+        p = up.shape[-2]
+        self._a[start:start + n, :, :, 0, :, :p] = up[:n]
+        self._tau[start:start + n, :, 0, :p] = tau[:n]
+        self.meta["size"] = start + n
+        self.meta["num_paths"] = max(self.meta["num_paths"], p)
+        return n
+
+    def flush(self):
+        """把資料寫回磁碟並更新 meta.json（原子性取代）。"""
+        self._a.flush()
+        self._tau.flush()
+        tmp = os.path.join(self.path, META + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, META))
+
+    # === 取樣 ===
+    def sample_indices(self, batch_size, num_tx, rng):
+        """[batch_size, num_tx]：每列是 num_tx 個不重複的 UE 索引。"""
+        return sample_indices(len(self), batch_size, num_tx, rng)
+
+    def sample_batch(self, batch_size, num_tx, rng=None):
+        """
+        一次取出 batch_size 組、每組 num_tx 個不同 UE 的 CIR：
+          a   [batch_size, num_bs, bs_ant, num_tx, ue_ant, num_paths, T]
+          tau [batch_size, num_bs, num_tx, num_paths]
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        idx = self.sample_indices(batch_size, num_tx, rng)
+        uniq, inv = np.unique(idx, return_inverse=True)              # 依序讀取記憶體映射，重複的只讀一次
+        a = self.a[uniq][inv.reshape(-1)]                             # [B*k, bs, bs_ant, 1, ue_ant, P, T]
+        tau = self.tau[uniq][inv.reshape(-1)]                         # [B*k, bs, 1, P]
+        a = a.reshape((batch_size, num_tx) + a.shape[1:3] + a.shape[4:])
+        tau = tau.reshape((batch_size, num_tx) + tau.shape[1:2] + tau.shape[3:])
+        a = np.ascontiguousarray(a.transpose(0, 2, 3, 1, 4, 5, 6))
+        tau = np.ascontiguousarray(tau.transpose(0, 2, 1, 3))
+        return a, tau
+
+    def generator(self, num_tx, chunk=256, seed=None):
+        """
+        給 sionna.phy.channel.CIRDataset 用的 generator（取代 CIRGenerator）：
+        每次向量化取出 chunk 組再逐筆 yield a [num_bs, bs_ant, num_tx, ue_ant, P, T]、tau [num_bs, num_tx, P]。
+        """
+        def gen():
+            rng = np.random.default_rng(seed)
+            while True:
+                a, tau = self.sample_batch(chunk, num_tx, rng)
+                for i in range(chunk):
+                    yield a[i], tau[i]
+        return gen
@@ -0,0 +1,91 @@
+import numpy as np
+
+# === 一組 UE 接收端：建立一次，之後以 [N, 3] 陣列整批更新位置 / 速度 ===
+
+
+def _numpy(v):
+    return v.numpy() if hasattr(v, "numpy") else np.asarray(v)
+
+
+class ReceiverArray:
+    """
+    N 個接收端（名稱 prefix + 0..N-1），取代「每批 remove / add Receiver、再逐一設定 position」：
+      - 接收端只在建立或 resize() 時新增 / 移除；
+      - set_positions() 與上次寫入的值比較，只更新有變動的列，
+        並一次把陣列轉成 Python list，避免每個元素各自轉型；
+      - sample() 直接用 rm.sample_positions() 取樣並寫入。
+    receiver_kwargs 會傳給每個 Receiver（例如 display_radius、color）。
+    """
+
+    def __init__(self, scene, num, positions=None, velocity=None, prefix="rx-", **receiver_kwargs):
+        self.scene = scene
+        self.prefix = prefix
+        self.receiver_kwargs = receiver_kwargs
+        self.positions = np.zeros((0, 3))
+        self.velocities = np.zeros((0, 3))
+        self.resize(num, positions, velocity)
+
+    @property
+    def names(self):
+        return [f"{self.prefix}{i}" for i in range(len(self))]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def resize(self, num, positions=None, velocity=None):
+        """改變接收端數量；新增的接收端放在 positions（或原點），多出來的從場景移除。"""
+        from sionna.rt import Receiver
+
+        old = len(self)
+        for i in range(num, old):
+            self.scene.remove(f"{self.prefix}{i}")
+        self.positions = self.positions[:num]
+        self.velocities = self.velocities[:num]
+        if num > old:
+            pos = np.zeros((num - old, 3)) if positions is None \
+                else np.broadcast_to(np.asarray(positions, np.float64), (num, 3))[old:]
+            vel = np.zeros((num - old, 3)) if velocity is None \
+                else np.broadcast_to(np.asarray(velocity, np.float64), (num, 3))[old:]
+            for i, (p, v) in enumerate(zip(pos.tolist(), vel.tolist()), start=old):
+                name = f"{self.prefix}{i}"
+                self.scene.remove(name)  # 同名的舊接收端（例如重跑 cell）
+                self.scene.add(Receiver(name=name, position=p, velocity=v, **self.receiver_kwargs))
+            self.positions = np.concatenate([self.positions, pos])
+            self.velocities = np.concatenate([self.velocities, vel])
+
+    def _write(self, values, cache, attr, atol):
+        values = np.broadcast_to(np.asarray(values, np.float64), cache.shape)
+        changed = np.nonzero(np.any(np.abs(values - cache) > atol, axis=1))[0]
+        if changed.size:
+            rows = values[changed].tolist()
+            receivers = self.scene.receivers
+            for i, row in zip(changed.tolist(), rows):
+                setattr(receivers[f"{self.prefix}{i}"], attr, row)
+            cache[changed] = values[changed]
+        return changed
+
+    def set_positions(self, positions, velocity=None, atol=1e-6):
+        """
+        positions [N, 3]；velocity 為 [N, 3]、[3] 或 None（不變）。
+        回傳實際更新的接收端數（位置或速度有變動的列）。
+        """
+        changed = self._write(positions, self.positions, "position", atol)
+        if velocity is not None:
+            changed = np.union1d(changed, self._write(velocity, self.velocities, "velocity", atol))
+        return int(changed.size)
+
+    def sample(self, rm, tx=0, velocity=None, **sample_kwargs):
+        """
+        以 rm.sample_positions(num_pos=N, **sample_kwargs) 取樣（例如 metric、min_val_db、min_dist、seed），
+        取第 tx 個發射端的結果寫入，回傳 [N, 3] 位置。
+        """
+        pos, _ = rm.sample_positions(num_pos=len(self), **sample_kwargs)
+        pos = np.asarray(_numpy(pos), np.float64)
+        if pos.ndim == 3:  # [num_tx, num_pos, 3]
+            pos = pos[tx]
+        self.set_positions(pos, velocity)
+        return pos
+
+    def remove(self):
+        """把所有接收端從場景移除。"""
+        self.resize(0)
@@ -1,14 +1,71 @@
 # === 簡易 JSON 監聽移動 (Blender 3.x/4.x) ===
-import bpy, json, os, time
+import bpy, json, os, sys, importlib, logging
 from mathutils import Vector
 
+# === 共用模組（排程器、日誌）位於 Loading_scene_nycu/scripts ===
+SHARED_DIR = None  # None = 本腳本所在資料夾的上一層下的 Loading_scene_nycu/scripts；也可填路徑（'//' 相對於 .blend）
+
+
+def _shared_dir():
+    if SHARED_DIR:
+        return os.path.normpath(bpy.path.abspath(SHARED_DIR))
+    # 在文字編輯器執行時 __file__ 只是 text block 名稱；外部檔案的實際位置在 text.filepath
+    text = getattr(getattr(bpy.context, "space_data", None), "text", None) \
+        or bpy.data.texts.get(os.path.basename(__file__))
+    script = bpy.path.abspath(text.filepath) if text is not None and text.filepath else __file__
+    if not os.path.isfile(script):
+        raise RuntimeError(f"[shared] 找不到本腳本在磁碟上的位置（{script}，內嵌的 text block？），"
+                           f"請在 SHARED_DIR 填入 Loading_scene_nycu/scripts 的路徑")
+    return os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(script)), "..", "Loading_scene_nycu", "scripts"))
+
+
+shared_dir = _shared_dir()
+if not os.path.isfile(os.path.join(shared_dir, "service_registry.py")):
+    raise RuntimeError(f"[shared] {shared_dir} 不是共用模組目錄，請在 SHARED_DIR 填入 Loading_scene_nycu/scripts 的路徑")
+if shared_dir not in sys.path:
+    sys.path.append(shared_dir)
+import scheduler, latency_trace, uav_log, service_registry, pose_codec, radiomap_codec, radiomap_texture, path_codec, path_geometry
+importlib.reload(uav_log)
+importlib.reload(service_registry)
+importlib.reload(pose_codec)
+importlib.reload(radiomap_codec)
+importlib.reload(radiomap_texture)
+importlib.reload(path_codec)
+importlib.reload(path_geometry)
+importlib.reload(scheduler)
+importlib.reload(latency_trace)
+from scheduler import JobScheduler, PRIO_POSE, PRIO_IDLE
+from latency_trace import LatencyTracer, now
+from uav_log import get_logger, flush_all
+from service_registry import service, register_timer
+from pose_codec import PoseDecoder
+from radiomap_codec import decode_radiomap
+from radiomap_texture import RadioMapTexture
+from path_codec import decode_paths
+from path_geometry import PathGeometry
+
 # ==== 設定 ====
 JSON_PATH = "//uav_from_sionna.json"  # 可用 '//' 表示相對於 .blend 的路徑
+POSE_PATH = "//uav_pose.bin"          # 二進位姿態訊息（notebook 的 export_tx_to_bin）
+USE_BINARY_POSE = True                # True: 監聽 POSE_PATH；False: 監聽 JSON_PATH（經緯度）
+RADIOMAP_PATH = "//radiomap.bin"      # notebook 匯出的無線電地圖；None = 不監聽
+PLANE_NAME = "Plane"                  # 貼上地圖紋理的地面物件（plane.ply）
+PATHS_PATH = "//paths.bin"            # notebook 匯出的傳播路徑幾何；None = 不監聽
 OBJECT_NAME = "root"              # 留空=用目前 Active 物件；或填物件名，如 "UAV"
 INTERVAL    = 0.01                # 每幾秒檢查一次
 USE_WORLD   = True               # True: 設定世界座標；False: 設定物件座標(location)
+LOG_LEVEL   = "INFO"             # DEBUG / INFO / WARNING
+LOG_FILE    = None               # 例如 "//uav.log"；None = 只輸出到 console
+
+uav_log.setup(LOG_LEVEL, file=bpy.path.abspath(LOG_FILE) if LOG_FILE else None)
+log = get_logger("json-move")
 
-_state = {"running": False, "last_mtime": 0.0}
+_state = {"running": False, "last_mtime": 0.0, "rm_mtime": 0.0, "paths_mtime": 0.0}
+jobs = service("jobs", JobScheduler, budget_ms=5.0, interval=INTERVAL)  # 重跑腳本時接手舊排程器的 timer
+tracer = LatencyTracer(report_interval=5.0)
+_decoder = PoseDecoder()
+radiomap = RadioMapTexture(plane_name=PLANE_NAME)
+path_geom = PathGeometry()
 
 def _get_obj():
     return bpy.data.objects.get(OBJECT_NAME) if OBJECT_NAME else bpy.context.view_layer.objects.active
@@ -61,13 +118,23 @@ def _read_xyz(path):
     y = n / float(scale)
     z = u / float(scale)
 
-    return float(x), float(y), float(z)
+    trace = data.get("trace") if isinstance(data.get("trace"), dict) else {}
+    return float(x), float(y), float(z), trace
+
+
+def _read_pose_bin(path):
+    """二進位姿態：frame 直接帶 ENU（公尺），不必每次做經緯度換算。"""
+    with open(path, "rb") as f:
+        data = _decoder.decode(f.read())
+    scale = float(globals().get("SCALE_M_PER_BU", 1.0))
+    u = data["uav"]
+    return u["x"] / scale, u["y"] / scale, u["z"] / scale, data["trace"]
 
 
 def focus_on_object(obj_name):
     obj = bpy.data.objects.get(obj_name)
     if not obj:
-        print(f"[focus] 找不到物件 {obj_name}")
+        get_logger("focus").warning("找不到物件 %s", obj_name)
         return
 
     for window in bpy.context.window_manager.windows:
@@ -98,40 +165,93 @@ def _set_location(obj, vec3):
     else:
         obj.location = v
 
+def _poll_binary(key, path, decode, apply):
+    """
+    notebook 匯出的二進位檔（無線電地圖 / 路徑幾何）更新時解碼，
+    交給排程器以低優先權套用；同一 key 只保留最新一份。
+    """
+    path = bpy.path.abspath(path)
+    if not os.path.exists(path):
+        return
+    m = os.path.getmtime(path)
+    if m <= _state[key + "_mtime"]:
+        return
+    _state[key + "_mtime"] = m
+    try:
+        with open(path, "rb") as f:
+            data = decode(f.read())
+    except Exception as e:
+        log.warning("讀取 %s 失敗：%s", path, e)
+        return
+    jobs.submit(lambda: apply(data), PRIO_IDLE, key=key)
+
 def _timer():
     if not _state["running"]:
         return None
-    path = bpy.path.abspath(JSON_PATH)
+    path = bpy.path.abspath(POSE_PATH if USE_BINARY_POSE else JSON_PATH)
+    reader = _read_pose_bin if USE_BINARY_POSE else _read_xyz
     if os.path.exists(path):
         m = os.path.getmtime(path)
         if m > _state["last_mtime"]:
             _state["last_mtime"] = m
             try:
-                x, y, z = _read_xyz(path)
-                obj = _get_obj()
-                if obj is not None:
-                    _set_location(obj, (x, y, z))
-                    print(f"[json-move] {obj.name} → ({x:.3f}, {y:.3f}, {z:.3f}) @ {time.strftime('%H:%M:%S')}")
-                else:
-                    print("[json-move] 找不到目標物件（請選取物件或設定 OBJECT_NAME）")
+                t_arrive = now()
+                x, y, z, trace = reader(path)
+                seq = trace.get("seq")
+                if "t_send" in trace:
+                    tracer.record("transport", (t_arrive - float(trace["t_send"])) * 1000.0, seq)
+                tracer.since("parse", t_arrive, seq)
+                # 只保留最新一筆姿態，交給排程器以最高優先權套用
+                t_submit = now()
+                jobs.submit(lambda: _apply_xyz((x, y, z), trace, t_submit), PRIO_POSE, key="pose")
             except Exception as e:
-                print("[json-move] 讀檔或移動失敗：", e)
+                log.warning("讀檔或移動失敗：%s", e)
+    if RADIOMAP_PATH:
+        _poll_binary("rm", RADIOMAP_PATH, decode_radiomap, radiomap.update)
+    if PATHS_PATH:
+        _poll_binary("paths", PATHS_PATH, decode_paths, path_geom.update)
+    report = tracer.maybe_report()
+    if report:
+        get_logger("trace").info("\n%s", report)
     return INTERVAL
 
+def _apply_xyz(xyz, trace, t_submit):
+    x, y, z = xyz
+    seq = trace.get("seq")
+    tracer.since("queue:pose", t_submit, seq)
+    t0 = now()
+    obj = _get_obj()
+    if obj is not None:
+        _set_location(obj, (x, y, z))
+        log.every("pose", "%s → (%.3f, %.3f, %.3f)", obj.name, x, y, z)
+    else:
+        log.every("missing", "找不到目標物件（請選取物件或設定 OBJECT_NAME）", interval=5.0, level=logging.WARNING)
+    tracer.since("cb:pose", t0, seq)
+    if "t_send" in trace:
+        tracer.since("e2e:pose", float(trace["t_send"]), seq)
+
 def start_watch():
-    focus_on_object(OBJECT_NAME)
+    jobs.start()
+    # 視角對準可延後，不擋住姿態更新
+    jobs.submit(lambda: focus_on_object(OBJECT_NAME), PRIO_IDLE, key="focus")
     if _state["running"]:
-        print("[json-move] 已在監聽中。若要重啟請先呼叫 stop_watch()")
+        log.info("已在監聽中。若要重啟請先呼叫 stop_watch()")
         return
     _state["running"] = True
     _state["last_mtime"] = 0.0
-    bpy.app.timers.register(_timer, first_interval=0.2)
-    print(f"[json-move] 監聽 {bpy.path.abspath(JSON_PATH)}，每 {INTERVAL}s 檢查一次。目標物件：{OBJECT_NAME or '(Active)'}")
-    print("[json-move] JSON 範例：{'x':1.2,'y':0,'z':0.8} 或 {'location':[1.2,0,0.8]}")
+    _state["rm_mtime"] = 0.0
+    _state["paths_mtime"] = 0.0
+    # 同一 channel 只有一個 timer：重跑腳本只替換 callback，不會重複讀檔
+    register_timer("uav-listener", _timer, first_interval=0.2)
+    log.info("監聽 %s，每 %ss 檢查一次。目標物件：%s",
+             bpy.path.abspath(POSE_PATH if USE_BINARY_POSE else JSON_PATH), INTERVAL, OBJECT_NAME or "(Active)")
+    log.info("JSON 範例：{'x':1.2,'y':0,'z':0.8} 或 {'location':[1.2,0,0.8]}")
 
 def stop_watch():
     _state["running"] = False
-    print("[json-move] 停止監聽。")
+    jobs.stop()
+    log.info("停止監聽。")
+    flush_all()
 
 # 自動啟動
 start_watch()
@@ -0,0 +1,141 @@
+import numpy as np
+
+# === 分塊計算 CFR 與 Delay-Doppler 頻譜（complex64、輸出預先配置）===
+# 每條連結的通道是 P 條路徑的和：
+#   H[t, f] = Σ_p a_p · exp(j2π·fd_p·t) · exp(-j2π·f·τ_p)  =  A[t, :] @ B[f, :].T
+# 也就是秩 ≤ P 的矩陣。FFT 是線性的，所以 Delay-Doppler 頻譜
+#   DD = fftshift(fft_t(A)) @ ifft_f(fftshift_f(B)).T
+# 只需要對 [T, P] 與 [F, P] 做 FFT，再做一次矩陣乘法，不必先算出完整的 [T, F] CFR。
+# 連結（rx, rx_ant, tx, tx_ant）分塊處理，暫存陣列只有 link_chunk × (T + F) × P。
+
+
+def _numpy(v):
+    return v.numpy() if hasattr(v, "numpy") else np.asarray(v)
+
+
+def link_arrays(paths):
+    """
+    Sionna RT Paths → (a, tau, doppler)，每個都是 [L, P]，L = num_rx × rx_ant × num_tx × tx_ant（依此順序攤平）。
+    另外回傳 link_shape = (num_rx, rx_ant, num_tx, tx_ant)，可把結果 reshape 回去。
+    """
+    a = paths.a
+    if isinstance(a, tuple):  # Dr.Jit 的 (實部, 虛部)
+        a = _numpy(a[0]) + 1j * _numpy(a[1])
+    a = np.asarray(_numpy(a), np.complex64)                  # [num_rx, rx_ant, num_tx, tx_ant, P]
+    tau = _numpy(paths.tau).astype(np.float64)
+    doppler = _numpy(paths.doppler).astype(np.float64)
+    if tau.ndim == 3:  # 合成天線陣列：[num_rx, num_tx, P]，所有天線共用延遲與 Doppler
+        tau = tau[:, None, :, None, :]
+        doppler = doppler[:, None, :, None, :]
+    link_shape = a.shape[:4]
+    tau = np.broadcast_to(tau, a.shape)
+    doppler = np.broadcast_to(doppler, a.shape)
+    num_paths = a.shape[-1]
+    return (a.reshape(-1, num_paths), tau.reshape(-1, num_paths),
+            doppler.reshape(-1, num_paths), link_shape)
+
+
+def factors(a, tau, doppler, frequencies, times):
+    """
+    a / tau / doppler [L, P] → A [L, T, P]、B [L, F, P]（complex64），H = A @ B^T。
+    相位先以 float64 計算再轉型，長時間窗也不會失準。
+    """
+    t = np.asarray(times, np.float64)
+    f = np.asarray(frequencies, np.float64)
+    A = np.exp(2j * np.pi * doppler[:, None, :] * t[None, :, None]).astype(np.complex64)
+    A *= a[:, None, :]
+    B = np.exp(-2j * np.pi * f[None, :, None] * tau[:, None, :]).astype(np.complex64)
+    return A, B
+
+
+def _energy(A, B):
+    """每條連結的 Σ_t Σ_f |H[t, f]|²，由 A^H A 與 B^H B 計算（不需展開 H）。"""
+    ga = np.matmul(A.conj().transpose(0, 2, 1), A)            # [L, P, P]
+    gb = np.matmul(B.conj().transpose(0, 2, 1), B)
+    return np.real(np.sum(np.conj(ga) * np.conj(gb), axis=(1, 2)))
+
+
+def _scale(energy, link_shape, num_time_steps, num_subcarriers):
+    """
+    normalize=True 的每條連結除數：與 Sionna 的 normalize=True 相同，同一 (rx, tx) 對的所有天線連結
+    （rx_ant × tx_ant）共用一個係數，使其在天線、時間、頻率上的平均能量為 1，天線間的相對增益得以保留。
+    link_shape 為 None 時無法分組，每條連結各自正規化。
+    """
+    e = np.asarray(energy, np.float64)
+    if link_shape is not None:
+        e = np.broadcast_to(e.reshape(link_shape).mean(axis=(1, 3), keepdims=True), link_shape).reshape(-1)
+    return np.sqrt(np.maximum(e, 1e-30) / (num_time_steps * num_subcarriers)).astype(np.float32)
+
+
+def _chunks(n, size):
+    for start in range(0, n, size):
+        yield start, min(start + size, n)
+
+
+def cfr(a, tau, doppler, frequencies, sampling_frequency, num_time_steps,
+        normalize=False, link_shape=None, out=None, link_chunk=8, time_chunk=128):
+    """
+    等同 paths.cfr(..., normalize_delays=False) 攤平後的 [L, T, F]（complex64）。
+    out 可傳入預先配置的陣列（例如 np.lib.format.open_memmap），否則在這裡配置一次。
+    normalize=True：傳入 link_arrays() 的 link_shape 時，每個 (rx, tx) 對的天線連結共同正規化（同 paths.cfr）。
+    """
+    frequencies = np.asarray(_numpy(frequencies), np.float64)  # subcarrier_frequencies() 回傳的是 Dr.Jit 陣列
+    L, F, T = a.shape[0], len(frequencies), num_time_steps
+    if out is None:
+        out = np.empty((L, T, F), np.complex64)
+    times = np.arange(T) / sampling_frequency
+    energy = np.empty(L)
+    for l0, l1 in _chunks(L, link_chunk):
+        for t0, t1 in _chunks(T, time_chunk):
+            A, B = factors(a[l0:l1], tau[l0:l1], doppler[l0:l1], frequencies, times[t0:t1])
+            np.matmul(A, B.transpose(0, 2, 1), out=out[l0:l1, t0:t1])
+        if normalize:
+            energy[l0:l1] = _energy(*factors(a[l0:l1], tau[l0:l1], doppler[l0:l1], frequencies, times))
+    if normalize:
+        # 係數要等同組的所有連結都算完才知道
+        scale = _scale(energy, link_shape, T, F)
+        for l0, l1 in _chunks(L, link_chunk):
+            out[l0:l1] /= scale[l0:l1, None, None]
+    return out
+
+
+def delay_doppler(a, tau, doppler, frequencies, sampling_frequency, num_time_steps,
+                  normalize=False, link_shape=None, doppler_range=None, delay_range=None, out=None,
+                  link_chunk=8):
+    """
+    與 Mobility.ipynb 相同的轉換（子載波 fftshift → ifft、時間 fft → fftshift，皆為 ortho），
+    回傳 [L, num_doppler, num_delay] complex64。
+    normalize 與 link_shape 同 cfr()。
+    doppler_range / delay_range：(start, stop) bin 索引，只輸出這個範圍（只畫峰值附近時可大幅省記憶體）。
+    """
+    frequencies = np.asarray(_numpy(frequencies), np.float64)  # subcarrier_frequencies() 回傳的是 Dr.Jit 陣列
+    L, F, T = a.shape[0], len(frequencies), num_time_steps
+    ds = slice(*doppler_range) if doppler_range is not None else slice(0, T)
+    ts = slice(*delay_range) if delay_range is not None else slice(0, F)
+    nd, nt = len(range(T)[ds]), len(range(F)[ts])
+    if out is None:
+        out = np.empty((L, nd, nt), np.complex64)
+    times = np.arange(T) / sampling_frequency
+    energy = np.empty(L)
+    for l0, l1 in _chunks(L, link_chunk):
+        A, B = factors(a[l0:l1], tau[l0:l1], doppler[l0:l1], frequencies, times)
+        U = np.fft.fftshift(np.fft.fft(A, axis=1, norm="ortho"), axes=1)[:, ds]
+        V = np.fft.ifft(np.fft.fftshift(B, axes=1), axis=1, norm="ortho")[:, ts]
+        np.matmul(U.astype(np.complex64), V.astype(np.complex64).transpose(0, 2, 1), out=out[l0:l1])
+        if normalize:
+            energy[l0:l1] = _energy(A, B)  # ortho FFT 保持能量，所以用 CFR 的能量正規化即可
+    if normalize:
+        scale = _scale(energy, link_shape, T, F)
+        for l0, l1 in _chunks(L, link_chunk):
+            out[l0:l1] /= scale[l0:l1, None, None]
+    return out
+
+
+def dd_axes(num_time_steps, num_subcarriers, subcarrier_spacing):
+    """(doppler_bins [Hz], delay_bins [ns])，與 delay_doppler() 的輸出軸對應。"""
+    ofdm_symbol_duration = 1 / subcarrier_spacing
+    delay_resolution = ofdm_symbol_duration / num_subcarriers
+    doppler_resolution = subcarrier_spacing / num_time_steps
+    doppler_bins = (np.arange(num_time_steps) - num_time_steps // 2) * doppler_resolution
+    delay_bins = np.arange(num_subcarriers) * delay_resolution / 1e-9
+    return doppler_bins, delay_bins
@@ -0,0 +1,127 @@
+import numpy as np
+
+# === 場景物件的向量化移動：所有會動的物件放在同一組陣列，每步一次更新 ===
+# Sionna RT 的 SceneObject.position / orientation setter 每次都會呼叫 scene.mi_scene_params.update()
+# （重建加速結構），M 個物件就重建 M 次。這裡改為直接把每個物件轉換後的頂點寫進
+# mi_scene_params["<shape id>.vertex_positions"]，整步只呼叫一次 update() 與 scene_geometry_updated()；
+# 方向由這裡自己記錄（與 SceneObject 相同：繞目前包圍盒中心旋轉，並更新物件的 _orientation）。
+
+
+def _numpy(v):
+    return v.numpy() if hasattr(v, "numpy") else np.asarray(v)
+
+
+def _vec(v):
+    return np.asarray(_numpy(v), np.float64).reshape(-1)[:3]
+
+
+def _rotation(angles):
+    """與 Sionna RT 的 rotation_matrix 相同：orientation (α, β, γ) 依序繞 z、y、x 軸，R = Rz(α)·Ry(β)·Rx(γ)。"""
+    a, b, c = angles
+    ca, sa, cb, sb, cc, sc = np.cos(a), np.sin(a), np.cos(b), np.sin(b), np.cos(c), np.sin(c)
+    return np.array([[ca * cb, ca * sb * sc - sa * cc, ca * sb * cc + sa * sc],
+                     [sa * cb, sa * sb * sc + ca * cc, sa * sb * cc - ca * sc],
+                     [-sb, cb * sc, cb * cc]])
+
+
+class MobilityController:
+    """
+    movers：{名稱: 速度 [m/s]}；名稱可以是 SceneObject（車輛、其他無人機）或發射端 / 接收端。
+    位置、方向、速度、角速度都存在 [M, 3] 陣列：
+      - step(dt) 以陣列運算一次前進 dt，at(t) 直接回到起點 + v·t（與步數無關，不累積誤差）；
+      - push() 只寫入有變動的物件；SceneObject 的頂點一起寫入 mi_scene_params，每步只 update() 一次；
+      - set_velocity=True 時速度也寫到物件上，路徑追蹤的 Doppler 才會與移動一致。
+    angular：{名稱: 角速度 [rad/s]}（依 orientation 的三個角度），沒列出的為 0。
+    """
+
+    def __init__(self, scene, movers, angular=None, set_velocity=True):
+        self.scene = scene
+        self.names = list(movers)
+        self.set_velocity = set_velocity
+        objs = [scene.get(n) for n in self.names]
+        self.start = np.array([_vec(o.position) for o in objs]).reshape(-1, 3)
+        self.start_orientation = np.array([_vec(o.orientation) for o in objs]).reshape(-1, 3)
+        self.velocity = np.array([np.asarray(movers[n], np.float64) for n in self.names]).reshape(-1, 3)
+        angular = angular or {}
+        self.angular = np.array([np.asarray(angular.get(n, (0.0, 0.0, 0.0)), np.float64)
+                                 for n in self.names]).reshape(-1, 3)
+        self.t = 0.0
+        self.position = self.start.copy()
+        self.orientation = self.start_orientation.copy()
+        # 上次寫到場景的值（None 代表尚未寫入）
+        self._pushed_pos = self.start.copy()
+        self._pushed_ori = self.start_orientation.copy()
+        self._pushed_vel = None
+
+    def set_velocities(self, velocity, angular=None):
+        """[M, 3] 或 [3]（全部相同）。從目前位置開始改用新速度。"""
+        self.start = self.position - np.broadcast_to(velocity, self.velocity.shape) * self.t
+        self.velocity = np.array(np.broadcast_to(velocity, self.velocity.shape), np.float64)
+        if angular is not None:
+            self.start_orientation = self.orientation - np.broadcast_to(angular, self.angular.shape) * self.t
+            self.angular = np.array(np.broadcast_to(angular, self.angular.shape), np.float64)
+
+    def at(self, t, push=True):
+        """把所有物件移到時間 t 的位置。"""
+        self.t = float(t)
+        self.position = self.start + self.velocity * self.t
+        self.orientation = self.start_orientation + self.angular * self.t
+        if push:
+            self.push()
+
+    def step(self, dt, push=True):
+        self.at(self.t + dt, push)
+
+    def reset(self, push=True):
+        self.at(0.0, push)
+
+    def _transform(self, params, mesh, obj, i):
+        """把第 i 個物件的頂點從上次寫入的位置 / 方向轉到目前的值（只寫入 params，不 update）。"""
+        import mitsuba as mi
+
+        key = f"{mesh.id()}.vertex_positions"
+        v = np.array(params[key], np.float64).reshape(-1, 3)
+        center = (v.min(axis=0) + v.max(axis=0)) / 2  # SceneObject.position 為包圍盒中心
+        rot = _rotation(self.orientation[i]) @ _rotation(self._pushed_ori[i]).T
+        v = (v - center) @ rot.T + self.position[i]
+        params[key] = mi.Float(v.astype(np.float32).ravel())
+        if hasattr(obj, "_orientation"):
+            obj._orientation = mi.Point3f(*self.orientation[i])
+
+    def push(self):
+        """把有變動的位置 / 方向 / 速度寫到場景，回傳寫入的物件數。"""
+        moved = np.any(self.position != self._pushed_pos, axis=1)
+        turned = np.any(self.orientation != self._pushed_ori, axis=1)
+        if self.set_velocity:
+            sped = np.ones(len(self.names), bool) if self._pushed_vel is None \
+                else np.any(self.velocity != self._pushed_vel, axis=1)
+        else:
+            sped = np.zeros(len(self.names), bool)
+        changed = np.nonzero(moved | turned | sped)[0]
+        if changed.size == 0:
+            return 0
+
+        pos, ori, vel = self.position.tolist(), self.orientation.tolist(), self.velocity.tolist()
+        params = getattr(self.scene, "mi_scene_params", None)
+        geometry = False
+        for i in changed.tolist():
+            obj = self.scene.get(self.names[i])
+            mesh = getattr(obj, "mi_mesh", None) if params is not None else None
+            if mesh is not None and (moved[i] or turned[i]):
+                self._transform(params, mesh, obj, i)
+                geometry = True
+            else:  # 發射端 / 接收端：setter 不牽涉幾何
+                if moved[i]:
+                    obj.position = pos[i]
+                if turned[i]:
+                    obj.orientation = ori[i]
+            if sped[i]:
+                obj.velocity = vel[i]
+        if geometry:
+            params.update()  # 整步只重建一次加速結構
+            self.scene.scene_geometry_updated()
+        self._pushed_pos = self.position.copy()
+        self._pushed_ori = self.orientation.copy()
+        if self.set_velocity:
+            self._pushed_vel = self.velocity.copy()
+        return int(changed.size)
@@ -0,0 +1,141 @@
+import time
+import numpy as np
+from dd_spectrum import link_arrays, factors
+from mobility import MobilityController
+
+# === 混合時間演進：只在關鍵幀重新追蹤路徑，中間以 Doppler 外插 ===
+# 關鍵幀之間：
+#   H(t) = Σ_p a_p · exp(j2π·fd_p·Δt) · exp(-j2π·f·(τ_p - fd_p/fc·Δt))
+# 除了 Doppler 相位，也依 Doppler 修正延遲（路徑長度以 -fd·λ 的速率變化），長時間窗較準。
+# 關鍵幀間隔自適應：從目前關鍵幀外插到下一個候選關鍵幀，與該處實際追蹤的結果比較（NMSE），
+# 超過 tol 就把間隔減半重試；誤差遠低於 tol 時下一段間隔加倍。
+
+
+def _numpy(v):
+    return v.numpy() if hasattr(v, "numpy") else np.asarray(v)
+
+
+def nmse(h, ref):
+    """‖h - ref‖² / ‖ref‖²"""
+    den = float(np.sum(np.abs(ref) ** 2))
+    return float(np.sum(np.abs(h - ref) ** 2)) / max(den, 1e-30)
+
+
+class Keyframe:
+    """一次路徑追蹤的結果（[L, P] 攤平）與所在的時間步。"""
+
+    def __init__(self, step, paths):
+        self.step = step
+        self.a, self.tau, self.doppler, self.link_shape = link_arrays(paths)
+
+    def cfr(self, frequencies, dt, fc):
+        """由這個關鍵幀外插 dt 秒後的 CFR [L, F]（complex64）。"""
+        tau = self.tau - self.doppler / fc * dt
+        A, B = factors(self.a, tau, self.doppler, frequencies, [dt])
+        return np.matmul(A, B.transpose(0, 2, 1))[:, 0]
+
+
+class TimeEvolution:
+    """
+    movers：{物件名稱: 速度 [m/s]}（發射端、接收端、車輛等），物件依等速直線移動；
+    速度同時設定到物件上，路徑追蹤回傳的 Doppler 才會正確。
+    時間步 i 對應 t = i * dt，起點為建構時各物件的位置。
+    """
+
+    def __init__(self, scene, solver, movers, frequencies, dt, tol=1e-3,
+                 init_interval=4, max_interval=64, verbose=True, **solver_kwargs):
+        self.scene = scene
+        self.solver = solver
+        self.mobility = MobilityController(scene, movers)
+        self.frequencies = np.asarray(_numpy(frequencies), np.float64)
+        self.dt = dt
+        self.fc = float(np.asarray(_numpy(scene.frequency)).reshape(-1)[0])
+        self.tol = tol
+        self.init_interval = init_interval
+        self.max_interval = max_interval
+        self.verbose = verbose
+        self.solver_kwargs = solver_kwargs
+        self.solves = 0
+
+    def solve(self, step):
+        self.mobility.at(step * self.dt)
+        self.solves += 1
+        return Keyframe(step, self.solver(scene=self.scene, **self.solver_kwargs))
+
+    def _blend(self, key, nxt, step):
+        """兩端關鍵幀分別外插後依距離線性加權（靠近哪一端就以哪一端為主）。"""
+        w = (step - key.step) / (nxt.step - key.step)
+        h0 = key.cfr(self.frequencies, (step - key.step) * self.dt, self.fc)
+        h1 = nxt.cfr(self.frequencies, (step - nxt.step) * self.dt, self.fc)
+        return (1.0 - w) * h0 + w * h1
+
+    def run(self, num_steps, out=None):
+        """
+        回傳 dict：
+          h [num_steps, L, F] complex64（L = rx × rx_ant × tx × tx_ant，可用 link_shape 還原）、
+          keyframes（關鍵幀時間步）、segments [(起, 迄, 端點 NMSE)]、
+          err_est [num_steps]（每步所在區段的端點外插 NMSE：只是估計，不是上界——區段內部沒有實際追蹤，
+                   雙端加權通常較準但不保證；需要確認時用 validate() 在區段中點重新追蹤）、
+          solves（含被拒絕的候選）、full_solves（逐步重新追蹤需要的次數）、elapsed。
+        """
+        t0 = time.perf_counter()
+        self.solves = 0
+        key = self.solve(0)
+        L, F = key.a.shape[0], len(self.frequencies)
+        h = out if out is not None else np.empty((num_steps, L, F), np.complex64)
+        err_est = np.zeros(num_steps)
+        h[0] = key.cfr(self.frequencies, 0.0, self.fc)
+        keyframes, segments = [0], []
+        interval = self.init_interval
+
+        i = 0
+        while i < num_steps - 1:
+            j = min(i + interval, num_steps - 1)
+            while True:
+                nxt = self.solve(j)
+                ref = nxt.cfr(self.frequencies, 0.0, self.fc)
+                err = nmse(key.cfr(self.frequencies, (j - i) * self.dt, self.fc), ref)
+                if err <= self.tol or j == i + 1:
+                    break
+                j = i + max(1, (j - i) // 2)
+
+            for s in range(i + 1, j):
+                h[s] = self._blend(key, nxt, s)
+            h[j] = ref
+            err_est[i + 1:j] = err
+            segments.append((i, j, err))
+            keyframes.append(j)
+            if self.verbose:
+                print(f"[time-evo] 關鍵幀 {i} → {j}（{j - i} 步）外插 NMSE {10 * np.log10(max(err, 1e-30)):.1f} dB")
+
+            interval = j - i
+            if err < self.tol / 4:
+                interval = min(interval * 2, self.max_interval)
+            i, key = j, nxt
+
+        elapsed = time.perf_counter() - t0
+        if self.verbose:
+            print(f"[time-evo] {num_steps} 步用了 {self.solves} 次路徑追蹤（逐步重算需 {num_steps} 次），"
+                  f"端點外插 NMSE 最大 {10 * np.log10(max(err_est.max(), 1e-30)):.1f} dB（估計值），{elapsed:.1f}s")
+        return {
+            "h": h,
+            "link_shape": key.link_shape,
+            "keyframes": keyframes,
+            "segments": segments,
+            "err_est": err_est,
+            "solves": self.solves,
+            "full_solves": num_steps,
+            "elapsed": elapsed,
+        }
+
+    def validate(self, result, steps=None):
+        """
+        在指定時間步（預設為每段的中點）實際重新追蹤，回傳 {step: NMSE}，用來確認 err_est 是否可信。
+        """
+        if steps is None:
+            steps = sorted({(i + j) // 2 for i, j, _ in result["segments"] if j - i > 1})
+        errs = {}
+        for s in steps:
+            ref = self.solve(s).cfr(self.frequencies, 0.0, self.fc)
+            errs[s] = nmse(result["h"][s], ref)
+        return errs
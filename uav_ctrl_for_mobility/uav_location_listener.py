@@ -1,14 +1,54 @@
 # === 簡易 JSON 監聽移動 (Blender 3.x/4.x) ===
-import bpy, json, os, time
+import bpy, json, os, sys, importlib, logging
 from mathutils import Vector
 
+# === 共用模組（日誌、地圖紋理、timer 登錄表）位於 Loading_scene_nycu/scripts ===
+SHARED_DIR = None  # None = 本腳本所在資料夾的上一層下的 Loading_scene_nycu/scripts；也可填路徑（'//' 相對於 .blend）
+
+
+def _shared_dir():
+    if SHARED_DIR:
+        return os.path.normpath(bpy.path.abspath(SHARED_DIR))
+    # 在文字編輯器執行時 __file__ 只是 text block 名稱；外部檔案的實際位置在 text.filepath
+    text = getattr(getattr(bpy.context, "space_data", None), "text", None) \
+        or bpy.data.texts.get(os.path.basename(__file__))
+    script = bpy.path.abspath(text.filepath) if text is not None and text.filepath else __file__
+    if not os.path.isfile(script):
+        raise RuntimeError(f"[shared] 找不到本腳本在磁碟上的位置（{script}，內嵌的 text block？），"
+                           f"請在 SHARED_DIR 填入 Loading_scene_nycu/scripts 的路徑")
+    return os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(script)), "..", "Loading_scene_nycu", "scripts"))
+
+
+shared_dir = _shared_dir()
+if not os.path.isfile(os.path.join(shared_dir, "service_registry.py")):
+    raise RuntimeError(f"[shared] {shared_dir} 不是共用模組目錄，請在 SHARED_DIR 填入 Loading_scene_nycu/scripts 的路徑")
+if shared_dir not in sys.path:
+    sys.path.append(shared_dir)
+import uav_log, service_registry, radiomap_codec, radiomap_texture
+importlib.reload(uav_log)
+importlib.reload(service_registry)
+importlib.reload(radiomap_codec)
+importlib.reload(radiomap_texture)
+from uav_log import get_logger
+from service_registry import register_timer
+from radiomap_codec import decode_radiomap
+from radiomap_texture import RadioMapTexture
+
 # ==== 設定 ====
 JSON_PATH = "//uav_from_sionna.json"  # 可用 '//' 表示相對於 .blend 的路徑
+RADIOMAP_PATH = "//radiomap.bin"      # Mobility.ipynb 匯出的無線電地圖；None = 不監聽
+PLANE_NAME = "Plane"                  # 貼上地圖紋理的地面物件
 OBJECT_NAME = ""                 # 留空=用目前 Active 物件；或填物件名，如 "UAV"
 INTERVAL    = 0.01                # 每幾秒檢查一次
 USE_WORLD   = True               # True: 設定世界座標；False: 設定物件座標(location)
+LOG_LEVEL   = "INFO"             # DEBUG / INFO / WARNING
+LOG_FILE    = None               # 例如 "//uav.log"；None = 只輸出到 console
+
+uav_log.setup(LOG_LEVEL, file=bpy.path.abspath(LOG_FILE) if LOG_FILE else None)
+log = get_logger("json-move")
 
-_state = {"running": False, "last_mtime": 0.0}
+_state = {"running": False, "last_mtime": 0.0, "rm_mtime": 0.0}
+radiomap = RadioMapTexture(plane_name=PLANE_NAME)
 
 def _get_obj():
     return bpy.data.objects.get(OBJECT_NAME) if OBJECT_NAME else bpy.context.view_layer.objects.active
@@ -72,6 +112,23 @@ def _set_location(obj, vec3):
     else:
         obj.location = v
 
+def _poll_radiomap():
+    """無線電地圖檔（notebook 的 write_radiomap）更新時，貼到地面平面上。"""
+    path = bpy.path.abspath(RADIOMAP_PATH)
+    if not os.path.exists(path):
+        return
+    m = os.path.getmtime(path)
+    if m <= _state["rm_mtime"]:
+        return
+    _state["rm_mtime"] = m
+    try:
+        with open(path, "rb") as f:
+            rm = decode_radiomap(f.read())
+    except Exception as e:
+        log.warning("讀取地圖失敗：%s", e)
+        return
+    radiomap.update(rm)
+
 def _timer():
     if not _state["running"]:
         return None
@@ -85,26 +142,30 @@ def _timer():
                 obj = _get_obj()
                 if obj is not None:
                     _set_location(obj, (x, y, z))
-                    print(f"[json-move] {obj.name} → ({x:.3f}, {y:.3f}, {z:.3f}) @ {time.strftime('%H:%M:%S')}")
+                    log.every("pose", "%s → (%.3f, %.3f, %.3f)", obj.name, x, y, z)
                 else:
-                    print("[json-move] 找不到目標物件（請選取物件或設定 OBJECT_NAME）")
+                    log.every("missing", "找不到目標物件（請選取物件或設定 OBJECT_NAME）", interval=5.0, level=logging.WARNING)
             except Exception as e:
-                print("[json-move] 讀檔或移動失敗：", e)
+                log.warning("讀檔或移動失敗：%s", e)
+    if RADIOMAP_PATH:
+        _poll_radiomap()
     return INTERVAL
 
 def start_watch():
     if _state["running"]:
-        print("[json-move] 已在監聽中。若要重啟請先呼叫 stop_watch()")
+        log.info("已在監聽中。若要重啟請先呼叫 stop_watch()")
         return
     _state["running"] = True
     _state["last_mtime"] = 0.0
-    bpy.app.timers.register(_timer, first_interval=0.2)
-    print(f"[json-move] 監聽 {bpy.path.abspath(JSON_PATH)}，每 {INTERVAL}s 檢查一次。目標物件：{OBJECT_NAME or '(Active)'}")
-    print("[json-move] JSON 範例：{'x':1.2,'y':0,'z':0.8} 或 {'location':[1.2,0,0.8]}")
+    _state["rm_mtime"] = 0.0
+    # 同一 channel 只有一個 timer：重跑腳本只替換 callback，不會重複讀檔
+    register_timer("uav-listener", _timer, first_interval=0.2)
+    log.info("監聽 %s，每 %ss 檢查一次。目標物件：%s", bpy.path.abspath(JSON_PATH), INTERVAL, OBJECT_NAME or "(Active)")
+    log.info("JSON 範例：{'x':1.2,'y':0,'z':0.8} 或 {'location':[1.2,0,0.8]}")
 
 def stop_watch():
     _state["running"] = False
-    print("[json-move] 停止監聽。")
+    log.info("停止監聽。")
 
 # 自動啟動
 start_watch()